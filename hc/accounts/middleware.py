@@ -1,3 +1,4 @@
+from django.utils.functional import SimpleLazyObject
 from hc.accounts.models import Profile
 
 
@@ -7,14 +8,10 @@ class TeamAccessMiddleware(object):
 
     def __call__(self, request):
         if request.user.is_authenticated:
-            teams_q = Profile.objects.filter(member__user_id=request.user.id)
-            teams_q = teams_q.select_related("user")
-            request.teams = list(teams_q)
-
-            profile = Profile.objects.for_user(request.user)
-            if profile.current_team:
-                request.team = profile.current_team
-            else:
-                request.team = profile
+            user = request.user
+            request.team = Profile.objects.team_for(user)
+            # Only loaded if something, usually the navbar, needs it
+            request.teams = SimpleLazyObject(
+                lambda: Profile.objects.teams_for(user))
 
         return self.get_response(request)
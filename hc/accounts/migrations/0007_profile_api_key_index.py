@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 14:37
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0006_profile_current_team'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='api_key',
+            field=models.CharField(blank=True, db_index=True, max_length=128),
+        ),
+    ]
@@ -1,4 +1,5 @@
 import base64
+import hashlib
 import os
 import uuid
 from datetime import timedelta
@@ -7,12 +8,50 @@ from django.conf import settings
 from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
 from django.core import signing
+from django.core.cache import cache
 from django.db import models
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.urls import reverse
 from django.utils import timezone
 from hc.lib import emails
 
 
+# Cache backends that keep a separate cache in each process
+LOCAL_CACHES = ("django.core.cache.backends.locmem.LocMemCache",
+                "django.core.cache.backends.dummy.DummyCache")
+
+
+def _cache_is_shared():
+    """ Return True if all processes see the same default cache.
+
+    Only then does dropping a cache entry take effect everywhere.
+
+    """
+
+    return settings.CACHES["default"]["BACKEND"] not in LOCAL_CACHES
+
+
+def _api_key_cache_key(api_key):
+    # Don't put the keys themselves in the cache
+    digest = hashlib.sha1(api_key.encode("utf-8")).hexdigest()
+    return "api-key-%s" % digest
+
+
+def forget_api_key(api_key):
+    """ Drop the cached user lookup for `api_key`. """
+
+    if api_key:
+        cache.delete(_api_key_cache_key(api_key))
+
+
+def forget_team_context(user_id):
+    """ Drop the cached team context of the given user. """
+
+    if user_id is not None:
+        cache.delete_many(["team-%d" % user_id, "teams-%d" % user_id])
+
+
 class ProfileManager(models.Manager):
     def for_user(self, user):
         profile = self.filter(user=user).first()
@@ -21,6 +60,70 @@ class ProfileManager(models.Manager):
             profile.save()
         return profile
 
+    def user_for_api_key(self, api_key):
+        """ Return the user with the given API key, or None.
+
+        Results, including misses, are cached for API_KEY_CACHE_TTL
+        seconds. Changing, revoking or deleting a key drops its
+        cache entry.
+
+        Revoked keys must stop working in every process right away,
+        so with a per-process cache backend nothing gets cached.
+
+        """
+
+        if not settings.API_KEY_CACHE_TTL or not _cache_is_shared():
+            return User.objects.filter(profile__api_key=api_key).first()
+
+        key = _api_key_cache_key(api_key)
+        user = cache.get(key)
+        if user is None:
+            user = User.objects.filter(profile__api_key=api_key).first()
+            # Cache misses too, as False
+            cache.set(key, user or False, settings.API_KEY_CACHE_TTL)
+
+        return user or None
+
+    def team_for(self, user):
+        """ Return the team `user` is currently working in.
+
+        Cached for TEAM_CACHE_TTL seconds, and dropped when the user's
+        profile or team memberships change. Like API key lookups, this
+        is only cached in a cache shared by all processes, or a removed
+        team member could keep access in other processes.
+
+        """
+
+        use_cache = settings.TEAM_CACHE_TTL and _cache_is_shared()
+        key = "team-%d" % user.id
+        team = cache.get(key) if use_cache else None
+        if team is None:
+            team = self.for_user(user)
+            if team.current_team_id:
+                q = self.select_related("user")
+                team = q.get(id=team.current_team_id)
+            else:
+                team.user = user
+
+            if use_cache:
+                cache.set(key, team, settings.TEAM_CACHE_TTL)
+
+        return team
+
+    def teams_for(self, user):
+        """ Return the teams `user` is a member of, cached like team_for. """
+
+        use_cache = settings.TEAM_CACHE_TTL and _cache_is_shared()
+        key = "teams-%d" % user.id
+        teams = cache.get(key) if use_cache else None
+        if teams is None:
+            q = self.filter(member__user_id=user.id).select_related("user")
+            teams = list(q)
+            if use_cache:
+                cache.set(key, teams, settings.TEAM_CACHE_TTL)
+
+        return teams
+
 
 class Profile(models.Model):
     # Owner:
@@ -31,7 +134,7 @@ class Profile(models.Model):
     reports_allowed = models.BooleanField(default=True)
     ping_log_limit = models.IntegerField(default=100)
     token = models.CharField(max_length=128, blank=True)
-    api_key = models.CharField(max_length=128, blank=True)
+    api_key = models.CharField(max_length=128, blank=True, db_index=True)
     current_team = models.ForeignKey("self", null=True)
 
     objects = ProfileManager()
@@ -65,7 +168,13 @@ class Profile(models.Model):
         emails.set_password(self.user.email, ctx)
 
     def set_api_key(self):
-        self.api_key = base64.urlsafe_b64encode(os.urandom(24))
+        forget_api_key(self.api_key)
+        self.api_key = base64.urlsafe_b64encode(os.urandom(24)).decode()
+        self.save()
+
+    def revoke_api_key(self):
+        forget_api_key(self.api_key)
+        self.api_key = ""
         self.save()
 
     def send_report(self):
@@ -74,12 +183,21 @@ class Profile(models.Model):
         self.next_report_date = now + timedelta(days=30)
         self.save()
 
+        self.send_report_email(self.user.check_set.order_by("created"), now)
+
+    def send_report_email(self, checks, now):
+        """ Send the monthly report, without rescheduling the next one.
+
+        `checks` are the user's checks, in order of creation.
+
+        """
+
         token = signing.Signer().sign(uuid.uuid4())
         path = reverse("hc-unsubscribe-reports", args=[self.user.username])
         unsub_link = "%s%s?token=%s" % (settings.SITE_ROOT, path, token)
 
         ctx = {
-            "checks": self.user.check_set.order_by("created"),
+            "checks": checks,
             "now": now,
             "unsub_link": unsub_link
         }
@@ -101,3 +219,17 @@ class Profile(models.Model):
 class Member(models.Model):
     team = models.ForeignKey(Profile)
     user = models.ForeignKey(User)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def forget_profile(sender, instance, **kwargs):
+    forget_api_key(instance.api_key)
+    # Covers switching, joining and leaving teams, and closing accounts
+    forget_team_context(instance.user_id)
+
+
+@receiver(post_save, sender=Member)
+@receiver(post_delete, sender=Member)
+def forget_membership(sender, instance, **kwargs):
+    forget_team_context(instance.user_id)
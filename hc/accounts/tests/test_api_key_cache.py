@@ -0,0 +1,58 @@
+from django.test.utils import override_settings
+from mock import patch
+
+from hc.accounts.models import Profile, _cache_is_shared
+from hc.test import BaseTestCase
+
+
+class ApiKeyCacheTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(ApiKeyCacheTestCase, self).setUp()
+
+        # The local memory cache stands in for a shared one
+        patcher = patch("hc.accounts.models._cache_is_shared",
+                        return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_it_caches_lookups(self):
+        self.assertEqual(Profile.objects.user_for_api_key("abc"), self.alice)
+        self.assertIsNone(Profile.objects.user_for_api_key("xyz"))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(Profile.objects.user_for_api_key("abc"),
+                             self.alice)
+            self.assertIsNone(Profile.objects.user_for_api_key("xyz"))
+
+    def test_set_api_key_drops_old_key(self):
+        Profile.objects.user_for_api_key("abc")
+
+        self.profile.set_api_key()
+        self.assertIsNone(Profile.objects.user_for_api_key("abc"))
+
+        new_key = self.profile.api_key
+        self.assertEqual(Profile.objects.user_for_api_key(new_key),
+                         self.alice)
+
+    def test_revoke_drops_key(self):
+        Profile.objects.user_for_api_key("abc")
+
+        self.profile.revoke_api_key()
+        self.assertIsNone(Profile.objects.user_for_api_key("abc"))
+
+    def test_closing_account_drops_key(self):
+        Profile.objects.user_for_api_key("abc")
+
+        self.alice.delete()
+        self.assertIsNone(Profile.objects.user_for_api_key("abc"))
+
+    def test_it_needs_shared_cache(self):
+        local = {"default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+        with override_settings(CACHES=local), \
+                patch("hc.accounts.models._cache_is_shared", _cache_is_shared):
+            Profile.objects.user_for_api_key("abc")
+            with self.assertNumQueries(1):
+                Profile.objects.user_for_api_key("abc")
@@ -1,10 +1,18 @@
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.test import TestCase
-from hc.accounts.models import Profile
+from django.test.utils import override_settings
+from hc.accounts.models import Profile, _cache_is_shared
+from hc.test import BaseTestCase
+from mock import patch
 
 
 class TeamAccessMiddlewareTestCase(TestCase):
 
+    def setUp(self):
+        super(TeamAccessMiddlewareTestCase, self).setUp()
+        cache.clear()
+
     def test_it_handles_missing_profile(self):
         count_before = Profile.objects.count()
         user = User(username="ned", email="ned@example.org")
@@ -18,3 +26,56 @@ class TeamAccessMiddlewareTestCase(TestCase):
         ### Assert the new Profile objects count
         count_after = Profile.objects.count()
         self.assertEqual(count_after,count_before + 1)
+
+
+class TeamContextCacheTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(TeamContextCacheTestCase, self).setUp()
+
+        # The local memory cache stands in for a shared one
+        patcher = patch("hc.accounts.models._cache_is_shared",
+                        return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_it_caches_team(self):
+        self.client.login(username="bob@example.org", password="password")
+        self.client.get("/checks/")
+
+        self.assertEqual(Profile.objects.team_for(self.bob), self.profile)
+        with self.assertNumQueries(0):
+            team = Profile.objects.team_for(self.bob)
+            self.assertEqual(team.user, self.alice)
+            self.assertEqual(Profile.objects.teams_for(self.bob),
+                             [self.profile])
+
+    def test_switching_team_drops_cache(self):
+        self.assertEqual(Profile.objects.team_for(self.bob), self.profile)
+
+        self.client.login(username="bob@example.org", password="password")
+        self.client.get("/accounts/switch_team/bob/")
+
+        self.assertEqual(Profile.objects.team_for(self.bob),
+                         self.bobs_profile)
+
+    def test_removing_member_drops_cache(self):
+        self.assertEqual(Profile.objects.teams_for(self.bob), [self.profile])
+
+        self.client.login(username="alice@example.org", password="password")
+        form = {"remove_team_member": "1", "email": "bob@example.org"}
+        self.client.post("/accounts/profile/", form)
+
+        self.assertEqual(Profile.objects.teams_for(self.bob), [])
+        self.assertEqual(Profile.objects.team_for(self.bob),
+                         self.bobs_profile)
+
+    def test_it_needs_shared_cache(self):
+        local = {"default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+        with override_settings(CACHES=local), \
+                patch("hc.accounts.models._cache_is_shared", _cache_is_shared):
+            Profile.objects.team_for(self.bob)
+            with self.assertNumQueries(2):
+                Profile.objects.team_for(self.bob)
@@ -17,7 +17,7 @@ from hc.accounts.forms import (EmailPasswordForm, InviteTeamMemberForm,
                                RemoveTeamMemberForm, ReportSettingsForm,
                                SetPasswordForm, TeamNameForm)
 from hc.accounts.models import Profile, Member
-from hc.api.models import Channel, Check
+from hc.api.models import Channel, Check, Tag
 from hc.lib.badges import get_badge_url
 from hc.payments.models import Subscription
 
@@ -166,8 +166,7 @@ def profile(request):
             show_api_key = True
             messages.success(request, "The API key has been created!")
         elif "revoke_api_key" in request.POST:
-            profile.api_key = ""
-            profile.save()
+            profile.revoke_api_key()
             messages.info(request, "The API key has been revoked!")
         elif "show_api_key" in request.POST:
             show_api_key = True
@@ -251,9 +250,7 @@ def badges(request):
         profile.current_team_id = profile.id
         profile.save()
 
-    tags = set()
-    for check in Check.objects.filter(user=request.team.user):
-        tags.update(check.tags_list())
+    tags = [tag for tag, n in Tag.objects.counts(request.team.user)]
 
     username = request.team.user.username
     badge_urls = []
@@ -2,9 +2,9 @@ import json
 import uuid
 from functools import wraps
 
-from django.contrib.auth.models import User
 from django.http import (HttpResponseBadRequest, HttpResponseForbidden,
                          JsonResponse)
+from hc.accounts.models import Profile
 from hc.lib.jsonschema import ValidationError, validate
 
 
@@ -41,9 +41,8 @@ def check_api_key(f):
         if api_key == "":
             return make_error("wrong api_key")
 
-        try:
-            request.user = User.objects.get(profile__api_key=api_key)
-        except User.DoesNotExist:
+        request.user = Profile.objects.user_for_api_key(api_key)
+        if request.user is None:
             return HttpResponseForbidden()
 
         return f(request, *args, **kwds)
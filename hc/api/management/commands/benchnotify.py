@@ -0,0 +1,105 @@
+import time
+from threading import Thread
+
+import requests
+from django.core.management.base import BaseCommand
+from six.moves import BaseHTTPServer, socketserver
+
+from hc.api import transports
+from hc.api.models import Channel, Check
+from hc.lib.pool import BoundedPool
+from hc.lib.sessions import SessionRegistry
+
+
+class StubHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    # Support keep-alive connections
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        time.sleep(self.server.delay)
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class StubServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+def _send(session, url, check):
+    channel = Channel(kind="webhook", value=url)
+    transport = transports.Webhook(channel)
+    transport.session = session
+    transport.notify(check)
+
+
+class Command(BaseCommand):
+    help = """Benchmark webhook delivery against a local stub HTTP server.
+
+    Compares the old delivery path (a thread per notification and a new
+    connection per request) with the pooled path (a fixed pool of
+    workers sharing keep-alive connections).
+
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500,
+                            help='Number of notifications to send')
+        parser.add_argument('--workers', type=int, default=20,
+                            help='Worker threads in the pooled path')
+        parser.add_argument('--delay', type=float, default=0.01,
+                            help='Stub server response delay, in seconds')
+
+    def run_threaded(self, url, check, n):
+        threads = []
+        for i in range(0, n):
+            t = Thread(target=_send, args=(requests, url, check))
+            t.start()
+            threads.append(t)
+
+        for t in threads:
+            t.join()
+
+    def run_pooled(self, url, check, n, workers):
+        pool = BoundedPool(workers, queue_size=n)
+        registry = SessionRegistry(pool_size=workers)
+        for i in range(0, n):
+            pool.submit("webhook", _send, registry, url, check)
+
+        pool.join()
+        return registry.stats()
+
+    def report(self, label, n, elapsed):
+        self.stdout.write("%-10s %d requests in %.2fs, %.1f req/s" %
+                          (label, n, elapsed, n / elapsed))
+
+    def handle(self, *args, **options):
+        server = StubServer(("127.0.0.1", 0), StubHandler)
+        server.delay = options["delay"]
+        t = Thread(target=server.serve_forever)
+        t.daemon = True
+        t.start()
+
+        url = "http://127.0.0.1:%d/$CODE" % server.server_address[1]
+        check = Check(status="down")
+        n = options["requests"]
+
+        try:
+            start = time.time()
+            self.run_threaded(url, check, n)
+            self.report("threaded", n, time.time() - start)
+
+            start = time.time()
+            stats = self.run_pooled(url, check, n, options["workers"])
+            self.report("pooled", n, time.time() - start)
+
+            for host, s in sorted(stats.items()):
+                self.stdout.write("%s: %d connections, %.0f%% reused" %
+                                  (host, s["connections"],
+                                   s["reuse_ratio"] * 100))
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,275 @@
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+
+# Partitions hold one month of pings each, and are named after it.
+# The table that existed before partitioning becomes a partition
+# named after the month it ends with.
+MONTHLY = "api_ping_p%04d%02d"
+LEGACY = "api_ping_until_%04d%02d"
+DEFAULT = "api_ping_default"
+
+
+def month_start(dt):
+    return datetime(dt.year, dt.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month, n):
+    years, month_index = divmod(month.month - 1 + n, 12)
+    return month.replace(year=month.year + years, month=month_index + 1)
+
+
+def partition_range(name):
+    """ Return the (start, end) of a partition's range, by its name.
+
+    Returns None for partitions that are not managed by this command.
+    Legacy partitions have no start.
+
+    """
+
+    for template, kind in ((MONTHLY, "monthly"), (LEGACY, "legacy")):
+        prefix = template.split("%")[0]
+        suffix = name[len(prefix):]
+        if name.startswith(prefix) and len(suffix) == 6 and suffix.isdigit():
+            month = datetime(int(suffix[:4]), int(suffix[4:]), 1,
+                             tzinfo=timezone.utc)
+            if kind == "legacy":
+                return None, month
+
+            return month, add_months(month, 1)
+
+
+def _is_partitioned(cursor):
+    cursor.execute("""
+        SELECT relkind FROM pg_class
+        WHERE oid = to_regclass('api_ping')
+    """)
+    row = cursor.fetchone()
+    return row is not None and row[0] == "p"
+
+
+def _partitions(cursor):
+    cursor.execute("""
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE pg_inherits.inhparent = to_regclass('api_ping')
+        ORDER BY child.relname
+    """)
+    return [row[0] for row in cursor.fetchall()]
+
+
+def _default_has_rows(cursor, start, end):
+    cursor.execute("""
+        SELECT EXISTS (
+            SELECT 1 FROM %s WHERE created >= %%s AND created < %%s
+        )
+    """ % DEFAULT, [start, end])
+    return cursor.fetchone()[0]
+
+
+class Command(BaseCommand):
+    help = """Manage time-based partitions of the ping log (PostgreSQL 11+).
+
+    With --convert, turns api_ping into a table partitioned by month
+    of `created`. The existing table is kept as a single partition
+    for everything up to the month after next, so no rows get copied.
+
+    Without --convert, creates partitions for the upcoming months, and
+    drops partitions that are older than PING_RETENTION_DAYS. Pings
+    older than that are deleted from the pre-conversion partition and
+    from the default partition. Run it daily. Per-check ping log limits
+    still apply when pings are shown.
+
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--convert',
+            action='store_true',
+            dest='convert',
+            default=False,
+            help='Convert the api_ping table to a partitioned table',
+        )
+
+    def convert(self, cursor, now):
+        # Pings of the current and the next month go to the old table,
+        # so the check constraint holds while the conversion runs
+        bound = add_months(month_start(now), 2)
+        legacy = LEGACY % (bound.year, bound.month)
+
+        # The slow parts, scanning the table to validate the constraint
+        # and building the index for the new primary key, don't block
+        # writes. Attaching the table as a partition then uses both
+        # instead of doing the work under an exclusive lock.
+        cursor.execute("""
+            ALTER TABLE api_ping ADD CONSTRAINT api_ping_created_bound
+            CHECK (created IS NOT NULL AND created < %s) NOT VALID
+        """, [bound])
+        cursor.execute("""
+            ALTER TABLE api_ping VALIDATE CONSTRAINT api_ping_created_bound
+        """)
+        cursor.execute("""
+            CREATE UNIQUE INDEX CONCURRENTLY api_ping_id_created
+            ON api_ping (id, created)
+        """)
+
+        with transaction.atomic():
+            cursor.execute("LOCK TABLE api_ping IN ACCESS EXCLUSIVE MODE")
+            cursor.execute("ALTER TABLE api_ping RENAME TO %s" % legacy)
+            # Index names are shared by all tables in the schema
+            cursor.execute(
+                "ALTER INDEX api_ping_pkey RENAME TO %s_pkey" % legacy)
+            cursor.execute(
+                "ALTER INDEX api_ping_id_created RENAME TO %s_key" % legacy)
+            # The primary key of a partitioned table has to include
+            # the partitioning column
+            cursor.execute("""
+                CREATE TABLE api_ping (
+                    LIKE %s INCLUDING DEFAULTS,
+                    PRIMARY KEY (id, created)
+                ) PARTITION BY RANGE (created)
+            """ % legacy)
+            # Keep the id sequence when the old partition gets dropped
+            cursor.execute("""
+                ALTER SEQUENCE api_ping_id_seq OWNED BY api_ping.id
+            """)
+            cursor.execute("""
+                ALTER TABLE api_ping ATTACH PARTITION %s
+                FOR VALUES FROM (MINVALUE) TO (%%s)
+            """ % legacy, [bound])
+            # Matches, and adopts, the old table's index on owner_id
+            cursor.execute("""
+                CREATE INDEX api_ping_part_owner_id ON api_ping (owner_id)
+            """)
+            cursor.execute("""
+                CREATE TABLE %s PARTITION OF api_ping DEFAULT
+            """ % DEFAULT)
+
+    def create_partitions(self, cursor, existing, now):
+        created = []
+        first = month_start(now)
+        for i in range(0, settings.PING_PARTITIONS_AHEAD + 1):
+            start = add_months(first, i)
+            name = MONTHLY % (start.year, start.month)
+            if name in existing:
+                continue
+
+            # Months already covered by the legacy partition are skipped
+            covered = False
+            for other in existing:
+                bounds = partition_range(other)
+                if bounds and bounds[0] is None and start < bounds[1]:
+                    covered = True
+
+            if covered:
+                continue
+
+            end = add_months(start, 1)
+            if _default_has_rows(cursor, start, end):
+                # The month has pings already, caught by the default
+                # partition while no partition existed for them. They
+                # have to move, or the new partition can't be attached.
+                with transaction.atomic():
+                    cursor.execute("""
+                        CREATE TABLE %s (LIKE api_ping INCLUDING DEFAULTS)
+                    """ % name)
+                    cursor.execute("""
+                        WITH moved AS (
+                            DELETE FROM %s
+                            WHERE created >= %%s AND created < %%s
+                            RETURNING *
+                        )
+                        INSERT INTO %s SELECT * FROM moved
+                    """ % (DEFAULT, name), [start, end])
+                    cursor.execute("""
+                        ALTER TABLE api_ping ATTACH PARTITION %s
+                        FOR VALUES FROM (%%s) TO (%%s)
+                    """ % name, [start, end])
+            else:
+                cursor.execute("""
+                    CREATE TABLE %s PARTITION OF api_ping
+                    FOR VALUES FROM (%%s) TO (%%s)
+                """ % name, [start, end])
+
+            created.append(name)
+
+        return created
+
+    def drop_partitions(self, cursor, existing, now):
+        if settings.PING_RETENTION_DAYS is None:
+            return []
+
+        cutoff = now - timedelta(days=settings.PING_RETENTION_DAYS)
+        dropped = []
+        for name in existing:
+            bounds = partition_range(name)
+            if bounds and bounds[1] <= cutoff:
+                # Detaching first keeps the lock on api_ping short
+                cursor.execute(
+                    "ALTER TABLE api_ping DETACH PARTITION %s" % name)
+                cursor.execute("DROP TABLE %s" % name)
+                dropped.append(name)
+
+        return dropped
+
+    def trim_partitions(self, cursor, existing, now):
+        """ Delete old pings from partitions that span several months.
+
+        The pre-conversion partition holds all of the old history, and
+        would otherwise only be dropped once its last month is past the
+        cutoff. The default partition is never dropped.
+
+        """
+
+        if settings.PING_RETENTION_DAYS is None:
+            return 0
+
+        cutoff = now - timedelta(days=settings.PING_RETENTION_DAYS)
+        deleted = 0
+        for name in existing:
+            bounds = partition_range(name)
+            if (bounds and bounds[0] is None) or name == DEFAULT:
+                cursor.execute(
+                    "DELETE FROM %s WHERE created < %%s" % name, [cutoff])
+                deleted += cursor.rowcount
+
+        return deleted
+
+    def handle(self, *args, **options):
+        if connection.vendor != "postgresql":
+            raise CommandError("Partitioning requires PostgreSQL")
+
+        # Default partitions and ATTACH PARTITION of a table with
+        # indexes, needed for the conversion, came with PostgreSQL 11
+        if connection.pg_version < 110000:
+            raise CommandError("Partitioning requires PostgreSQL 11+")
+
+        now = timezone.now()
+        with connection.cursor() as cursor:
+            if options["convert"]:
+                if _is_partitioned(cursor):
+                    raise CommandError("api_ping is already partitioned")
+
+                self.convert(cursor, now)
+                self.stdout.write("Converted api_ping to a partitioned table")
+            elif not _is_partitioned(cursor):
+                raise CommandError("api_ping is not partitioned yet, "
+                                   "run with --convert first")
+
+            existing = _partitions(cursor)
+            for name in self.create_partitions(cursor, existing, now):
+                self.stdout.write("Created partition %s" % name)
+
+            for name in self.drop_partitions(cursor, existing, now):
+                self.stdout.write("Dropped partition %s" % name)
+                existing.remove(name)
+
+            deleted = self.trim_partitions(cursor, existing, now)
+            if deleted:
+                self.stdout.write("Deleted %d old pings" % deleted)
+
+        return "Done!"
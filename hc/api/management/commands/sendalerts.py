@@ -1,10 +1,17 @@
-import time
-from threading import Thread
+import heapq
+import os
+import socket
+from datetime import timedelta
 
-from django.core.management.base import BaseCommand
-from django.db import connection
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections, connection
+from django.db.models import F, Min, Q
 from django.utils import timezone
-from hc.api.models import Check
+from hc.api import transports
+from hc.api.models import Check, Lease, Notification, Summary
+from hc.lib import bus, emails, render
+from hc.lib.pool import BoundedPool
 
 
 def notify(check_id, stdout):
@@ -17,48 +24,203 @@ def notify(check_id, stdout):
         stdout.write("ERROR: %s %s %s\n" % (ch.kind, ch.value, error))
 
 
+def extend_claim(notifications, timeout):
+    """ Extend the claim on notifications whose delivery is starting.
+
+    Jobs can wait in the pool's queue for a while, and the claim made
+    by Command.dispatch() can run out meanwhile. Returns the
+    notifications that are still held: ones that another process
+    has claimed again in the meantime are left to it.
+
+    """
+
+    retry_at = timezone.now() + timedelta(seconds=timeout)
+    held = []
+    for n in notifications:
+        q = Notification.objects.filter(id=n.id, next_attempt=n.next_attempt)
+        if q.update(next_attempt=retry_at) == 1:
+            n.next_attempt = retry_at
+            held.append(n)
+
+    return held
+
+
+def deliver(notification, stdout, timeout):
+    try:
+        if not extend_claim([notification], timeout):
+            return
+
+        error = notification.deliver()
+        if error:
+            ch = notification.channel
+            stdout.write("ERROR: %s %s %s\n" % (ch.kind, ch.value, error))
+    finally:
+        # Pool threads are long-lived, let them drop stale connections
+        close_old_connections()
+
+
+def deliver_digest(notifications, stdout, timeout):
+    try:
+        notifications = extend_claim(notifications, timeout)
+        if not notifications:
+            return
+
+        error = Notification.deliver_digest(notifications)
+        if error:
+            ch = notifications[0].channel
+            stdout.write("ERROR: %s %s %s\n" % (ch.kind, ch.value, error))
+    finally:
+        close_old_connections()
+
+
 def notify_on_thread(check_id, stdout):
-    t = Thread(target=notify, args=(check_id, stdout))
-    t.start()
+    """ Put notifications to each of the check's channels in the outbox.
+
+    Command.dispatch() then hands them over to the delivery pool.
+
+    """
+
+    check = Check.objects.get(id=check_id)
+
+    tmpl = "\nSending alert, status=%s, code=%s\n"
+    stdout.write(tmpl % (check.status, check.code))
+    for channel in check.channel_set.all():
+        channel.enqueue(check)
 
 
 class Command(BaseCommand):
     help = 'Sends UP/DOWN email alerts'
     owned = Check.objects.filter(user__isnull=False)
 
+    # Checks are claimed and processed in batches of this size
+    batch_size = 100
+    # Checks that are "down" get polled this often, in seconds,
+    # to notice them going back up. When the bus reaches other
+    # processes, pings to down checks wake sendalerts up, and the poll
+    # is only a safety net that runs every refresh_interval instead.
+    poll_interval = 2
+    # Upcoming deadlines get reloaded this often, in seconds
+    refresh_interval = 60
+    # Shard leases are valid this long, in seconds, and get renewed
+    # every lease_ttl / 3 seconds
+    lease_ttl = 30
+    # Notifications handed over to the pool get retried after this many
+    # seconds, in case the process delivering them has died. The time
+    # counts from when a pool worker starts the delivery.
+    delivery_timeout = 300
+
+    def __init__(self, *args, **kwargs):
+        super(Command, self).__init__(*args, **kwargs)
+        self.deadlines = []
+        self.refreshed = None
+        self.polled = None
+        self.outbox_next = None
+
+        self.num_shards = 1
+        self.shard = 0
+        self.shards = None
+        self.leases_renewed = None
+        self.started = timezone.now()
+        self.name = "%s:%d" % (socket.gethostname(), os.getpid())
+        self.pool = BoundedPool(settings.NOTIFICATION_WORKERS,
+                                settings.NOTIFICATION_QUEUE_SIZE,
+                                settings.NOTIFICATION_KIND_LIMITS)
+
     def add_arguments(self, parser):
         parser.add_argument(
             '--no-loop',
             action='store_false',
             dest='loop',
             default=True,
-            help='Do not keep running indefinitely in a 2 second wait loop',
+            help='Do not keep running indefinitely in a wait loop',
         )
 
         parser.add_argument(
             '--no-threads',
             action='store_false',
             dest='use_threads',
-            default=False,
+            default=True,
             help='Send alerts synchronously, without using threads',
         )
 
-    def handle_one(self, use_threads=True):
-        """ Process a single check.  """
+        parser.add_argument(
+            '--shards',
+            type=int,
+            dest='num_shards',
+            default=1,
+            help='Split checks into this many shards, for running '
+                 'several sendalerts workers',
+        )
 
-        now = timezone.now()
+        parser.add_argument(
+            '--shard',
+            type=int,
+            dest='shard',
+            default=0,
+            help='The shard this worker prefers to process. Shards of '
+                 'unresponsive workers get taken over by other workers',
+        )
 
-        # Look for checks that are going down
+    def claim_shards(self, now):
+        """ Renew this worker's shard leases and take over expired ones.
+
+        Updates `self.shards` and `self.owned` to match the held leases.
+
+        """
+
+        expires = now + timedelta(seconds=self.lease_ttl)
+        leases = Lease.objects.filter(shard__lt=self.num_shards)
+
+        # Create any missing lease rows, already expired
+        if leases.count() < self.num_shards:
+            for shard in range(0, self.num_shards):
+                Lease.objects.get_or_create(shard=shard,
+                                            defaults={"expires": now})
+
+        # The preferred shard can also be taken back from a borrower
+        mine = Q(owner=self.name) | Q(expires__lte=now) | Q(borrowed=True)
+        leases.filter(mine, shard=self.shard).update(
+            owner=self.name, borrowed=False, expires=expires)
+
+        # Other shards: renew ones still held, and take over ones whose
+        # owner has failed to renew them for a whole lease_ttl
+        dead = now - timedelta(seconds=self.lease_ttl)
+        if self.started < dead:
+            q = leases.exclude(shard=self.shard)
+            q = q.filter(Q(owner=self.name) | Q(expires__lt=dead))
+            q.update(owner=self.name, borrowed=True, expires=expires)
+
+        q = leases.filter(owner=self.name, expires__gt=now)
+        shards = sorted(q.values_list("shard", flat=True))
+
+        if shards != self.shards:
+            self.shards = shards
+            self.stdout.write("Processing shards %s" % shards)
+
+            owned = Check.objects.filter(user__isnull=False)
+            owned = owned.annotate(shard=F("id") % self.num_shards)
+            self.owned = owned.filter(shard__in=shards)
+
+            # Deadlines need to be reloaded for the new set of checks
+            self.refreshed = None
+
+        self.leases_renewed = now
+
+    def going_down(self, now):
         q = self.owned.filter(alert_after__lt=now, status="up")
-        check = q.first()
+        return q.order_by("alert_after")
 
-        # If none found, look for checks that are going up
-        if not check:
-            q = self.owned.filter(alert_after__gt=now, status="down")
-            check = q.first()
+    def going_up(self, now):
+        q = self.owned.filter(alert_after__gt=now, status="down")
+        return q.order_by("alert_after")
 
-        if check is None:
-            return False
+    def handle_check(self, check, use_threads=True):
+        """ Update the stored status of a single due check.
+
+        Returns True if there was something to do, and the status
+        was not updated by another sendalerts process in the meantime.
+
+        """
 
         q = Check.objects.filter(id=check.id, status=check.status)
         current_status = check.get_status()
@@ -69,40 +231,208 @@ class Command(BaseCommand):
             return True
         else:
             # Atomically update status to the opposite
-            num_updated = q.update(status=current_status)
+            num_updated = q.update(status=current_status,
+                                   changed=timezone.now())
             if num_updated == 1:
+                Summary.objects.invalidate(check.user_id)
+                if check.user_id and settings.EVENTS_ENABLED:
+                    bus.publish(bus.user_channel(check.user_id), {
+                        "event": "status",
+                        "code": str(check.code),
+                        "status": current_status
+                    })
+
                 # Send notifications only if status update succeeded
                 # (no other sendalerts process got there first)
                 if use_threads:
                     notify_on_thread(check.id, self.stdout)
+                    self.outbox_next = timezone.now()
                 else:
                     notify(check.id, self.stdout)
+                    # Failed deliveries have been put in the outbox
+                    self.outbox_next = timezone.now()
 
                 return True
 
         return False
 
+    def handle_one(self, use_threads=True):
+        """ Process a single check.  """
+
+        now = timezone.now()
+
+        # Look for checks that are going down
+        check = self.going_down(now).first()
+
+        # If none found, look for checks that are going up
+        if not check:
+            check = self.going_up(now).first()
+
+        if check is None:
+            return False
+
+        return self.handle_check(check, use_threads)
+
+    def handle_batches(self, q, use_threads=True):
+        """ Process all checks from queryset `q`, in batches.
+
+        Returns the number of processed checks.
+
+        """
+
+        total = 0
+        while True:
+            checks = list(q[:self.batch_size])
+            for check in checks:
+                self.handle_check(check, use_threads)
+
+            total += len(checks)
+            if len(checks) < self.batch_size:
+                return total
+
+    def dispatch(self, now):
+        """ Hand over due notifications from the outbox to the pool.
+
+        Due notifications of a coalescing channel get delivered
+        together, as a single digest. Returns the number of dispatched
+        notifications.
+
+        """
+
+        q = Notification.objects.filter(next_attempt__lte=now)
+        q = q.select_related("owner", "channel").order_by("next_attempt")
+        retry_at = now + timedelta(seconds=self.delivery_timeout)
+
+        total = 0
+        while True:
+            notifications = list(q[:self.batch_size])
+            digests = {}
+            for n in notifications:
+                # Claim the notification, unless another process did
+                qq = Notification.objects.filter(id=n.id,
+                                                 next_attempt=n.next_attempt)
+                if qq.update(next_attempt=retry_at) == 1:
+                    n.next_attempt = retry_at
+                    if n.channel.coalesces():
+                        digests.setdefault(n.channel_id, []).append(n)
+                    else:
+                        self.pool.submit(n.channel.kind, deliver, n,
+                                         self.stdout, self.delivery_timeout)
+                    total += 1
+
+            for group in digests.values():
+                kind = group[0].channel.kind
+                if len(group) == 1:
+                    self.pool.submit(kind, deliver, group[0], self.stdout,
+                                     self.delivery_timeout)
+                else:
+                    self.pool.submit(kind, deliver_digest, group, self.stdout,
+                                     self.delivery_timeout)
+
+            if len(notifications) < self.batch_size:
+                break
+
+        pending = Notification.objects.filter(next_attempt__isnull=False)
+        result = pending.aggregate(Min("next_attempt"))
+        self.outbox_next = result["next_attempt__min"]
+
+        return total
+
+    def refresh_deadlines(self, now):
+        """ Load upcoming alert_after deadlines into a min-heap. """
+
+        horizon = now + timedelta(seconds=2 * self.refresh_interval)
+        q = self.owned.filter(status="up", alert_after__gt=now,
+                              alert_after__lt=horizon)
+
+        self.deadlines = list(q.values_list("alert_after", flat=True))
+        heapq.heapify(self.deadlines)
+        self.refreshed = now
+
+    def run_once(self, use_threads=True, woken=False):
+        """ Do one iteration of the main loop.
+
+        `woken` tells that a check that is down has received a ping.
+        Returns the number of seconds to sleep before the next one.
+
+        """
+
+        now = timezone.now()
+        if self.num_shards > 1:
+            renew_interval = timedelta(seconds=self.lease_ttl / 3.0)
+            if self.leases_renewed is None or \
+                    now - self.leases_renewed >= renew_interval:
+                self.claim_shards(now)
+
+        sent = 0
+        if woken or self.polled is None or \
+                (now - self.polled).total_seconds() >= self.poll_interval:
+            sent += self.handle_batches(self.going_up(now), use_threads)
+            self.polled = now
+
+        refresh_due = self.refreshed is None or \
+            (now - self.refreshed).total_seconds() >= self.refresh_interval
+
+        if refresh_due or (self.deadlines and self.deadlines[0] < now):
+            while self.deadlines and self.deadlines[0] < now:
+                heapq.heappop(self.deadlines)
+
+            sent += self.handle_batches(self.going_down(now), use_threads)
+
+        if refresh_due or (self.outbox_next and self.outbox_next <= now):
+            self.dispatch(now)
+
+        if refresh_due:
+            self.refresh_deadlines(now)
+            formatted = now.isoformat()
+            stats = "queued=%(queued)d running=%(running)d " \
+                "avg_wait=%(avg_wait).2fs" % self.pool.stats()
+            stats += " emails: queued=%(queued)d sent=%(sent)d " \
+                "failed=%(failed)d" % emails.mailer.stats()
+            self.stdout.write("-- MARK %s %s --" % (formatted, stats))
+
+        sleep = self.poll_interval - (now - self.polled).total_seconds()
+        for deadline in self.deadlines[:1] + [self.outbox_next]:
+            if deadline:
+                until_deadline = (deadline - now).total_seconds()
+                sleep = min(sleep, until_deadline + 0.01)
+
+        return 0 if sent else max(sleep, 0)
+
     def handle(self, *args, **options):
+        # Compile notification templates once, up front
+        render.preload(transports.TEMPLATES)
+
         use_threads = options["use_threads"]
         if not options["loop"]:
             x = 0
             while self.handle_one(use_threads):
                 # returns True when there are more alerts to send.
                 x += 1
-            return "Sent %d alert(s)" % x
 
-        self.stdout.write("sendalerts is now running")
+            if use_threads:
+                self.dispatch(timezone.now())
+                self.pool.join()
 
-        ticks = 0
-        while True:
+            return "Sent %d alert(s)" % x
 
-            while self.handle_one(use_threads):
-                ticks = 0
+        self.num_shards = options["num_shards"]
+        self.shard = options["shard"]
+        if not 0 <= self.shard < self.num_shards:
+            raise CommandError("--shard must be between 0 and %d" %
+                               (self.num_shards - 1))
+
+        self.stdout.write("sendalerts is now running")
 
-            ticks += 1
-            time.sleep(2)
-            if ticks % 60 == 0:
-                formatted = timezone.now().isoformat()
-                self.stdout.write("-- MARK %s --" % formatted)
+        if bus.is_shared():
+            self.poll_interval = self.refresh_interval
 
+        subscription = bus.subscribe(bus.ALERTS)
+        woken = False
+        while True:
+            sleep = self.run_once(use_threads, woken)
             connection.close()
+
+            # Sleep until the next deadline, or until a check
+            # that is down receives a ping
+            woken = bool(subscription.get(sleep))
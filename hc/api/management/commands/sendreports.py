@@ -1,23 +1,39 @@
+from collections import defaultdict
 from datetime import timedelta
 import time
 
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.db.models import Q
 from django.utils import timezone
 from hc.accounts.models import Profile
 from hc.api.models import Check
+from hc.lib import emails
+from hc.lib.pool import BoundedPool
 
 
-def num_pinged_checks(profile):
-    q = Check.objects.filter(user_id=profile.user.id,)
-    q = q.filter(last_ping__isnull=False)
-    return q.count()
+def send_reports(reports, now):
+    """ Render and send a batch of reports, over a single connection. """
+
+    with emails.mailer.batch():
+        for profile, checks in reports:
+            profile.send_report_email(checks, now)
 
 
 class Command(BaseCommand):
     help = 'Send due monthly reports'
     tmpl = "Sending monthly report to %s"
 
+    # Due profiles are loaded this many at a time
+    chunk_size = 500
+    # Reports are handed over to the pool in batches of this size
+    batch_size = 50
+
+    def __init__(self, *args, **kwargs):
+        super(Command, self).__init__(*args, **kwargs)
+        self.pool = BoundedPool(settings.REPORT_WORKERS,
+                                settings.REPORT_QUEUE_SIZE)
+
     def add_arguments(self, parser):
         parser.add_argument(
             '--loop',
@@ -27,10 +43,10 @@ class Command(BaseCommand):
             help='Keep running indefinitely in a 300 second wait loop',
         )
 
-    def handle_one_run(self):
-        now = timezone.now()
+    def due_chunks(self, now):
+        """ Yield due profiles in chunks, paginating by id. """
+
         month_before = now - timedelta(days=30)
-        month_after = now + timedelta(days=30)
 
         report_due = Q(next_report_date__lt=now)
         report_not_scheduled = Q(next_report_date__isnull=True)
@@ -38,26 +54,67 @@ class Command(BaseCommand):
         q = Profile.objects.filter(report_due | report_not_scheduled)
         q = q.filter(reports_allowed=True)
         q = q.filter(user__date_joined__lt=month_before)
-        profiles = list(q)
+        q = q.select_related("user").order_by("id")
 
-        sent = 0
+        last_id = 0
+        while True:
+            chunk = list(q.filter(id__gt=last_id)[:self.chunk_size])
+            if not chunk:
+                return
+
+            yield chunk
+            last_id = chunk[-1].id
+
+    def claim(self, profiles, month_after):
+        """ Reschedule next reports, and return the claimed profiles.
+
+        Profiles that were updated elsewhere in the meantime are skipped.
+
+        """
+
+        claimed = []
         for profile in profiles:
             qq = Profile.objects
             qq = qq.filter(id=profile.id,
                            next_report_date=profile.next_report_date)
 
             num_updated = qq.update(next_report_date=month_after)
-            if num_updated != 1:
-                # Was updated elsewhere, skipping
-                continue
+            if num_updated == 1:
+                claimed.append(profile)
+
+        return claimed
+
+    def handle_one_run(self):
+        now = timezone.now()
+        month_after = now + timedelta(days=30)
+
+        sent = 0
+        for chunk in self.due_chunks(now):
+            profiles = self.claim(chunk, month_after)
+
+            # Load all checks of the chunk in one query
+            by_user = defaultdict(list)
+            user_ids = [profile.user_id for profile in profiles]
+            q = Check.objects.filter(user_id__in=user_ids)
+            for check in q.order_by("created"):
+                by_user[check.user_id].append(check)
+
+            reports = []
+            for profile in profiles:
+                checks = by_user[profile.user_id]
+                if not any(check.last_ping for check in checks):
+                    continue
+
+                self.stdout.write(self.tmpl % profile.user.email)
+                reports.append((profile, checks))
 
-            if num_pinged_checks(profile) == 0:
-                continue
+            for i in range(0, len(reports), self.batch_size):
+                batch = reports[i:i + self.batch_size]
+                self.pool.submit("report", send_reports, batch, now)
 
-            self.stdout.write(self.tmpl % profile.user.email)
-            profile.send_report()
-            sent += 1
+            sent += len(reports)
 
+        self.pool.join()
         return sent
 
     def handle(self, *args, **options):
@@ -69,6 +126,8 @@ class Command(BaseCommand):
             self.handle_one_run()
 
             formatted = timezone.now().isoformat()
-            self.stdout.write("-- MARK %s --" % formatted)
+            stats = "emails: queued=%(queued)d sent=%(sent)d " \
+                "failed=%(failed)d" % emails.mailer.stats()
+            self.stdout.write("-- MARK %s %s --" % (formatted, stats))
 
             time.sleep(300)
@@ -0,0 +1,40 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 14:04
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+from django.db.models import F
+from hc.lib import cron
+
+
+def fill_next_expected(apps, schema_editor):
+    # Same as Check.update_next_expected(), for checks that have pings
+    Check = apps.get_model("api", "Check")
+    q = Check.objects.filter(last_ping__isnull=False)
+
+    q.filter(kind="simple").update(
+        next_expected=F("last_ping") + F("timeout"),
+        alert_after=F("last_ping") + F("timeout") + F("grace"))
+
+    for check in q.exclude(kind="simple").iterator():
+        next_expected = cron.next_after(check.schedule, check.tz,
+                                        check.last_ping)
+        Check.objects.filter(id=check.id).update(
+            next_expected=next_expected,
+            alert_after=next_expected + check.grace)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0030_ping_created'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='check',
+            name='next_expected',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(fill_next_expected, migrations.RunPython.noop),
+    ]
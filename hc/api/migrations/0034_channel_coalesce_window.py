@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 14:17
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0033_notification_outbox'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='channel',
+            name='coalesce_window',
+            field=models.IntegerField(default=0),
+        ),
+    ]
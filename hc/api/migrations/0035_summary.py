@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 14:25
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0034_channel_coalesce_window'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Summary',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('valid_until', models.DateTimeField(blank=True, null=True)),
+                ('generation', models.IntegerField(default=0)),
+                ('num_up', models.IntegerField(default=0)),
+                ('num_grace', models.IntegerField(default=0)),
+                ('num_down', models.IntegerField(default=0)),
+                ('num_new', models.IntegerField(default=0)),
+                ('num_paused', models.IntegerField(default=0)),
+                ('tags', models.TextField(default='[]')),
+                ('down_tags', models.TextField(blank=True)),
+                ('grace_tags', models.TextField(blank=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 14:28
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0035_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='check',
+            name='changed',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+    ]
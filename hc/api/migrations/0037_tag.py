@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 14:41
+from __future__ import unicode_literals
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_tags(apps, schema_editor):
+    Check = apps.get_model("api", "Check")
+    Tag = apps.get_model("api", "Tag")
+
+    tags = []
+    q = Check.objects.exclude(tags="").values_list("id", "user_id", "tags")
+    for check_id, user_id, check_tags in q.iterator():
+        names = [t.strip() for t in check_tags.split(" ") if t.strip()]
+        for name in set(names):
+            tags.append(Tag(owner_id=check_id, user_id=user_id, name=name))
+
+        if len(tags) >= 1000:
+            Tag.objects.bulk_create(tags)
+            tags = []
+
+    Tag.objects.bulk_create(tags)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('api', '0036_check_changed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=500)),
+                ('owner', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='api.Check')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='tag',
+            unique_together=set([('owner', 'name')]),
+        ),
+        migrations.AlterIndexTogether(
+            name='tag',
+            index_together=set([('user', 'name')]),
+        ),
+        migrations.RunPython(fill_tags, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# -*- coding: utf-8 -*-
+# Generated by Django 1.10.5 on 2026-10-18 15:01
+from __future__ import unicode_literals
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0037_tag'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='summary',
+            name='refreshing_until',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
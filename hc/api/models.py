@@ -2,18 +2,24 @@
 
 import hashlib
 import json
+import random
+import traceback
 import uuid
+from collections import Counter
 from datetime import datetime, timedelta as td
 
-from croniter import croniter
 from django.conf import settings
 from django.core.checks import Warning
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import connection, models, transaction
+from django.db.models import Case, F, Q, Value, When
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.urls import reverse
 from django.utils import timezone
 from hc.api import transports
-from hc.lib import emails
+from hc.lib import bus, cron, emails
+from hc.lib.buffer import BulkBuffer
 
 STATUSES = (
     ("up", "Up"),
@@ -23,6 +29,7 @@ STATUSES = (
 )
 DEFAULT_TIMEOUT = td(days=1)
 DEFAULT_GRACE = td(hours=1)
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
 CHECK_KINDS = (("simple", "Simple"),
                ("cron", "Cron"))
 
@@ -45,6 +52,317 @@ PO_PRIORITIES = {
     2: "emergency"
 }
 
+# Fields of a check's API representation, see Check.to_dict
+API_FIELDS = ("name", "ping_url", "update_url", "pause_url", "tags", "grace",
+              "n_pings", "status", "timeout", "schedule", "tz", "last_ping",
+              "next_ping")
+
+
+def tag_filter(tag):
+    """ Return a Q object matching checks that have the given tag. """
+
+    # An exact match in the normalized tag table, see Tag
+    return Q(tag__name=tag)
+
+
+def status_filter(status, now):
+    """ Return a Q object matching checks with the given status at `now`.
+
+    Mirrors Check.get_status() and Check.in_grace_period() using the
+    precomputed `next_expected` and `alert_after` deadlines, so the
+    filtering can be done in the database. Besides the statuses that
+    get_status() returns, "grace" matches checks that are up but late.
+
+    """
+
+    if status in ("new", "paused"):
+        return Q(status=status)
+
+    active = ~Q(status__in=("new", "paused"))
+    if status == "grace":
+        return active & Q(next_expected__lt=now, alert_after__gt=now)
+
+    # Without a ping there is no deadline, and the stored status stands
+    no_deadline = Q(alert_after__isnull=True, status=status)
+    if status == "up":
+        return active & (Q(alert_after__gt=now) | no_deadline)
+
+    assert status == "down"
+    return active & (Q(alert_after__lte=now) | no_deadline)
+
+
+def _pg_record_ping(code, ping, insert=True):
+    """ Record a ping in one statement, or two for cron checks.
+
+    Bumps the counter, moves last_ping and alert_after forward,
+    updates status, invalidates the owner's dashboard summary if needed,
+    notifies sendalerts if the check is down (and the owner's event
+    channel, with EVENTS_ENABLED) and (if `insert` is set) inserts the
+    Ping row, all in one round trip.
+
+    The next expected ping of a cron check can't be computed in SQL.
+    The first statement returns the schedule, and a second one stores
+    the deadlines computed from it.
+
+    Returns False if no check with the given code exists.
+
+    """
+
+    # All parts of the statement see the check as it was before the
+    # update. Unless it was plainly up, the owner's dashboard summary
+    # goes stale.
+    #
+    # Commits of transactions that notify get serialized, so pings
+    # only notify when there is someone to listen.
+    #
+    # Until the second statement runs, a cron check has no
+    # next_expected, and alert_after is a lower bound: its next
+    # expected ping is after now.
+    sql = """
+        WITH old AS (
+            SELECT user_id, status, next_expected
+            FROM api_check
+            WHERE code = %(code)s
+        ), updated AS (
+            UPDATE api_check
+            SET n_pings = n_pings + 1,
+                last_ping = %(now)s,
+                changed = %(now)s,
+                next_expected = CASE WHEN kind = 'simple'
+                                THEN %(now)s + timeout END,
+                alert_after = CASE WHEN kind = 'simple'
+                              THEN %(now)s + timeout + grace
+                              ELSE %(now)s + grace END,
+                status = CASE WHEN status IN ('new', 'paused')
+                         THEN 'up' ELSE status END
+            WHERE code = %(code)s
+            RETURNING id, n_pings, kind, schedule, tz, grace,
+                CASE WHEN %(events)s AND user_id IS NOT NULL
+                THEN pg_notify('hc_user_' || user_id, %(event)s) END,
+                CASE WHEN status = 'down'
+                THEN pg_notify('hc_alerts', %(event)s) END
+        ), stale AS (
+            UPDATE api_summary
+            SET valid_until = NULL, generation = generation + 1
+            FROM old
+            WHERE api_summary.user_id = old.user_id
+              AND (old.status <> 'up' OR old.next_expected <= %(now)s)
+        )
+    """
+
+    if insert:
+        sql += """
+        , inserted AS (
+            INSERT INTO api_ping
+                (owner_id, n, created, scheme, remote_addr, method, ua)
+            SELECT id, n_pings, %(now)s, %(scheme)s, %(remote_addr)s,
+                   %(method)s, %(ua)s
+            FROM updated
+        )
+        """
+
+    sql += "SELECT id, n_pings, kind, schedule, tz, grace FROM updated"
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, {
+            "code": str(code),
+            "now": ping.created,
+            "scheme": ping.scheme,
+            "remote_addr": ping.remote_addr or None,
+            "method": ping.method,
+            "ua": ping.ua,
+            "events": settings.EVENTS_ENABLED,
+            "event": json.dumps({"event": "ping", "code": str(code)})
+        })
+
+        row = cursor.fetchone()
+        if row is None:
+            return False
+
+        ping.owner_id, ping.n, kind, schedule, tz, grace = row
+        if kind != "simple":
+            next_expected = cron.next_after(schedule, tz, ping.created)
+            # A later ping may have been recorded in the meantime,
+            # its deadlines win
+            cursor.execute("""
+                UPDATE api_check
+                SET next_expected = %s, alert_after = %s
+                WHERE id = %s AND last_ping = %s
+            """, [next_expected, next_expected + grace, ping.owner_id,
+                  ping.created])
+
+        return True
+
+
+class CheckManager(models.Manager):
+    def record_ping(self, code, ping):
+        """ Update check's state and save the (not yet saved) `ping`.
+
+        On PostgreSQL, pings take a single-statement fast path (two
+        statements for cron checks). Other databases fall back to
+        an atomic read-update-insert sequence.
+
+        With PING_BUFFER_ENABLED, check's state is still updated right
+        away but the Ping row goes to `ping_buffer` and gets written
+        later, in a batch.
+
+        Returns False if check with the given code does not exist.
+
+        """
+
+        ping.created = now = timezone.now()
+        buffered = settings.PING_BUFFER_ENABLED
+
+        if connection.vendor == "postgresql":
+            found = _pg_record_ping(code, ping, insert=not buffered)
+            if found and buffered:
+                ping_buffer.add(ping)
+            return found
+
+        with transaction.atomic():
+            check = self.filter(code=code).select_for_update().first()
+            if check is None:
+                return False
+
+            # Pings to checks that are not plainly up change what
+            # the owner's dashboard shows
+            stale = check.get_status(now) != "up" or check.in_grace_period()
+            was_down = check.status == "down"
+
+            check.last_ping = now
+            check.update_next_expected()
+            if check.status in ("new", "paused"):
+                check.status = "up"
+
+            self.filter(id=check.id).update(
+                n_pings=F("n_pings") + 1,
+                last_ping=now,
+                changed=now,
+                next_expected=check.next_expected,
+                alert_after=check.alert_after,
+                status=check.status)
+
+            # The row is locked, so no other ping got in between
+            check.n_pings += 1
+
+            ping.owner = check
+            ping.n = check.n_pings
+            if not buffered:
+                ping.save()
+
+            if stale:
+                Summary.objects.invalidate(check.user_id)
+
+        if buffered:
+            ping_buffer.add(ping)
+
+        if check.user_id and settings.EVENTS_ENABLED:
+            channel = bus.user_channel(check.user_id)
+            bus.publish(channel, {"event": "ping", "code": str(code)})
+
+        if was_down:
+            bus.publish(bus.ALERTS, {"event": "ping", "code": str(code)})
+
+        return True
+
+    def update_each(self, checks, fields, **values):
+        """ Save `fields` of each of `checks`, and set `values` on all.
+
+        Uses one UPDATE per chunk of checks, with each check's own
+        values picked by id.
+
+        """
+
+        for i in range(0, len(checks), 50):
+            chunk = checks[i:i + 50]
+            chunk_values = dict(values)
+            for field in fields:
+                output_field = self.model._meta.get_field(field)
+                whens = [When(id=check.id,
+                              then=Value(getattr(check, field),
+                                         output_field=output_field))
+                         for check in chunk]
+                chunk_values[field] = Case(*whens, output_field=output_field)
+
+            ids = [check.id for check in chunk]
+            self.filter(id__in=ids).update(**chunk_values)
+
+    def record_pings(self, pings):
+        """ Update checks' state and save `pings`, a list of (code, ping).
+
+        Each ping's `created` must already be set, it can be in the past
+        for pings that were buffered by the client. Older pings are
+        saved but don't move the check's `last_ping` back.
+
+        Checks are loaded with one query and updated with update_each(),
+        and the Ping rows are inserted in bulk.
+
+        Returns the set of codes that don't match any check.
+
+        """
+
+        now = timezone.now()
+        by_code = {}
+        for code, ping in pings:
+            by_code.setdefault(str(code), []).append(ping)
+
+        codes = list(by_code)
+        fields = ("n_pings", "last_ping", "next_expected", "alert_after",
+                  "status")
+
+        with transaction.atomic():
+            checks = []
+            for i in range(0, len(codes), 500):
+                q = self.filter(code__in=codes[i:i + 500])
+                checks.extend(q.select_for_update())
+
+            new_pings, stale = [], set()
+            for check in checks:
+                if check.get_status(now) != "up" or check.in_grace_period():
+                    stale.add(check.user_id)
+
+                check_pings = by_code[str(check.code)]
+                check_pings.sort(key=lambda ping: ping.created)
+                for ping in check_pings:
+                    check.n_pings += 1
+                    ping.owner = check
+                    ping.n = check.n_pings
+                    new_pings.append(ping)
+
+                latest = check_pings[-1].created
+                if check.last_ping is None or latest > check.last_ping:
+                    check.last_ping = latest
+                    check.update_next_expected()
+
+                if check.status in ("new", "paused"):
+                    check.status = "up"
+
+            self.update_each(checks, fields, changed=now)
+
+            if settings.PING_BUFFER_ENABLED:
+                for ping in new_pings:
+                    ping_buffer.add(ping)
+            else:
+                Ping.objects.bulk_create(new_pings)
+
+            for user_id in stale:
+                Summary.objects.invalidate(user_id)
+
+        by_user = {}
+        for check in checks:
+            if check.user_id and settings.EVENTS_ENABLED:
+                by_user.setdefault(check.user_id, []).append(str(check.code))
+
+        for user_id, user_codes in by_user.items():
+            bus.publish(bus.user_channel(user_id),
+                        {"event": "ping", "codes": user_codes})
+
+        down = [str(check.code) for check in checks if check.status == "down"]
+        if down:
+            bus.publish(bus.ALERTS, {"event": "ping", "codes": down})
+
+        return set(codes) - set(str(check.code) for check in checks)
+
 
 class Check(models.Model):
 
@@ -65,8 +383,30 @@ class Check(models.Model):
     tz = models.CharField(max_length=36, default="UTC")
     n_pings = models.IntegerField(default=0)
     last_ping = models.DateTimeField(null=True, blank=True)
+    next_expected = models.DateTimeField(null=True, blank=True,
+                                         editable=False)
     alert_after = models.DateTimeField(null=True, blank=True, editable=False)
     status = models.CharField(max_length=6, choices=STATUSES, default="new")
+    # Last time a ping, status change or edit was written. Queryset
+    # updates need to set it explicitly.
+    changed = models.DateTimeField(null=True, auto_now=True, db_index=True)
+
+    objects = CheckManager()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super(Check, cls).from_db(db, field_names, values)
+        # Tags as last synced to the Tag table, see save()
+        instance._synced_tags = instance.__dict__.get("tags")
+        return instance
+
+    def save(self, *args, **kwargs):
+        super(Check, self).save(*args, **kwargs)
+
+        synced = getattr(self, "_synced_tags", "")
+        if self.tags != synced:
+            Tag.objects.sync([self])
+            self._synced_tags = self.tags
 
     def name_then_code(self):
         if self.name:
@@ -96,23 +436,45 @@ class Check(models.Model):
         return errors
 
     def get_grace_start(self):
-        """ Return the datetime when grace period starts. """
+        """ Return the datetime when grace period starts.
+
+        Uses `next_expected` when it has been precomputed, so this
+        is usually just an attribute lookup.
+
+        """
+
+        if self.next_expected:
+            return self.next_expected
+
+        return self.compute_next_expected()
+
+    def compute_next_expected(self):
+        """ Calculate the datetime when the next ping is expected. """
 
         # The common case, grace starts after timeout
         if self.kind == "simple":
             return self.last_ping + self.timeout
 
         # The complex case, next ping is expected based on cron schedule
-        with timezone.override(self.tz):
-            last_naive = timezone.make_naive(self.last_ping)
-            it = croniter(self.schedule, last_naive)
-            next_naive = it.get_next(datetime)
-            return timezone.make_aware(next_naive, is_dst=False)
+        return cron.next_after(self.schedule, self.tz, self.last_ping)
+
+    def update_next_expected(self):
+        """ Recalculate `next_expected` and `alert_after`.
+
+        Needs to be called after changing `last_ping` or the
+        check's timeout, schedule or timezone.
+
+        """
+
+        if self.last_ping:
+            self.next_expected = self.compute_next_expected()
+            self.alert_after = self.next_expected + self.grace
 
     def get_status(self, now=None):
         """ Return "up" if the check is up or in grace, otherwise "down". """
 
-        if self.status in ("new", "paused"):
+        # Without a ping there is no deadline to compare against
+        if self.status in ("new", "paused") or self.last_ping is None:
             return self.status
 
         if now is None:
@@ -128,7 +490,7 @@ class Check(models.Model):
     def in_grace_period(self):
         """ Return True if check is currently in grace period. """
 
-        if self.status in ("new", "paused"):
+        if self.status in ("new", "paused") or self.last_ping is None:
             return False
 
         grace_start = self.get_grace_start()
@@ -143,33 +505,54 @@ class Check(models.Model):
     def tags_list(self):
         return [t.strip() for t in self.tags.split(" ") if t.strip()]
 
-    def to_dict(self):
-        update_rel_url = reverse("hc-api-update", args=[self.code])
-        pause_rel_url = reverse("hc-api-pause", args=[self.code])
-
-        result = {
-            "name": self.name,
-            "ping_url": self.url(),
-            "update_url": settings.SITE_ROOT + update_rel_url,
-            "pause_url": settings.SITE_ROOT + pause_rel_url,
-            "tags": self.tags,
-            "grace": int(self.grace.total_seconds()),
-            "n_pings": self.n_pings,
-            "status": self.get_status()
-        }
+    def to_dict(self, fields=None):
+        """ Return check's API representation.
+
+        With `fields`, only the listed fields are computed and included.
+
+        """
+
+        def wanted(field):
+            return fields is None or field in fields
+
+        result = {}
+        if wanted("name"):
+            result["name"] = self.name
+        if wanted("ping_url"):
+            result["ping_url"] = self.url()
+        if wanted("update_url"):
+            update_rel_url = reverse("hc-api-update", args=[self.code])
+            result["update_url"] = settings.SITE_ROOT + update_rel_url
+        if wanted("pause_url"):
+            pause_rel_url = reverse("hc-api-pause", args=[self.code])
+            result["pause_url"] = settings.SITE_ROOT + pause_rel_url
+        if wanted("tags"):
+            result["tags"] = self.tags
+        if wanted("grace"):
+            result["grace"] = int(self.grace.total_seconds())
+        if wanted("n_pings"):
+            result["n_pings"] = self.n_pings
+        if wanted("status"):
+            result["status"] = self.get_status()
 
         if self.kind == "simple":
-            result["timeout"] = int(self.timeout.total_seconds())
+            if wanted("timeout"):
+                result["timeout"] = int(self.timeout.total_seconds())
         elif self.kind == "cron":
-            result["schedule"] = self.schedule
-            result["tz"] = self.tz
+            if wanted("schedule"):
+                result["schedule"] = self.schedule
+            if wanted("tz"):
+                result["tz"] = self.tz
 
-        if self.last_ping:
-            result["last_ping"] = self.last_ping.isoformat()
-            result["next_ping"] = (self.last_ping + self.timeout).isoformat()
-        else:
+        if wanted("last_ping"):
             result["last_ping"] = None
+            if self.last_ping:
+                result["last_ping"] = self.last_ping.isoformat()
+        if wanted("next_ping"):
             result["next_ping"] = None
+            if self.last_ping:
+                next_ping = self.last_ping + self.timeout
+                result["next_ping"] = next_ping.isoformat()
 
         return result
 
@@ -200,13 +583,59 @@ class Check(models.Model):
 class Ping(models.Model):
     n = models.IntegerField(null=True)
     owner = models.ForeignKey(Check)
-    created = models.DateTimeField(auto_now_add=True)
+    created = models.DateTimeField(default=timezone.now)
     scheme = models.CharField(max_length=10, default="http")
     remote_addr = models.GenericIPAddressField(blank=True, null=True)
     method = models.CharField(max_length=10, blank=True)
     ua = models.CharField(max_length=200, blank=True)
 
 
+class TagManager(models.Manager):
+    def sync(self, checks):
+        """ Replace the tags of saved `checks` with their current tags. """
+
+        by_id = dict((check.id, check) for check in checks)
+        ids = list(by_id)
+        for i in range(0, len(ids), 500):
+            self.filter(owner_id__in=ids[i:i + 500]).delete()
+
+        tags = []
+        for check in by_id.values():
+            for name in set(check.tags_list()):
+                tags.append(Tag(owner_id=check.id, user_id=check.user_id,
+                                name=name))
+
+        self.bulk_create(tags, batch_size=500)
+
+    def counts(self, user):
+        """ Return user's tags and the number of checks for each. """
+
+        q = self.filter(user=user).values_list("name")
+        q = q.annotate(n=models.Count("id")).order_by("-n", "name")
+        return list(q)
+
+
+class Tag(models.Model):
+    # Check.tags, normalized: one row per tag of a check, written by
+    # Check.save() and TagManager.sync(). Lets tag lookups use exact
+    # matches and indexes.
+    owner = models.ForeignKey(Check)
+    # Same as owner's user, for per-user tag queries without a join
+    user = models.ForeignKey(User, blank=True, null=True)
+    name = models.CharField(max_length=500)
+
+    objects = TagManager()
+
+    class Meta:
+        unique_together = ("owner", "name")
+        index_together = ["user", "name"]
+
+
+# Used by Check.objects.record_ping() when PING_BUFFER_ENABLED is set
+ping_buffer = BulkBuffer(Ping, settings.PING_BUFFER_MAX_SIZE,
+                         settings.PING_BUFFER_MAX_AGE)
+
+
 class Channel(models.Model):
     code = models.UUIDField(default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User)
@@ -215,6 +644,9 @@ class Channel(models.Model):
     value = models.TextField(blank=True)
     email_verified = models.BooleanField(default=False)
     checks = models.ManyToManyField(Check)
+    # Status changes within this many seconds of each other get sent
+    # as a single digest notification. 0 sends each one right away.
+    coalesce_window = models.IntegerField(default=0)
 
     def assign_all_checks(self):
         checks = Check.objects.filter(user=self.user)
@@ -261,24 +693,82 @@ class Channel(models.Model):
         else:
             raise NotImplementedError("Unknown channel kind: %s" % self.kind)
 
+    def send(self, check, n):
+        """ Make one attempt to deliver notification `n` about `check`. """
+
+        if self.kind == "email":
+            return self.transport.notify(check, n.bounce_url()) or ""
+
+        return self.transport.notify(check) or ""
+
+    def send_digest(self, checks, n):
+        """ Make one attempt to deliver a digest about several checks.
+
+        `n` is one of the notifications the digest is made of.
+
+        """
+
+        if self.kind == "email":
+            return self.transport.notify_digest(checks, n.bounce_url()) or ""
+
+        return self.transport.notify_digest(checks) or ""
+
+    def coalesces(self):
+        return self.coalesce_window > 0 and self.transport.supports_digest
+
+    def window_end(self, dt):
+        """ Return the end of the coalescing window `dt` falls in. """
+
+        seconds = int((dt - EPOCH).total_seconds())
+        seconds += self.coalesce_window - seconds % self.coalesce_window
+        return EPOCH + td(seconds=seconds)
+
     def notify(self, check):
+        """ Make the first delivery attempt right away.
+
+        If it fails, the notification goes to the outbox and gets
+        retried from there, like ones added by enqueue().
+
+        """
+
         if self.transport.is_noop(check):
             return "no-op"
 
+        if self.coalesces():
+            # Digests can only be sent once the window closes, so they
+            # always go through the outbox
+            self.enqueue(check)
+            return ""
+
         n = Notification(owner=check, channel=self)
         n.check_status = check.status
         n.error = "Sending"
         n.save()
 
-        if self.kind == "email":
-            error = self.transport.notify(check, n.bounce_url()) or ""
-        else:
-            error = self.transport.notify(check) or ""
+        return n.deliver()
+
+    def enqueue(self, check):
+        """ Put a notification about check's current status in the outbox.
+
+        The notification gets delivered later, by Notification.deliver().
+        Returns None if the transport would ignore check's current status.
 
-        n.error = error
+        """
+
+        if self.transport.is_noop(check):
+            return None
+
+        n = Notification(owner=check, channel=self)
+        n.check_status = check.status
+        n.error = "Sending"
+        n.next_attempt = timezone.now()
+        if self.coalesces():
+            # Wait for the window to close, so that other status
+            # changes within it can be sent along
+            n.next_attempt = self.window_end(n.next_attempt)
         n.save()
 
-        return error
+        return n
 
     @property
     def po_value(self):
@@ -348,6 +838,18 @@ class Channel(models.Model):
         return Notification.objects.filter(channel=self).latest()
 
 
+def _unexpected_error(e):
+    """ Turn an exception raised by a transport into an error message.
+
+    It then counts as a failed attempt like any other, instead of
+    leaving the notification claimed and retried forever.
+
+    """
+
+    traceback.print_exc()
+    return "Unexpected error: %s" % (e,)
+
+
 class Notification(models.Model):
     class Meta:
         get_latest_by = "created"
@@ -358,6 +860,208 @@ class Notification(models.Model):
     channel = models.ForeignKey(Channel)
     created = models.DateTimeField(auto_now_add=True)
     error = models.CharField(max_length=200, blank=True)
+    attempts = models.IntegerField(default=0)
+    # Set while the notification is waiting in the outbox
+    next_attempt = models.DateTimeField(null=True, blank=True, db_index=True)
 
     def bounce_url(self):
         return settings.SITE_ROOT + reverse("hc-api-bounce", args=[self.code])
+
+    def status_check(self):
+        """ Return the check with the status it had when this was queued. """
+
+        check = self.owner
+        check.status = self.check_status
+        return check
+
+    def deliver(self):
+        """ Make one delivery attempt, and schedule a retry if it fails. """
+
+        try:
+            error = self.channel.send(self.status_check(), self)
+        except Exception as e:
+            error = _unexpected_error(e)
+
+        self.record_attempt(error)
+        return error
+
+    @staticmethod
+    def deliver_digest(notifications):
+        """ Deliver several notifications of one channel as one message.
+
+        On failure, all of them get scheduled to be retried together.
+
+        """
+
+        channel = notifications[0].channel
+        checks = [n.status_check() for n in notifications]
+        try:
+            error = channel.send_digest(checks, notifications[0])
+        except Exception as e:
+            error = _unexpected_error(e)
+
+        now, jitter = timezone.now(), random.uniform(0.5, 1.5)
+        for n in notifications:
+            n.record_attempt(error, now, jitter)
+
+        return error
+
+    def record_attempt(self, error, now=None, jitter=None):
+        """ Save the result of a delivery attempt.
+
+        Retries are spaced with exponential backoff and jitter, and
+        stop after NOTIFICATION_MAX_ATTEMPTS attempts.
+
+        """
+
+        self.error = error[:200]
+        self.attempts += 1
+        self.next_attempt = None
+
+        if self.error and self.attempts < settings.NOTIFICATION_MAX_ATTEMPTS:
+            if now is None:
+                now, jitter = timezone.now(), random.uniform(0.5, 1.5)
+
+            delay = settings.NOTIFICATION_RETRY_DELAY
+            delay *= 2 ** (self.attempts - 1) * jitter
+            self.next_attempt = now + td(seconds=delay)
+
+        self.save()
+
+
+class Lease(models.Model):
+    # Checks are split into shards by id. A sendalerts worker processes
+    # only the shards it holds unexpired leases for.
+    shard = models.IntegerField(unique=True)
+    owner = models.CharField(max_length=100, blank=True)
+    # Set when held by a worker other than the shard's preferred one
+    borrowed = models.BooleanField(default=False)
+    expires = models.DateTimeField()
+
+
+class SummaryManager(models.Manager):
+    # Seconds other requests serve a stale summary, see for_user
+    refresh_timeout = 30
+
+    def for_user(self, user, now=None, stale_ok=False):
+        """ Return user's summary, recomputing it first if it is stale.
+
+        With `stale_ok`, only one request at a time recomputes a stale
+        summary, and concurrent requests get the stale one meanwhile.
+
+        """
+
+        if now is None:
+            now = timezone.now()
+
+        summary, created = self.get_or_create(user=user)
+        if summary.valid_until and summary.valid_until > now:
+            return summary
+
+        if stale_ok:
+            not_claimed = Q(refreshing_until__isnull=True)
+            not_claimed |= Q(refreshing_until__lte=now)
+            until = now + td(seconds=self.refresh_timeout)
+            q = self.filter(not_claimed, id=summary.id)
+            if q.update(refreshing_until=until) == 0:
+                return summary
+
+        generation = summary.generation
+        summary.compute(now)
+
+        # Don't store the result if the summary got invalidated while
+        # it was being computed
+        num_updated = self.filter(id=summary.id, generation=generation).update(
+            refreshing_until=None,
+            valid_until=summary.valid_until,
+            num_up=summary.num_up,
+            num_grace=summary.num_grace,
+            num_down=summary.num_down,
+            num_new=summary.num_new,
+            num_paused=summary.num_paused,
+            tags=summary.tags,
+            down_tags=summary.down_tags,
+            grace_tags=summary.grace_tags)
+
+        if num_updated == 0 and stale_ok:
+            self.filter(id=summary.id).update(refreshing_until=None)
+
+        return summary
+
+    def invalidate(self, user_id):
+        """ Mark user's summary as stale after a change to their checks. """
+
+        if user_id is not None:
+            self.filter(user_id=user_id).update(
+                valid_until=None, generation=F("generation") + 1)
+
+
+class Summary(models.Model):
+    # Status counts and tag rollups of a user's checks, for the
+    # dashboard. Recomputed when invalid or past valid_until, the
+    # earliest time a check could go late or down without a ping.
+    user = models.OneToOneField(User)
+    valid_until = models.DateTimeField(null=True, blank=True)
+    generation = models.IntegerField(default=0)
+    # Set while a request is recomputing a stale summary
+    refreshing_until = models.DateTimeField(null=True, blank=True)
+    num_up = models.IntegerField(default=0)
+    num_grace = models.IntegerField(default=0)
+    num_down = models.IntegerField(default=0)
+    num_new = models.IntegerField(default=0)
+    num_paused = models.IntegerField(default=0)
+    # JSON list of [tag, count] pairs, most common first
+    tags = models.TextField(default="[]")
+    down_tags = models.TextField(blank=True)
+    grace_tags = models.TextField(blank=True)
+
+    objects = SummaryManager()
+
+    def compute(self, now):
+        counts, tags = Counter(), Counter()
+        down_tags, grace_tags = set(), set()
+        # Without any changes, recompute once a day anyway
+        self.valid_until = now + td(days=1)
+
+        for check in Check.objects.filter(user_id=self.user_id):
+            status = check.get_status(now)
+            if check.status in ("up", "down") and check.last_ping:
+                grace_start = check.get_grace_start()
+                grace_end = grace_start + check.grace
+                if now < grace_start:
+                    self.valid_until = min(self.valid_until, grace_start)
+                elif now < grace_end:
+                    status = "grace"
+                    self.valid_until = min(self.valid_until, grace_end)
+
+            counts[status] += 1
+            for tag in check.tags_list():
+                tags[tag] += 1
+                if status == "down":
+                    down_tags.add(tag)
+                elif status == "grace":
+                    grace_tags.add(tag)
+
+        self.num_up = counts["up"]
+        self.num_grace = counts["grace"]
+        self.num_down = counts["down"]
+        self.num_new = counts["new"]
+        self.num_paused = counts["paused"]
+        self.tags = json.dumps(tags.most_common())
+        self.down_tags = " ".join(sorted(down_tags))
+        self.grace_tags = " ".join(sorted(grace_tags))
+
+    def tags_list(self):
+        return [(tag, count) for tag, count in json.loads(self.tags)]
+
+    def down_tags_set(self):
+        return set(self.down_tags.split())
+
+    def grace_tags_set(self):
+        return set(self.grace_tags.split())
+
+
+@receiver(post_save, sender=Check)
+@receiver(post_delete, sender=Check)
+def invalidate_summary(sender, instance, **kwargs):
+    Summary.objects.invalidate(instance.user_id)
@@ -14,3 +14,34 @@ check = {
         }
     }
 }
+
+bulk_checks = {
+    "type": "object",
+    "properties": {
+        "checks": {"type": "array", "items": check}
+    }
+}
+
+codes = {
+    "type": "object",
+    "properties": {
+        "codes": {"type": "array", "items": {"type": "string"}}
+    }
+}
+
+pings = {
+    "type": "object",
+    "properties": {
+        "pings": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "code": {"type": "string"},
+                    "timestamp": {"type": "number", "minimum": 0,
+                                  "maximum": 4102444800}
+                }
+            }
+        }
+    }
+}
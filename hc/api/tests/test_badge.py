@@ -1,5 +1,8 @@
+from datetime import timedelta as td
+
 from django.conf import settings
 from django.core.signing import base64_hmac
+from django.utils import timezone
 
 from hc.api.models import Check
 from hc.test import BaseTestCase
@@ -23,3 +26,33 @@ class BadgeTestCase(BaseTestCase):
         resp = self.client.get(url)
 
         self.assertContains(resp, "svg", status_code=200)
+
+    def _get(self, tag="foo", **kwargs):
+        sig = base64_hmac(str(self.alice.username), tag, settings.SECRET_KEY)
+        sig = sig[:8].decode("utf-8")
+        url = "/badge/{}/{}/{}.svg".format(self.alice.username, sig, tag)
+        return self.client.get(url, **kwargs)
+
+    def test_it_shows_status_from_summary(self):
+        now = timezone.now()
+        self.check.status = "up"
+        self.check.last_ping = now - td(days=1, minutes=30)
+        self.check.update_next_expected()
+        self.check.save()
+
+        down = Check(user=self.alice, tags="bar", status="up")
+        down.last_ping = now - td(days=3)
+        down.update_next_expected()
+        down.save()
+
+        self.assertContains(self._get("foo"), "late")
+        self.assertContains(self._get("bar"), "down")
+        self.assertContains(self._get("baz"), "up")
+
+    def test_it_supports_etag(self):
+        r = self._get()
+        self.assertIn("max-age=", r["Cache-Control"])
+
+        r = self._get(HTTP_IF_NONE_MATCH=r["ETag"])
+        self.assertEqual(r.status_code, 304)
+        self.assertIn("max-age=", r["Cache-Control"])
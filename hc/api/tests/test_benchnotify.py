@@ -0,0 +1,15 @@
+from django.core.management import call_command
+from django.test import SimpleTestCase
+from django.utils.six import StringIO
+
+
+class BenchNotifyTestCase(SimpleTestCase):
+
+    def test_it_reports_both_paths(self):
+        out = StringIO()
+        call_command("benchnotify", requests=5, workers=2, delay=0,
+                     stdout=out)
+
+        output = out.getvalue()
+        self.assertIn("threaded   5 requests", output)
+        self.assertIn("pooled     5 requests", output)
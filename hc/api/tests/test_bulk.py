@@ -0,0 +1,97 @@
+import json
+from datetime import timedelta as td
+
+from hc.api.models import Channel, Check
+from hc.test import BaseTestCase
+
+
+class BulkTestCase(BaseTestCase):
+
+    def post(self, url, data):
+        data["api_key"] = "abc"
+        return self.client.post(url, json.dumps(data),
+                                content_type="application/json")
+
+    def test_it_creates_and_updates(self):
+        existing = Check(user=self.alice, name="Foo", timeout=td(hours=1))
+        existing.save()
+        channel = Channel(user=self.alice)
+        channel.save()
+
+        r = self.post("/api/v1/checks/bulk", {"checks": [
+            {"name": "Foo", "timeout": 60, "unique": ["name"]},
+            {"name": "Bar", "tags": "baz", "channels": "*",
+             "unique": ["name"]},
+            {"name": "Bar", "grace": 120, "unique": ["name"]},
+            {"name": "Foo"}
+        ]})
+
+        self.assertEqual(r.status_code, 200)
+        doc = r.json()
+        self.assertEqual([c["name"] for c in doc["checks"]],
+                         ["Foo", "Bar", "Bar", "Foo"])
+        self.assertEqual(doc["checks"][2]["grace"], 120)
+        self.assertEqual(Check.objects.filter(user=self.alice).count(), 3)
+
+        existing.refresh_from_db()
+        self.assertEqual(existing.timeout, td(seconds=60))
+
+        bar = Check.objects.get(name="Bar")
+        self.assertEqual(bar.tags, "baz")
+        self.assertEqual(bar.grace, td(seconds=120))
+        self.assertEqual(list(bar.channel_set.all()), [channel])
+
+    def test_it_skips_unchanged_checks(self):
+        Check(user=self.alice, name="Foo").save()
+
+        with self.assertNumQueries(4):
+            self.post("/api/v1/checks/bulk", {"checks": [
+                {"name": "Foo", "unique": ["name"]}
+            ]})
+
+    def test_it_updates_changed_checks_together(self):
+        for name in ("Foo", "Bar", "Baz"):
+            Check(user=self.alice, name=name).save()
+
+        specs = [{"name": name, "timeout": 60, "unique": ["name"]}
+                 for name in ("Foo", "Bar", "Baz")]
+
+        # The same number of queries as for a single check
+        with self.assertNumQueries(7):
+            self.post("/api/v1/checks/bulk", {"checks": specs})
+
+        timeouts = Check.objects.values_list("timeout", flat=True)
+        self.assertEqual(set(timeouts), set([td(seconds=60)]))
+
+    def test_it_validates_specs(self):
+        r = self.post("/api/v1/checks/bulk", {"checks": [
+            {"name": "Foo", "timeout": 1}
+        ]})
+
+        self.assertEqual(r.status_code, 400)
+        self.assertFalse(Check.objects.exists())
+
+    def test_it_pauses_and_deletes(self):
+        a = Check(user=self.alice, status="up")
+        a.save()
+        b = Check(user=self.alice, status="up")
+        b.save()
+        bobs = Check(user=self.bob, status="up")
+        bobs.save()
+
+        codes = [str(a.code), str(bobs.code)]
+        r = self.post("/api/v1/checks/bulk/pause", {"codes": codes})
+        self.assertEqual(r.json(), {"paused": 1})
+        a.refresh_from_db()
+        self.assertEqual(a.status, "paused")
+        bobs.refresh_from_db()
+        self.assertEqual(bobs.status, "up")
+
+        codes = [str(a.code), str(b.code), str(bobs.code)]
+        r = self.post("/api/v1/checks/bulk/delete", {"codes": codes})
+        self.assertEqual(r.json(), {"deleted": 2})
+        self.assertEqual(list(Check.objects.all()), [bobs])
+
+    def test_it_rejects_bad_codes(self):
+        r = self.post("/api/v1/checks/bulk/pause", {"codes": ["foo"]})
+        self.assertEqual(r.status_code, 400)
@@ -1,5 +1,7 @@
 from datetime import datetime, timedelta
+from importlib import import_module
 
+from django.apps import apps
 from django.test import TestCase
 from django.utils import timezone
 from hc.api.models import Check
@@ -43,6 +45,44 @@ class CheckModelTestCase(TestCase):
         check.status = "paused"
         self.assertFalse(check.in_grace_period())
 
+    def test_it_uses_precomputed_next_expected(self):
+        check = Check()
+        check.status = "up"
+        check.last_ping = timezone.now()
+        check.next_expected = check.last_ping + timedelta(minutes=5)
+
+        self.assertEqual(check.get_grace_start(), check.next_expected)
+
+        check.update_next_expected()
+        self.assertEqual(check.next_expected,
+                         check.last_ping + check.timeout)
+        self.assertEqual(check.alert_after,
+                         check.next_expected + check.grace)
+
+    def test_migration_fills_next_expected(self):
+        migration = import_module("hc.api.migrations.0031_check_next_expected")
+        dt = timezone.make_aware(datetime(2000, 1, 1), timezone=timezone.utc)
+
+        simple = Check.objects.create(status="up", last_ping=dt)
+        cron = Check.objects.create(status="up", last_ping=dt, kind="cron",
+                                    schedule="5 * * * *")
+        new = Check.objects.create()
+        Check.objects.update(next_expected=None, alert_after=None)
+
+        migration.fill_next_expected(apps, None)
+
+        simple.refresh_from_db()
+        self.assertEqual(simple.next_expected, dt + simple.timeout)
+        self.assertEqual(simple.alert_after,
+                         dt + simple.timeout + simple.grace)
+
+        cron.refresh_from_db()
+        self.assertEqual(cron.next_expected, dt + timedelta(minutes=5))
+        self.assertEqual(cron.alert_after, cron.next_expected + cron.grace)
+
+        new.refresh_from_db()
+        self.assertIsNone(new.next_expected)
+
     def test_status_works_with_cron_syntax(self):
         dt = timezone.make_aware(datetime(2000, 1, 1), timezone=timezone.utc)
 
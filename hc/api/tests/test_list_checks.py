@@ -84,3 +84,73 @@ class ListChecksTestCase(BaseTestCase):
         payload = json.dumps({"api_key": "abc"})
         # Test that it accepts an api_key in the request
         self.assertEqual(payload, '{"api_key": "abc"}')
+
+    def test_it_paginates(self):
+        r = self.client.get("/api/v1/checks/?limit=1", HTTP_X_API_KEY="abc")
+        doc = r.json()
+        self.assertEqual([c["name"] for c in doc["checks"]], ["Alice 1"])
+        self.assertTrue(doc["next"])
+
+        url = "/api/v1/checks/?limit=1&cursor=%s" % doc["next"]
+        doc = self.client.get(url, HTTP_X_API_KEY="abc").json()
+        self.assertEqual([c["name"] for c in doc["checks"]], ["Alice 2"])
+        self.assertIsNone(doc["next"])
+
+    def test_it_rejects_bad_limit(self):
+        for limit in ("x", "0", "-1", "1001"):
+            url = "/api/v1/checks/?limit=%s" % limit
+            r = self.client.get(url, HTTP_X_API_KEY="abc")
+            self.assertEqual(r.status_code, 400)
+
+    def test_it_does_not_paginate_without_limit(self):
+        doc = self.client.get("/api/v1/checks/", HTTP_X_API_KEY="abc").json()
+        self.assertEqual([c["name"] for c in doc["checks"]],
+                         ["Alice 1", "Alice 2"])
+        self.assertNotIn("next", doc)
+
+    def test_it_selects_fields(self):
+        url = "/api/v1/checks/?fields=name,status"
+        doc = self.client.get(url, HTTP_X_API_KEY="abc").json()
+        self.assertEqual(doc["checks"][0], {"name": "Alice 1",
+                                            "status": "new"})
+
+        url = "/api/v1/checks/?fields=name,password"
+        r = self.client.get(url, HTTP_X_API_KEY="abc")
+        self.assertEqual(r.status_code, 400)
+
+    def test_it_filters_by_tag_and_status(self):
+        self.a2.tags = "foo bar"
+        self.a2.save()
+
+        for query in ("tag=foo", "tag=bar&status=up", "status=up"):
+            url = "/api/v1/checks/?" + query
+            doc = self.client.get(url, HTTP_X_API_KEY="abc").json()
+            self.assertEqual([c["name"] for c in doc["checks"]], ["Alice 2"])
+
+        url = "/api/v1/checks/?tag=foo&status=down"
+        doc = self.client.get(url, HTTP_X_API_KEY="abc").json()
+        self.assertEqual(doc["checks"], [])
+
+    def test_status_filter_sees_late_checks(self):
+        self.a2.last_ping = self.now - td(days=1, minutes=30)
+        self.a2.update_next_expected()
+        self.a2.save()
+
+        url = "/api/v1/checks/?status=grace"
+        doc = self.client.get(url, HTTP_X_API_KEY="abc").json()
+        self.assertEqual([c["name"] for c in doc["checks"]], ["Alice 2"])
+
+    def test_it_supports_etag(self):
+        r = self.get()
+        etag = r["ETag"]
+
+        r = self.client.get("/api/v1/checks/", HTTP_X_API_KEY="abc",
+                            HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 304)
+
+        # A ping changes the listing
+        self.client.get("/ping/%s/" % self.a1.code)
+        r = self.client.get("/api/v1/checks/", HTTP_X_API_KEY="abc",
+                            HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertNotEqual(r["ETag"], etag)
@@ -23,7 +23,7 @@ class NotifyTestCase(BaseTestCase):
         self.channel.save()
         self.channel.checks.add(self.check)
 
-    @patch("hc.api.transports.requests.request")
+    @patch("hc.api.transports.requests.Session.request")
     def test_webhook(self, mock_get):
         self._setup_data("webhook", "http://example")
         mock_get.return_value.status_code = 200
@@ -33,7 +33,7 @@ class NotifyTestCase(BaseTestCase):
             "get", u"http://example",
             headers={"User-Agent": "healthchecks.io"}, timeout=5)
 
-    @patch("hc.api.transports.requests.request", side_effect=Timeout)
+    @patch("hc.api.transports.requests.Session.request", side_effect=Timeout)
     def test_webhooks_handle_timeouts(self, mock_get):
         self._setup_data("webhook", "http://example")
         self.channel.notify(self.check)
@@ -41,7 +41,8 @@ class NotifyTestCase(BaseTestCase):
         n = Notification.objects.get()
         self.assertEqual(n.error, "Connection timed out")
 
-    @patch("hc.api.transports.requests.request", side_effect=ConnectionError)
+    @patch("hc.api.transports.requests.Session.request",
+           side_effect=ConnectionError)
     def test_webhooks_handle_connection_errors(self, mock_get):
         self._setup_data("webhook", "http://example")
         self.channel.notify(self.check)
@@ -50,7 +51,29 @@ class NotifyTestCase(BaseTestCase):
         # Test that the web hooks handle connection errors
         self.assertEqual(n.error, "Connection failed")
 
-    @patch("hc.api.transports.requests.request")
+    @patch("hc.api.transports.requests.Session.request",
+           side_effect=ConnectionError)
+    def test_failed_notify_goes_to_outbox(self, mock_get):
+        self._setup_data("webhook", "http://example")
+        self.channel.notify(self.check)
+
+        # A single attempt, the outbox takes care of retries
+        self.assertEqual(mock_get.call_count, 1)
+        n = Notification.objects.get()
+        self.assertEqual(n.attempts, 1)
+        self.assertIsNotNone(n.next_attempt)
+
+    @patch("hc.api.transports.requests.Session.request")
+    def test_successful_notify_stays_out_of_outbox(self, mock_get):
+        self._setup_data("webhook", "http://example")
+        mock_get.return_value.status_code = 200
+        self.channel.notify(self.check)
+
+        n = Notification.objects.get()
+        self.assertEqual(n.error, "")
+        self.assertIsNone(n.next_attempt)
+
+    @patch("hc.api.transports.requests.Session.request")
     def test_webhooks_handle_error_500(self, mock_get):
 
         self._setup_data("webhook", "http://example")
@@ -58,7 +81,7 @@ class NotifyTestCase(BaseTestCase):
         # Test that the web hooks handle error 500s
         mock_get.return_value.status_code = 500
 
-    @patch("hc.api.transports.requests.request")
+    @patch("hc.api.transports.requests.Session.request")
     def test_webhooks_ignore_up_events(self, mock_get):
         self._setup_data("webhook", "http://example", status="up")
         self.channel.notify(self.check)
@@ -66,7 +89,26 @@ class NotifyTestCase(BaseTestCase):
         self.assertFalse(mock_get.called)
         self.assertEqual(Notification.objects.count(), 0)
 
-    @patch("hc.api.transports.requests.request")
+    @patch("hc.api.transports.requests.Session.request")
+    def test_webhook_digest(self, mock_post):
+        self._setup_data("webhook", "http://down\nhttp://up")
+        mock_post.return_value.status_code = 200
+
+        other = Check(user=self.alice, name="Other", status="up")
+        transport = self.channel.transport
+        self.assertTrue(transport.supports_digest)
+        transport.notify_digest([self.check, other])
+
+        self.assertEqual(mock_post.call_count, 2)
+        args, kwargs = mock_post.call_args
+        self.assertEqual(args, ("post", "http://up"))
+        self.assertEqual(kwargs["json"]["checks"][0]["name"], "Other")
+
+    def test_webhook_digest_needs_plain_urls(self):
+        self._setup_data("webhook", "http://host/$CODE")
+        self.assertFalse(self.channel.transport.supports_digest)
+
+    @patch("hc.api.transports.requests.Session.request")
     def test_webhooks_support_variables(self, mock_get):
         template = "http://host/$CODE/$STATUS/$TAG1/$TAG2/?name=$NAME"
         self._setup_data("webhook", template)
@@ -85,7 +127,7 @@ class NotifyTestCase(BaseTestCase):
         self.assertEqual(kwargs["headers"], {"User-Agent": "healthchecks.io"})
         self.assertEqual(kwargs["timeout"], 5)
 
-    @patch("hc.api.transports.requests.request")
+    @patch("hc.api.transports.requests.Session.request")
     def test_webhooks_support_post(self, mock_request):
         template = "http://example.com\n\nThe Time Is $NOW"
         self._setup_data("webhook", template)
@@ -99,7 +141,7 @@ class NotifyTestCase(BaseTestCase):
         # spaces should not have been urlencoded:
         self.assertTrue(kwargs["data"].startswith("The Time Is 2"))
 
-    @patch("hc.api.transports.requests.request")
+    @patch("hc.api.transports.requests.Session.request")
     def test_webhooks_dollarsign_escaping(self, mock_get):
         # If name or tag contains what looks like a variable reference,
         # that should be left alone:
@@ -116,7 +158,7 @@ class NotifyTestCase(BaseTestCase):
         mock_get.assert_called_with(
             "get", url, headers={"User-Agent": "healthchecks.io"}, timeout=5)
 
-    @patch("hc.api.transports.requests.request")
+    @patch("hc.api.transports.requests.Session.request")
     def test_webhook_fires_on_up_event(self, mock_get):
         self._setup_data("webhook", "http://foo\nhttp://bar", status="up")
 
@@ -139,6 +181,23 @@ class NotifyTestCase(BaseTestCase):
         email = mail.outbox[0]
         self.assertTrue("X-Bounce-Url" in email.extra_headers)
 
+    def test_email_digest(self):
+        self._setup_data("email", "alice@example.org")
+        other = Check(user=self.alice, name="Other", status="up")
+        other.save()
+
+        n = Notification(owner=self.check, channel=self.channel)
+        n.save()
+
+        error = self.channel.send_digest([self.check, other], n)
+        self.assertEqual(error, "")
+
+        self.assertEqual(len(mail.outbox), 1)
+        email = mail.outbox[0]
+        self.assertEqual(email.subject, "2 checks changed status")
+        self.assertIn('"Other" has gone up', email.body)
+        self.assertIn(n.bounce_url(), email.extra_headers["X-Bounce-Url"])
+
     def test_it_skips_unverified_email(self):
         self._setup_data("email", "alice@example.org", email_verified=False)
         self.channel.notify(self.check)
@@ -148,7 +207,7 @@ class NotifyTestCase(BaseTestCase):
         self.assertEqual(n.error, "Email not verified")
         self.assertEqual(len(mail.outbox), 0)
 
-    @patch("hc.api.transports.requests.request")
+    @patch("hc.api.transports.requests.Session.request")
     def test_pd(self, mock_post):
         self._setup_data("pd", "123")
         mock_post.return_value.status_code = 200
@@ -160,7 +219,7 @@ class NotifyTestCase(BaseTestCase):
         payload = kwargs["json"]
         self.assertEqual(payload["event_type"], "trigger")
 
-    @patch("hc.api.transports.requests.request")
+    @patch("hc.api.transports.requests.Session.request")
     def test_slack(self, mock_post):
         self._setup_data("slack", "123")
         mock_post.return_value.status_code = 200
@@ -174,7 +233,38 @@ class NotifyTestCase(BaseTestCase):
         fields = {f["title"]: f["value"] for f in attachment["fields"]}
         self.assertEqual(fields["Last Ping"], "Never")
 
-    @patch("hc.api.transports.requests.request")
+    @patch("hc.api.transports.requests.Session.request")
+    def test_slack_digest(self, mock_post):
+        self._setup_data("slack", "123")
+        mock_post.return_value.status_code = 200
+
+        other = Check(user=self.alice, name="Other", status="up")
+        error = self.channel.transport.notify_digest([self.check, other])
+        self.assertIsNone(error)
+
+        args, kwargs = mock_post.call_args
+        payload = kwargs["json"]
+        self.assertEqual(payload["text"], "2 checks changed status.")
+        self.assertEqual(len(payload["attachments"]), 2)
+        self.assertIn("Other", payload["attachments"][1]["text"])
+
+    @patch("hc.api.transports.render.render")
+    @patch("hc.api.transports.requests.Session.request")
+    def test_slack_renders_once_for_many_channels(self, mock_post,
+                                                  mock_render):
+        self._setup_data("slack", "123")
+        mock_post.return_value.status_code = 200
+        mock_render.return_value = "{}"
+
+        other = Channel(user=self.alice, kind="slack", value="456")
+        other.save()
+
+        self.channel.notify(self.check)
+        other.notify(self.check)
+        self.assertEqual(mock_post.call_count, 2)
+        self.assertEqual(mock_render.call_count, 1)
+
+    @patch("hc.api.transports.requests.Session.request")
     def test_slack_with_complex_value(self, mock_post):
         v = json.dumps({"incoming_webhook": {"url": "123"}})
         self._setup_data("slack", v)
@@ -186,7 +276,7 @@ class NotifyTestCase(BaseTestCase):
         args, kwargs = mock_post.call_args
         self.assertEqual(args[1], "123")
 
-    @patch("hc.api.transports.requests.request")
+    @patch("hc.api.transports.requests.Session.request")
     def test_slack_handles_500(self, mock_post):
         self._setup_data("slack", "123")
         mock_post.return_value.status_code = 500
@@ -196,7 +286,7 @@ class NotifyTestCase(BaseTestCase):
         n = Notification.objects.get()
         self.assertEqual(n.error, "Received status code 500")
 
-    @patch("hc.api.transports.requests.request", side_effect=Timeout)
+    @patch("hc.api.transports.requests.Session.request", side_effect=Timeout)
     def test_slack_handles_timeout(self, mock_post):
         self._setup_data("slack", "123")
 
@@ -205,7 +295,7 @@ class NotifyTestCase(BaseTestCase):
         n = Notification.objects.get()
         self.assertEqual(n.error, "Connection timed out")
 
-    @patch("hc.api.transports.requests.request")
+    @patch("hc.api.transports.requests.Session.request")
     def test_hipchat(self, mock_post):
         self._setup_data("hipchat", "123")
         mock_post.return_value.status_code = 204
@@ -218,7 +308,7 @@ class NotifyTestCase(BaseTestCase):
         payload = kwargs["json"]
         self.assertIn("DOWN", payload["message"])
 
-    @patch("hc.api.transports.requests.request")
+    @patch("hc.api.transports.requests.Session.request")
     def test_opsgenie(self, mock_post):
         self._setup_data("opsgenie", "123")
         mock_post.return_value.status_code = 200
@@ -231,7 +321,7 @@ class NotifyTestCase(BaseTestCase):
         payload = kwargs["json"]
         self.assertIn("DOWN", payload["message"])
 
-    @patch("hc.api.transports.requests.request")
+    @patch("hc.api.transports.requests.Session.request")
     def test_pushover(self, mock_post):
         self._setup_data("po", "123|0")
         mock_post.return_value.status_code = 200
@@ -243,7 +333,20 @@ class NotifyTestCase(BaseTestCase):
         payload = kwargs["data"]
         self.assertIn("DOWN", payload["title"])
 
-    @patch("hc.api.transports.requests.request")
+    @patch("hc.api.transports.requests.Session.request")
+    def test_pushover_digest(self, mock_post):
+        self._setup_data("po", "123|0")
+        mock_post.return_value.status_code = 200
+
+        other = Check(user=self.alice, name="Other", status="up")
+        self.channel.transport.notify_digest([self.check, other])
+
+        args, kwargs = mock_post.call_args
+        payload = kwargs["data"]
+        self.assertEqual(payload["title"], "2 checks changed status")
+        self.assertIn("Other", payload["message"])
+
+    @patch("hc.api.transports.requests.Session.request")
     def test_victorops(self, mock_post):
         self._setup_data("victorops", "123")
         mock_post.return_value.status_code = 200
@@ -255,7 +358,7 @@ class NotifyTestCase(BaseTestCase):
         payload = kwargs["json"]
         self.assertEqual(payload["message_type"], "CRITICAL")
 
-    @patch("hc.api.transports.requests.request")
+    @patch("hc.api.transports.requests.Session.request")
     def test_discord(self, mock_post):
         v = json.dumps({"webhook": {"url": "123"}})
         self._setup_data("discord", v)
@@ -270,7 +373,7 @@ class NotifyTestCase(BaseTestCase):
         fields = {f["title"]: f["value"] for f in attachment["fields"]}
         self.assertEqual(fields["Last Ping"], "Never")
 
-    @patch("hc.api.transports.requests.request")
+    @patch("hc.api.transports.requests.Session.request")
     def test_pushbullet(self, mock_post):
         self._setup_data("pushbullet", "fake-token")
         mock_post.return_value.status_code = 200
@@ -0,0 +1,253 @@
+import smtplib
+from datetime import timedelta as td
+
+from django.test.utils import override_settings
+from django.utils import timezone
+from hc.api.management.commands.sendalerts import (Command, deliver,
+                                                   extend_claim)
+from hc.api.models import Channel, Check, Notification
+from hc.lib import emails
+from hc.test import BaseTestCase
+from mock import Mock, patch
+from six import StringIO
+
+
+class OutboxTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(OutboxTestCase, self).setUp()
+
+        self.check = Check(user=self.alice, status="down")
+        self.check.save()
+
+        self.channel = Channel(user=self.alice, kind="webhook")
+        self.channel.value = "http://example"
+        self.channel.save()
+        self.channel.checks.add(self.check)
+
+    def test_enqueue_creates_pending_notification(self):
+        n = self.channel.enqueue(self.check)
+
+        n.refresh_from_db()
+        self.assertEqual(n.check_status, "down")
+        self.assertEqual(n.error, "Sending")
+        self.assertEqual(n.attempts, 0)
+        self.assertTrue(n.next_attempt <= timezone.now())
+
+    def test_enqueue_skips_noop(self):
+        self.check.status = "up"
+        self.assertIsNone(self.channel.enqueue(self.check))
+        self.assertEqual(Notification.objects.count(), 0)
+
+    @patch("hc.api.transports.requests.Session.request")
+    def test_deliver_works(self, mock_request):
+        mock_request.return_value.status_code = 200
+        n = self.channel.enqueue(self.check)
+
+        # Delivery uses the status the check had when it was queued
+        Check.objects.filter(id=self.check.id).update(status="up")
+
+        self.assertEqual(n.deliver(), "")
+        self.assertEqual(mock_request.call_args[0][1], "http://example")
+
+        n.refresh_from_db()
+        self.assertEqual(n.error, "")
+        self.assertEqual(n.attempts, 1)
+        self.assertIsNone(n.next_attempt)
+
+    @override_settings(NOTIFICATION_RETRY_DELAY=60)
+    @patch("hc.api.transports.requests.Session.request")
+    def test_deliver_schedules_retry(self, mock_request):
+        mock_request.return_value.status_code = 500
+        n = self.channel.enqueue(self.check)
+
+        n.deliver()
+        n.refresh_from_db()
+        self.assertEqual(n.error, "Received status code 500")
+        self.assertEqual(n.attempts, 1)
+
+        # 60 seconds plus or minus 50% jitter
+        delay = (n.next_attempt - timezone.now()).total_seconds()
+        self.assertTrue(25 < delay <= 90)
+
+        n.deliver()
+        n.refresh_from_db()
+        delay = (n.next_attempt - timezone.now()).total_seconds()
+        self.assertTrue(55 < delay <= 180)
+
+    @override_settings(NOTIFICATION_MAX_ATTEMPTS=2)
+    @patch("hc.api.transports.requests.Session.request")
+    def test_deliver_gives_up(self, mock_request):
+        mock_request.return_value.status_code = 500
+        n = self.channel.enqueue(self.check)
+
+        n.deliver()
+        n.deliver()
+        n.refresh_from_db()
+        self.assertEqual(n.attempts, 2)
+        self.assertIsNone(n.next_attempt)
+
+    @patch("hc.api.transports.requests.Session.request")
+    def test_deliver_makes_single_request(self, mock_request):
+        mock_request.return_value.status_code = 500
+        n = self.channel.enqueue(self.check)
+
+        n.deliver()
+        self.assertEqual(mock_request.call_count, 1)
+
+    @override_settings(NOTIFICATION_MAX_ATTEMPTS=2)
+    @patch("hc.api.models.traceback")
+    def test_deliver_records_exceptions(self, mock_traceback):
+        self.channel.kind = "po"
+        self.channel.value = "bad value"
+        self.channel.save()
+        n = self.channel.enqueue(self.check)
+
+        n.deliver()
+        n.refresh_from_db()
+        self.assertTrue(n.error.startswith("Unexpected error"))
+        self.assertEqual(n.attempts, 1)
+        self.assertIsNotNone(n.next_attempt)
+
+        # Like any other failure, it is retried only so many times
+        n.deliver()
+        n.refresh_from_db()
+        self.assertEqual(n.attempts, 2)
+        self.assertIsNone(n.next_attempt)
+
+    @patch("hc.lib.mailer.traceback")
+    @patch("hc.lib.mailer.get_connection")
+    def test_deliver_sees_email_errors(self, mock_get_connection,
+                                       mock_traceback):
+        conn = mock_get_connection.return_value
+        conn.send_messages.side_effect = smtplib.SMTPDataError(550, "Nope")
+        # Drop this thread's connection left over from other tests
+        emails.mailer.close()
+
+        self.channel.kind = "email"
+        self.channel.value = "alice@example.org"
+        self.channel.email_verified = True
+        self.channel.save()
+        n = self.channel.enqueue(self.check)
+
+        error = n.deliver()
+        self.assertTrue(error.startswith("SMTPDataError"))
+
+        n.refresh_from_db()
+        self.assertEqual(n.error, error)
+        self.assertIsNotNone(n.next_attempt)
+
+    def test_dispatch_claims_due_notifications(self):
+        n1 = self.channel.enqueue(self.check)
+        n2 = self.channel.enqueue(self.check)
+        n2.next_attempt = timezone.now() + td(minutes=5)
+        n2.save()
+
+        command = Command()
+        command.stdout = StringIO()
+        command.pool = mock_pool = Mock()
+        self.assertEqual(command.dispatch(timezone.now()), 1)
+
+        submitted = mock_pool.submit.call_args[0]
+        self.assertEqual(submitted[0], "webhook")
+        self.assertEqual(submitted[2], n1)
+
+        # n1 is claimed and would get retried only after a timeout
+        n1.refresh_from_db()
+        self.assertTrue(n1.next_attempt > timezone.now())
+
+        # The next thing to dispatch is n2
+        self.assertEqual(command.outbox_next, n2.next_attempt)
+        self.assertEqual(command.dispatch(timezone.now()), 0)
+
+    def test_extend_claim_counts_from_start_of_delivery(self):
+        n = self.channel.enqueue(self.check)
+        # Claimed by dispatch() and waited in the pool past the claim
+        n.next_attempt = timezone.now() - td(seconds=1)
+        Notification.objects.filter(id=n.id).update(
+            next_attempt=n.next_attempt)
+
+        self.assertEqual(extend_claim([n], 300), [n])
+
+        n.refresh_from_db()
+        self.assertTrue(n.next_attempt > timezone.now() + td(seconds=290))
+
+    @patch("hc.api.transports.requests.Session.request")
+    def test_deliver_skips_notification_claimed_again(self, mock_request):
+        n = self.channel.enqueue(self.check)
+        claimed_at = n.next_attempt
+        # Another process has claimed it in the meantime
+        Notification.objects.filter(id=n.id).update(
+            next_attempt=claimed_at + td(minutes=5))
+
+        deliver(n, StringIO(), 300)
+        self.assertFalse(mock_request.called)
+
+        n.refresh_from_db()
+        self.assertEqual(n.attempts, 0)
+        self.assertEqual(n.next_attempt, claimed_at + td(minutes=5))
+
+    def test_enqueue_waits_for_coalescing_window(self):
+        self.channel.coalesce_window = 60
+        self.channel.save()
+
+        n = self.channel.enqueue(self.check)
+        delay = (n.next_attempt - timezone.now()).total_seconds()
+        self.assertTrue(0 < delay <= 60)
+        self.assertEqual(n.next_attempt.second, 0)
+
+    @patch("hc.api.transports.requests.Session.request")
+    def test_notify_leaves_digests_to_outbox(self, mock_request):
+        self.channel.coalesce_window = 60
+        self.channel.save()
+
+        # The synchronous path also waits for the window to close
+        self.assertEqual(self.channel.notify(self.check), "")
+        self.assertFalse(mock_request.called)
+
+        n = Notification.objects.get()
+        self.assertTrue(n.next_attempt > timezone.now())
+
+    def test_enqueue_does_not_wait_without_digest_support(self):
+        self.channel.value = "http://example/$CODE"
+        self.channel.coalesce_window = 60
+        self.channel.save()
+
+        n = self.channel.enqueue(self.check)
+        self.assertTrue(n.next_attempt <= timezone.now())
+
+    def test_dispatch_groups_coalesced_notifications(self):
+        self.channel.coalesce_window = 60
+        self.channel.save()
+
+        n1 = self.channel.enqueue(self.check)
+        n2 = self.channel.enqueue(self.check)
+
+        command = Command()
+        command.stdout = StringIO()
+        command.pool = mock_pool = Mock()
+        self.assertEqual(command.dispatch(n1.next_attempt), 2)
+
+        self.assertEqual(mock_pool.submit.call_count, 1)
+        submitted = mock_pool.submit.call_args[0]
+        self.assertEqual(submitted[0], "webhook")
+        self.assertEqual(submitted[2], [n1, n2])
+
+    @override_settings(NOTIFICATION_RETRY_DELAY=60)
+    @patch("hc.api.transports.requests.Session.request")
+    def test_deliver_digest_retries_together(self, mock_request):
+        mock_request.return_value.status_code = 500
+
+        n1 = self.channel.enqueue(self.check)
+        n2 = self.channel.enqueue(self.check)
+
+        error = Notification.deliver_digest([n1, n2])
+        self.assertEqual(error, "Received status code 500")
+        # A single request for both notifications
+        self.assertEqual(mock_request.call_count, 1)
+
+        n1.refresh_from_db()
+        n2.refresh_from_db()
+        self.assertEqual(n1.attempts, 1)
+        self.assertEqual(n2.error, "Received status code 500")
+        self.assertEqual(n1.next_attempt, n2.next_attempt)
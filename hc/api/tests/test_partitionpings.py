@@ -0,0 +1,94 @@
+from datetime import datetime
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import SimpleTestCase, TransactionTestCase
+from django.test.utils import override_settings
+from django.utils import timezone
+from six import StringIO
+
+from hc.api.management.commands import partitionpings
+from hc.api.models import Check, Ping
+
+
+def _dt(year, month, day=1):
+    return datetime(year, month, day, tzinfo=timezone.utc)
+
+
+class PartitionHelpersTestCase(SimpleTestCase):
+
+    def test_month_arithmetic(self):
+        add_months = partitionpings.add_months
+        self.assertEqual(partitionpings.month_start(_dt(2017, 3, 15)),
+                         _dt(2017, 3))
+        self.assertEqual(add_months(_dt(2017, 11), 2), _dt(2018, 1))
+        self.assertEqual(add_months(_dt(2017, 1), 12), _dt(2018, 1))
+
+    def test_it_parses_partition_names(self):
+        partition_range = partitionpings.partition_range
+        self.assertEqual(partition_range("api_ping_p201712"),
+                         (_dt(2017, 12), _dt(2018, 1)))
+        self.assertEqual(partition_range("api_ping_until_201705"),
+                         (None, _dt(2017, 5)))
+        self.assertIsNone(partition_range("api_ping_default"))
+        self.assertIsNone(partition_range("api_ping_p2017"))
+
+    @skipUnless(connection.vendor != "postgresql", "needs another database")
+    def test_it_requires_postgres(self):
+        with self.assertRaises(CommandError):
+            call_command("partitionpings")
+
+
+@skipUnless(connection.vendor == "postgresql", "needs PostgreSQL")
+class PartitionPingsTestCase(TransactionTestCase):
+
+    def test_it_converts_and_keeps_pings(self):
+        check = Check.objects.create()
+        Ping.objects.create(owner=check)
+
+        out = StringIO()
+        call_command("partitionpings", convert=True, stdout=out)
+        self.assertIn("Converted", out.getvalue())
+
+        # Old and new pings are both visible through api_ping
+        self.client.get("/ping/%s/" % check.code)
+        self.assertEqual(Ping.objects.filter(owner=check).count(), 2)
+
+        # Nothing is old enough to drop yet
+        with override_settings(PING_RETENTION_DAYS=1):
+            out = StringIO()
+            call_command("partitionpings", stdout=out)
+            self.assertNotIn("Dropped", out.getvalue())
+
+    def test_it_moves_pings_out_of_default_partition(self):
+        call_command("partitionpings", convert=True, stdout=StringIO())
+
+        # No partition covers this month yet, the ping goes to default
+        check = Check.objects.create()
+        month = partitionpings.add_months(
+            partitionpings.month_start(timezone.now()), 3)
+        Ping.objects.create(owner=check, created=month)
+
+        out = StringIO()
+        with override_settings(PING_PARTITIONS_AHEAD=3):
+            call_command("partitionpings", stdout=out)
+
+        name = partitionpings.MONTHLY % (month.year, month.month)
+        self.assertIn("Created partition %s" % name, out.getvalue())
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT COUNT(*) FROM %s" % name)
+            self.assertEqual(cursor.fetchone()[0], 1)
+
+    def test_it_deletes_old_pings_from_legacy_partition(self):
+        check = Check.objects.create()
+        Ping.objects.create(owner=check, created=_dt(2000, 1))
+        Ping.objects.create(owner=check)
+
+        out = StringIO()
+        with override_settings(PING_RETENTION_DAYS=30):
+            call_command("partitionpings", convert=True, stdout=out)
+
+        self.assertIn("Deleted 1 old pings", out.getvalue())
+        self.assertEqual(Ping.objects.filter(owner=check).count(), 1)
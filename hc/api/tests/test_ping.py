@@ -1,6 +1,13 @@
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
 from django.test import Client, TestCase
+from django.test.utils import override_settings
+from mock import patch
 
 from hc.api.models import Check, Ping
+from hc.lib import bus
 
 
 class PingTestCase(TestCase):
@@ -20,6 +27,106 @@ class PingTestCase(TestCase):
         ping = Ping.objects.latest("id")
         assert ping.scheme == "http"
 
+    def test_it_increments_n_pings(self):
+        self.client.get("/ping/%s/" % self.check.code)
+        self.client.get("/ping/%s/" % self.check.code)
+
+        self.check.refresh_from_db()
+        self.assertEqual(self.check.n_pings, 2)
+
+        ping = Ping.objects.latest("id")
+        self.assertEqual(ping.n, 2)
+
+    def test_it_wakes_sendalerts_for_down_check(self):
+        self.check.status = "down"
+        self.check.save()
+
+        subscription = bus.subscribe(bus.ALERTS)
+        try:
+            self.client.get("/ping/%s/" % self.check.code)
+            messages = subscription.get(timeout=1)
+        finally:
+            subscription.close()
+
+        self.assertEqual(messages, [
+            {"event": "ping", "code": str(self.check.code)}])
+
+    def test_it_publishes_ping_event_only_with_events_enabled(self):
+        self.check.user = User.objects.create(username="alice")
+        self.check.save()
+
+        subscription = bus.subscribe(bus.user_channel(self.check.user_id))
+        try:
+            self.client.get("/ping/%s/" % self.check.code)
+            self.assertEqual(subscription.get(timeout=0.1), [])
+
+            with override_settings(EVENTS_ENABLED=True):
+                self.client.get("/ping/%s/" % self.check.code)
+                messages = subscription.get(timeout=1)
+        finally:
+            subscription.close()
+
+        self.assertEqual(messages, [
+            {"event": "ping", "code": str(self.check.code)}])
+
+    def test_it_handles_cron_check(self):
+        self.check.kind = "cron"
+        self.check.schedule = "5 * * * *"
+        self.check.save()
+
+        r = self.client.get("/ping/%s/" % self.check.code)
+        assert r.status_code == 200
+
+        self.check.refresh_from_db()
+        self.assertEqual(self.check.status, "up")
+        self.assertEqual(self.check.alert_after, self.check.get_alert_after())
+        self.assertEqual(self.check.alert_after.minute, 5)
+
+    @skipUnless(connection.vendor == "postgresql", "needs PostgreSQL")
+    def test_it_uses_single_statement(self):
+        with self.assertNumQueries(1):
+            r = self.client.get("/ping/%s/" % self.check.code)
+            assert r.status_code == 200
+
+    @skipUnless(connection.vendor == "postgresql", "needs PostgreSQL")
+    def test_it_uses_two_statements_for_cron_check(self):
+        self.check.kind = "cron"
+        self.check.schedule = "5 * * * *"
+        self.check.save()
+
+        with self.assertNumQueries(2):
+            r = self.client.get("/ping/%s/" % self.check.code)
+            assert r.status_code == 200
+
+        self.check.refresh_from_db()
+        self.assertEqual(self.check.n_pings, 1)
+        self.assertEqual(self.check.alert_after.minute, 5)
+        self.assertEqual(Ping.objects.get().n, 1)
+
+    @skipUnless(connection.vendor == "postgresql", "needs PostgreSQL")
+    def test_missing_check_takes_single_statement(self):
+        with self.assertNumQueries(1):
+            r = self.client.get("/ping/07c2f548-9850-4b27-af5d-6c9dc157ec02/")
+            assert r.status_code == 404
+
+    @override_settings(PING_BUFFER_ENABLED=True)
+    @patch("hc.api.models.ping_buffer")
+    def test_it_buffers_ping(self, mock_buffer):
+        r = self.client.get("/ping/%s/" % self.check.code)
+        assert r.status_code == 200
+
+        # Check's state is updated right away
+        self.check.refresh_from_db()
+        self.assertEqual(self.check.status, "up")
+        self.assertEqual(self.check.n_pings, 1)
+
+        # The Ping goes to the buffer instead of the database
+        self.assertEqual(Ping.objects.count(), 0)
+        ping, = mock_buffer.add.call_args[0]
+        self.assertEqual(ping.owner_id, self.check.id)
+        self.assertEqual(ping.n, 1)
+        self.assertEqual(ping.created, self.check.last_ping)
+
     def test_it_changes_status_of_paused_check(self):
         self.check.status = "paused"
         self.check.save()
@@ -0,0 +1,96 @@
+import json
+import uuid
+from datetime import timedelta as td
+
+from django.test import TestCase
+from django.utils import timezone
+
+from hc.api.models import EPOCH, Check, Ping
+
+
+class PingBatchTestCase(TestCase):
+
+    def setUp(self):
+        super(PingBatchTestCase, self).setUp()
+        self.now = timezone.now().replace(microsecond=0)
+        self.a = Check.objects.create()
+        self.b = Check.objects.create(status="paused", kind="cron",
+                                      schedule="0 * * * *")
+
+    def post(self, pings):
+        return self.client.post("/ping/batch/", json.dumps({"pings": pings}),
+                                content_type="application/json")
+
+    def timestamp(self, dt):
+        return int((dt - EPOCH).total_seconds())
+
+    def test_it_works(self):
+        unknown = str(uuid.uuid4())
+        r = self.post([{"code": str(self.a.code)},
+                       {"code": str(self.b.code)},
+                       {"code": unknown}])
+
+        self.assertEqual(r.json(), {"recorded": 2, "unknown": [unknown]})
+
+        for check in (self.a, self.b):
+            check.refresh_from_db()
+            self.assertEqual(check.status, "up")
+            self.assertEqual(check.n_pings, 1)
+            self.assertEqual(check.alert_after, check.get_alert_after())
+
+        self.assertEqual(Ping.objects.count(), 2)
+
+    def test_it_records_buffered_pings(self):
+        earlier = self.now - td(hours=2)
+        r = self.post([
+            {"code": str(self.a.code), "timestamp": self.timestamp(earlier)},
+            {"code": str(self.a.code),
+             "timestamp": self.timestamp(earlier + td(hours=1))}
+        ])
+
+        self.assertEqual(r.json()["recorded"], 2)
+        self.a.refresh_from_db()
+        self.assertEqual(self.a.n_pings, 2)
+        self.assertEqual(self.a.last_ping, earlier + td(hours=1))
+        self.assertEqual(self.a.next_expected,
+                         earlier + td(hours=1) + self.a.timeout)
+
+        pings = Ping.objects.order_by("n")
+        self.assertEqual([p.created for p in pings],
+                         [earlier, earlier + td(hours=1)])
+
+    def test_it_accepts_float_timestamps(self):
+        earlier = self.now - td(hours=2, microseconds=-500000)
+        timestamp = (earlier - EPOCH).total_seconds()
+        r = self.post([{"code": str(self.a.code), "timestamp": timestamp},
+                       {"code": str(self.b.code), "timestamp": 1e9}])
+
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json()["recorded"], 2)
+
+        self.a.refresh_from_db()
+        self.assertEqual(self.a.last_ping, earlier)
+
+    def test_older_pings_dont_move_last_ping_back(self):
+        self.client.get("/ping/%s/" % self.a.code)
+        self.a.refresh_from_db()
+        last_ping = self.a.last_ping
+
+        earlier = self.now - td(hours=2)
+        self.post([{"code": str(self.a.code),
+                    "timestamp": self.timestamp(earlier)}])
+
+        self.a.refresh_from_db()
+        self.assertEqual(self.a.n_pings, 2)
+        self.assertEqual(self.a.last_ping, last_ping)
+
+    def test_it_rejects_bad_input(self):
+        for pings in ([{"code": "foo"}], [{"code": 123}],
+                      [{"code": str(self.a.code), "timestamp": "foo"}],
+                      [{"code": str(self.a.code), "timestamp": True}],
+                      [{"code": str(self.a.code), "timestamp": float("nan")}]):
+            r = self.post(pings)
+            self.assertEqual(r.status_code, 400)
+
+        r = self.client.post("/ping/batch/", "{", "application/json")
+        self.assertEqual(r.status_code, 400)
@@ -1,10 +1,13 @@
 from datetime import timedelta
 from mock import patch
+from six import StringIO
 
 from django.core.management import call_command
+from django.test.utils import override_settings
 from django.utils import timezone
-from hc.api.management.commands.sendalerts import Command
-from hc.api.models import Check
+from hc.api.management.commands.sendalerts import Command, notify_on_thread
+from hc.api.models import Channel, Check, Lease, Notification
+from hc.lib import bus
 from hc.test import BaseTestCase
 
 
@@ -39,6 +42,24 @@ class SendAlertsTestCase(BaseTestCase):
         # It should call `notify_on_thread`
         self.assertTrue(mock_notify.called)
 
+    @override_settings(EVENTS_ENABLED=True)
+    @patch("hc.api.management.commands.sendalerts.notify_on_thread")
+    def test_it_publishes_status_event(self, mock_notify):
+        check = Check(user=self.alice, status="up")
+        check.last_ping = timezone.now() - timedelta(days=2)
+        check.alert_after = check.get_alert_after()
+        check.save()
+
+        subscription = bus.subscribe(bus.user_channel(self.alice.id))
+        try:
+            Command().handle_one()
+            messages = subscription.get(timeout=1)
+        finally:
+            subscription.close()
+
+        self.assertEqual(messages, [{
+            "event": "status", "code": str(check.code), "status": "down"}])
+
     @patch("hc.api.management.commands.sendalerts.notify_on_thread")
     def test_it_notifies_when_check_goes_up(self, mock_notify):
         check = Check(user=self.alice, status="down")
@@ -93,3 +114,150 @@ class SendAlertsTestCase(BaseTestCase):
 
         # It should call `notify` instead of `notify_on_thread`
         self.assertTrue(mock_notify.called)
+
+    @patch("hc.api.management.commands.sendalerts.notify_on_thread")
+    def test_it_handles_checks_in_batches(self, mock_notify):
+        for i in range(0, 3):
+            check = Check(user=self.alice, status="up")
+            check.last_ping = timezone.now() - timedelta(days=2)
+            check.alert_after = check.get_alert_after()
+            check.save()
+
+        command = Command()
+        command.batch_size = 2
+
+        now = timezone.now()
+        self.assertEqual(command.handle_batches(command.going_down(now)), 3)
+        self.assertEqual(Check.objects.filter(status="down").count(), 3)
+        self.assertEqual(mock_notify.call_count, 3)
+
+    def test_it_loads_upcoming_deadlines(self):
+        now = timezone.now()
+
+        check = Check(user=self.alice, status="up")
+        check.alert_after = now + timedelta(seconds=30)
+        check.save()
+
+        # This one is too far in the future:
+        check = Check(user=self.alice, status="up")
+        check.alert_after = now + timedelta(days=1)
+        check.save()
+
+        command = Command()
+        command.refresh_deadlines(now)
+        self.assertEqual(command.deadlines, [now + timedelta(seconds=30)])
+
+    def test_it_sleeps_until_next_deadline(self):
+        check = Check(user=self.alice, status="up")
+        check.alert_after = timezone.now() + timedelta(seconds=1)
+        check.save()
+
+        command = Command()
+        command.stdout = StringIO()
+
+        sleep = command.run_once()
+        self.assertTrue(0 < sleep <= 1.01)
+
+        # Nothing to do, it should print a MARK line
+        self.assertTrue("MARK" in command.stdout.getvalue())
+
+    def test_it_polls_down_checks_when_due_or_woken(self):
+        command = Command()
+        command.stdout = StringIO()
+        command.poll_interval = 60
+        command.run_once()
+
+        check = Check(user=self.alice, status="down")
+        check.last_ping = timezone.now()
+        check.alert_after = check.get_alert_after()
+        check.save()
+
+        # The next poll is not due yet
+        self.assertTrue(55 < command.run_once() <= 60)
+        check.refresh_from_db()
+        self.assertEqual(check.status, "down")
+
+        command.run_once(woken=True)
+        check.refresh_from_db()
+        self.assertEqual(check.status, "up")
+
+    @override_settings(NOTIFICATION_WORKERS=2, NOTIFICATION_QUEUE_SIZE=3,
+                       NOTIFICATION_KIND_LIMITS={"email": 1})
+    def test_it_sizes_pool_from_settings(self):
+        command = Command()
+        self.assertEqual(command.pool.workers, 2)
+        self.assertEqual(command.pool.queue_size, 3)
+        self.assertEqual(command.pool.limits, {"email": 1})
+
+    def _worker(self, name, shard, num_shards=2):
+        command = Command()
+        command.stdout = StringIO()
+        command.name = name
+        command.shard = shard
+        command.num_shards = num_shards
+        command.started = timezone.now() - timedelta(hours=1)
+        return command
+
+    def test_it_claims_preferred_shard(self):
+        w1 = self._worker("w1", 0)
+        w2 = self._worker("w2", 1)
+
+        now = timezone.now()
+        w1.claim_shards(now)
+        w2.claim_shards(now)
+        self.assertEqual(w1.shards, [0])
+        self.assertEqual(w2.shards, [1])
+
+        lease = Lease.objects.get(shard=0)
+        self.assertEqual(lease.owner, "w1")
+        self.assertFalse(lease.borrowed)
+
+    def test_it_takes_over_dead_workers_shard(self):
+        w1 = self._worker("w1", 0)
+        w2 = self._worker("w2", 1)
+
+        now = timezone.now()
+        w1.claim_shards(now)
+        w2.claim_shards(now)
+
+        # w2 stops renewing its lease. Once it has been expired
+        # for a whole lease_ttl, w1 takes over:
+        later = now + timedelta(seconds=w1.lease_ttl * 2 + 1)
+        w1.claim_shards(later)
+        self.assertEqual(w1.shards, [0, 1])
+        self.assertTrue(Lease.objects.get(shard=1).borrowed)
+
+        # When w2 comes back, it gets its preferred shard back
+        w2.claim_shards(later)
+        self.assertEqual(w2.shards, [1])
+
+        w1.claim_shards(later + timedelta(seconds=1))
+        self.assertEqual(w1.shards, [0])
+
+    def test_it_processes_only_own_shard(self):
+        checks = []
+        for i in range(0, 2):
+            check = Check(user=self.alice, status="up")
+            check.last_ping = timezone.now() - timedelta(days=2)
+            check.alert_after = check.get_alert_after()
+            check.save()
+            checks.append(check)
+
+        w = self._worker("w1", checks[0].id % 2)
+        w.claim_shards(timezone.now())
+
+        now = timezone.now()
+        self.assertEqual(list(w.going_down(now)), [checks[0]])
+
+    def test_it_queues_notification_per_channel(self):
+        check = Check.objects.create(user=self.alice, status="down")
+        for kind in ("email", "slack"):
+            channel = Channel.objects.create(user=self.alice, kind=kind)
+            channel.checks.add(check)
+
+        notify_on_thread(check.id, StringIO())
+
+        q = Notification.objects.filter(owner=check)
+        q = q.filter(next_attempt__isnull=False)
+        kinds = q.values_list("channel__kind", flat=True)
+        self.assertEqual(sorted(kinds), ["email", "slack"])
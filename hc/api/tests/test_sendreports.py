@@ -1,5 +1,7 @@
 from datetime import timedelta as td
 
+from django.core import mail
+from django.test.utils import override_settings
 from django.utils.timezone import now
 from hc.api.management.commands.sendreports import Command
 from hc.api.models import Check
@@ -47,3 +49,21 @@ class SendAlertsTestCase(BaseTestCase):
 
         sent = Command().handle_one_run()
         self.assertEqual(sent, 0)
+
+    def test_it_pages_through_profiles(self):
+        self.bob.date_joined = now() - td(days=365)
+        self.bob.save()
+        Check(user=self.bob, last_ping=now()).save()
+
+        command = Command()
+        command.chunk_size = 1
+        self.assertEqual(command.handle_one_run(), 2)
+
+        recipients = sorted(m.to[0] for m in mail.outbox)
+        self.assertEqual(recipients, ["alice@example.org", "bob@example.org"])
+
+    @override_settings(REPORT_WORKERS=2, REPORT_QUEUE_SIZE=3)
+    def test_it_sizes_pool_from_settings(self):
+        command = Command()
+        self.assertEqual(command.pool.workers, 2)
+        self.assertEqual(command.pool.queue_size, 3)
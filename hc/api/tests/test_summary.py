@@ -0,0 +1,116 @@
+from datetime import timedelta as td
+
+from django.utils import timezone
+from hc.api.management.commands.sendalerts import Command
+from hc.api.models import Check, Summary
+from hc.test import BaseTestCase
+from six import StringIO
+
+
+class SummaryTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(SummaryTestCase, self).setUp()
+        self.now = timezone.now()
+
+    def _check(self, status="up", age=None, tags=""):
+        check = Check(user=self.alice, status=status, tags=tags)
+        if age is not None:
+            check.last_ping = self.now - age
+            check.update_next_expected()
+        check.save()
+        return check
+
+    def test_it_counts_statuses_and_tags(self):
+        self._check(age=td(hours=1), tags="foo")
+        self._check(age=td(days=1, minutes=30), tags="foo bar")
+        self._check(age=td(days=3), tags="baz")
+        self._check(status="new", tags="foo")
+
+        summary = Summary.objects.for_user(self.alice, self.now)
+        self.assertEqual(summary.num_up, 1)
+        self.assertEqual(summary.num_grace, 1)
+        self.assertEqual(summary.num_down, 1)
+        self.assertEqual(summary.num_new, 1)
+        self.assertEqual(summary.tags_list(),
+                         [("foo", 3), ("bar", 1), ("baz", 1)])
+        self.assertEqual(summary.down_tags_set(), set(["baz"]))
+        self.assertEqual(summary.grace_tags_set(), set(["foo", "bar"]))
+
+    def test_it_is_valid_until_next_grace_period(self):
+        check = self._check(age=td(hours=1))
+
+        summary = Summary.objects.for_user(self.alice, self.now)
+        self.assertEqual(summary.valid_until, check.next_expected)
+
+        # While valid, the summary is a single-row read
+        with self.assertNumQueries(1):
+            Summary.objects.for_user(self.alice, self.now)
+
+    def test_saving_check_invalidates(self):
+        check = self._check(age=td(hours=1))
+        Summary.objects.for_user(self.alice, self.now)
+
+        check.tags = "foo"
+        check.save()
+
+        summary = Summary.objects.get(user=self.alice)
+        self.assertIsNone(summary.valid_until)
+        self.assertEqual(Summary.objects.for_user(self.alice).tags_list(),
+                         [("foo", 1)])
+
+    def test_ping_to_up_check_keeps_summary(self):
+        check = self._check(age=td(hours=1))
+        Summary.objects.for_user(self.alice, self.now)
+
+        self.client.get("/ping/%s/" % check.code)
+
+        summary = Summary.objects.get(user=self.alice)
+        self.assertIsNotNone(summary.valid_until)
+
+    def test_ping_to_late_check_invalidates(self):
+        check = self._check(age=td(days=1, minutes=30))
+        Summary.objects.for_user(self.alice, self.now)
+
+        self.client.get("/ping/%s/" % check.code)
+
+        summary = Summary.objects.get(user=self.alice)
+        self.assertIsNone(summary.valid_until)
+
+    def test_sendalerts_transition_invalidates(self):
+        check = self._check(age=td(days=3))
+        Check.objects.filter(id=check.id).update(status="up")
+        Summary.objects.for_user(self.alice, self.now)
+
+        command = Command()
+        command.stdout = StringIO()
+        command.handle_check(check, use_threads=False)
+
+        summary = Summary.objects.get(user=self.alice)
+        self.assertIsNone(summary.valid_until)
+
+    def test_it_serves_stale_summary_while_refreshing(self):
+        self._check(age=td(days=3), tags="foo")
+        Summary.objects.for_user(self.alice, self.now)
+        Summary.objects.invalidate(self.alice.id)
+
+        # Another request is recomputing it
+        until = self.now + td(seconds=30)
+        Summary.objects.filter(user=self.alice).update(refreshing_until=until)
+
+        with self.assertNumQueries(2):
+            summary = Summary.objects.for_user(self.alice, self.now,
+                                               stale_ok=True)
+        self.assertIsNone(summary.valid_until)
+        self.assertEqual(summary.down_tags_set(), set(["foo"]))
+
+    def test_stale_ok_recomputes_once(self):
+        self._check(age=td(days=3), tags="foo")
+
+        summary = Summary.objects.for_user(self.alice, self.now,
+                                           stale_ok=True)
+        self.assertEqual(summary.down_tags_set(), set(["foo"]))
+
+        summary = Summary.objects.get(user=self.alice)
+        self.assertIsNotNone(summary.valid_until)
+        self.assertIsNone(summary.refreshing_until)
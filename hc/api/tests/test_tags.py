@@ -0,0 +1,39 @@
+from hc.api.models import Check, Tag, tag_filter
+from hc.test import BaseTestCase
+
+
+class TagsTestCase(BaseTestCase):
+
+    def _names(self, check):
+        return set(check.tag_set.values_list("name", flat=True))
+
+    def test_save_syncs_tags(self):
+        check = Check(user=self.alice, tags="foo bar foo")
+        check.save()
+        self.assertEqual(self._names(check), set(["foo", "bar"]))
+
+        check = Check.objects.get(id=check.id)
+        check.tags = "bar baz"
+        check.save()
+        self.assertEqual(self._names(check), set(["bar", "baz"]))
+
+        # Saving without changing tags leaves the tag table alone, the
+        # queries are the UPDATE and the summary invalidation
+        with self.assertNumQueries(2):
+            check.name = "Renamed"
+            check.save()
+
+    def test_filter_matches_whole_tags(self):
+        foo = Check.objects.create(user=self.alice, tags="foo")
+        Check.objects.create(user=self.alice, tags="foobar fo")
+
+        q = Check.objects.filter(tag_filter("foo"))
+        self.assertEqual(list(q), [foo])
+
+    def test_it_counts_tags(self):
+        Check.objects.create(user=self.alice, tags="foo bar")
+        Check.objects.create(user=self.alice, tags="foo")
+        Check.objects.create(user=self.bob, tags="baz")
+
+        self.assertEqual(Tag.objects.counts(self.alice),
+                         [("foo", 2), ("bar", 1)])
@@ -1,19 +1,65 @@
 from django.conf import settings
-from django.template.loader import render_to_string
 from django.utils import timezone
 import json
 import requests
 from six.moves.urllib.parse import quote
 
-from hc.lib import emails
+from hc.lib import emails, render
+from hc.lib.sessions import SessionRegistry
+
+
+# Shared by all HTTP transports
+sessions = SessionRegistry(max_hosts=settings.HTTP_POOL_HOSTS,
+                           pool_size=settings.HTTP_POOL_SIZE,
+                           idle_timeout=settings.HTTP_POOL_IDLE_TIMEOUT)
+
+# Compiled at sendalerts startup, see hc.lib.render
+TEMPLATES = (
+    "emails/alert-subject.html",
+    "emails/alert-body-text.html",
+    "emails/alert-body-html.html",
+    "emails/digest-subject.html",
+    "emails/digest-body-text.html",
+    "emails/digest-body-html.html",
+    "emails/summary-text.html",
+    "emails/summary-html.html",
+    "integrations/hipchat_message.html",
+    "integrations/opsgenie_message.html",
+    "integrations/opsgenie_note.html",
+    "integrations/pd_description.html",
+    "integrations/pushbullet_message.html",
+    "integrations/pushover_digest_message.html",
+    "integrations/pushover_digest_title.html",
+    "integrations/pushover_message.html",
+    "integrations/pushover_title.html",
+    "integrations/slack_digest.json",
+    "integrations/slack_message.json",
+    "integrations/victorops_description.html",
+)
 
 
 def tmpl(template_name, **ctx):
     template_path = "integrations/%s" % template_name
-    return render_to_string(template_path, ctx).strip()
+    return render.render(template_path, ctx).strip()
+
+
+def transition(check):
+    """ Return a key that identifies check's current state. """
+
+    return (check.code, check.status, check.last_ping, check.n_pings)
+
+
+def check_tmpl(template_name, check):
+    """ Render a template about `check`, sharing it between channels. """
+
+    key = (template_name, transition(check))
+    return render.cached(key, lambda: tmpl(template_name, check=check))
 
 
 class Transport(object):
+    # Set in transports that implement notify_digest()
+    supports_digest = False
+
     def __init__(self, channel):
         self.channel = channel
 
@@ -27,6 +73,16 @@ class Transport(object):
 
         raise NotImplementedError()
 
+    def notify_digest(self, checks):
+        """ Send a single notification about several checks.
+
+        Each check in `checks` carries the status to notify about.
+        Returns None on success, and error message on error.
+
+        """
+
+        raise NotImplementedError()
+
     def is_noop(self, check):
         """ Return True if transport will ignore check's current status.
 
@@ -43,6 +99,21 @@ class Transport(object):
 
 
 class Email(Transport):
+    supports_digest = True
+
+    def summary(self, template_name, check):
+        """ Render the summary of all checks, sharing it between channels.
+
+        All of a check's email channels belong to the same user, so they
+        show the same summary.
+
+        """
+
+        key = (template_name, self.channel.user_id, transition(check))
+        path = "emails/%s" % template_name
+        ctx = {"checks": self.checks()}
+        return render.cached(key, lambda: render.render(path, ctx))
+
     def notify(self, check, bounce_url):
         if not self.channel.email_verified:
             return "Email not verified"
@@ -51,15 +122,34 @@ class Email(Transport):
 
         ctx = {
             "check": check,
+            "summary_html": self.summary("summary-html.html", check),
+            "summary_text": self.summary("summary-text.html", check),
+            "now": timezone.now(),
+            "unsub_link": self.channel.get_unsub_link()
+        }
+
+        return emails.alert(self.channel.value, ctx, headers)
+
+    def notify_digest(self, checks, bounce_url):
+        if not self.channel.email_verified:
+            return "Email not verified"
+
+        headers = {"X-Bounce-Url": bounce_url}
+
+        ctx = {
+            "changed": checks,
             "checks": self.checks(),
             "now": timezone.now(),
             "unsub_link": self.channel.get_unsub_link()
         }
 
-        emails.alert(self.channel.value, ctx, headers)
+        return emails.digest(self.channel.value, ctx, headers)
 
 
 class HttpTransport(Transport):
+    # Anything with a requests-style request() method. Swapping in the
+    # `requests` module itself gives a fresh connection per request.
+    session = sessions
 
     def _request(self, method, url, **kwargs):
         try:
@@ -70,7 +160,7 @@ class HttpTransport(Transport):
             options["timeout"] = 5
             options["headers"]["User-Agent"] = "healthchecks.io"
 
-            r = requests.request(method, url, **options)
+            r = self.session.request(method, url, **options)
             if r.status_code not in (200, 201, 204):
                 return "Received status code %d" % r.status_code
         except requests.exceptions.Timeout:
@@ -79,26 +169,22 @@ class HttpTransport(Transport):
         except requests.exceptions.ConnectionError:
             return "Connection failed"
 
+    # A single attempt each: failed notifications get retried later,
+    # with backoff, by the outbox
     def get(self, url):
-        # Make 3 attempts--
-        for x in range(0, 3):
-            error = self._request("get", url)
-            if error is None:
-                break
-
-        return error
+        return self._request("get", url)
 
     def post(self, url, **kwargs):
-        # Make 3 attempts--
-        for x in range(0, 3):
-            error = self._request("post", url, **kwargs)
-            if error is None:
-                break
-
-        return error
+        return self._request("post", url, **kwargs)
 
 
 class Webhook(HttpTransport):
+    @property
+    def supports_digest(self):
+        # Digests are posted as JSON, so they are not possible with
+        # per-check variables in URLs or a custom request body
+        return "$" not in self.channel.value and not self.channel.post_data
+
     def prepare(self, template, check, urlencode=False):
         """ Replace variables with actual values.
 
@@ -154,17 +240,46 @@ class Webhook(HttpTransport):
         else:
             return self.get(url)
 
+    def notify_digest(self, checks):
+        error = None
+        for status in ("down", "up"):
+            url = self.channel.value_down
+            if status == "up":
+                url = self.channel.value_up
+
+            group = [check for check in checks if check.status == status]
+            if not url or not group:
+                continue
+
+            payload = {"checks": [{
+                "code": str(check.code),
+                "name": check.name,
+                "status": check.status,
+                "tags": check.tags_list()
+            } for check in group]}
+
+            error = self.post(url, json=payload) or error
+
+        return error
+
 
 class Slack(HttpTransport):
+    supports_digest = True
+
     def notify(self, check):
-        text = tmpl("slack_message.json", check=check)
+        text = check_tmpl("slack_message.json", check)
+        payload = json.loads(text)
+        return self.post(self.channel.slack_webhook_url, json=payload)
+
+    def notify_digest(self, checks):
+        text = tmpl("slack_digest.json", checks=checks)
         payload = json.loads(text)
         return self.post(self.channel.slack_webhook_url, json=payload)
 
 
 class HipChat(HttpTransport):
     def notify(self, check):
-        text = tmpl("hipchat_message.html", check=check)
+        text = check_tmpl("hipchat_message.html", check)
         payload = {
             "message": text,
             "color": "green" if check.status == "up" else "red",
@@ -183,8 +298,8 @@ class OpsGenie(HttpTransport):
 
         if check.status == "down":
             payload["tags"] = ",".join(check.tags_list())
-            payload["message"] = tmpl("opsgenie_message.html", check=check)
-            payload["note"] = tmpl("opsgenie_note.html", check=check)
+            payload["message"] = check_tmpl("opsgenie_message.html", check)
+            payload["note"] = check_tmpl("opsgenie_note.html", check)
 
         url = "https://api.opsgenie.com/v1/json/alert"
         if check.status == "up":
@@ -197,7 +312,7 @@ class PagerDuty(HttpTransport):
     URL = "https://events.pagerduty.com/generic/2010-04-15/create_event.json"
 
     def notify(self, check):
-        description = tmpl("pd_description.html", check=check)
+        description = check_tmpl("pd_description.html", check)
         payload = {
             "service_key": self.channel.value,
             "incident_key": str(check.code),
@@ -212,7 +327,7 @@ class PagerDuty(HttpTransport):
 
 class Pushbullet(HttpTransport):
     def notify(self, check):
-        text = tmpl("pushbullet_message.html", check=check)
+        text = check_tmpl("pushbullet_message.html", check)
         url = "https://api.pushbullet.com/v2/pushes"
         headers = {
             "Access-Token": self.channel.value,
@@ -229,6 +344,7 @@ class Pushbullet(HttpTransport):
 
 class Pushover(HttpTransport):
     URL = "https://api.pushover.net/1/messages.json"
+    supports_digest = True
 
     def notify(self, check):
         others = self.checks().filter(status="down").exclude(code=check.code)
@@ -237,7 +353,15 @@ class Pushover(HttpTransport):
             "down_checks": others,
         }
         text = tmpl("pushover_message.html", **ctx)
-        title = tmpl("pushover_title.html", **ctx)
+        title = check_tmpl("pushover_title.html", check)
+        return self.send(title, text)
+
+    def notify_digest(self, checks):
+        text = tmpl("pushover_digest_message.html", checks=checks)
+        title = tmpl("pushover_digest_title.html", checks=checks)
+        return self.send(title, text)
+
+    def send(self, title, text):
         user_key, prio = self.channel.value.split("|")
         payload = {
             "token": settings.PUSHOVER_API_TOKEN,
@@ -258,7 +382,7 @@ class Pushover(HttpTransport):
 
 class VictorOps(HttpTransport):
     def notify(self, check):
-        description = tmpl("victorops_description.html", check=check)
+        description = check_tmpl("victorops_description.html", check)
         mtype = "CRITICAL" if check.status == "down" else "RECOVERY"
         payload = {
             "entity_id": str(check.code),
@@ -273,7 +397,7 @@ class VictorOps(HttpTransport):
 
 class Discord(HttpTransport):
     def notify(self, check):
-        text = tmpl("slack_message.json", check=check)
+        text = check_tmpl("slack_message.json", check)
         payload = json.loads(text)
         url = self.channel.discord_webhook_url + "/slack"
         return self.post(url, json=payload)
@@ -3,9 +3,15 @@ from django.conf.urls import url
 from hc.api import views
 
 urlpatterns = [
+    url(r'^ping/batch/$', views.ping_batch, name="hc-ping-batch"),
     url(r'^ping/([\w-]+)/$', views.ping, name="hc-ping-slash"),
     url(r'^ping/([\w-]+)$', views.ping, name="hc-ping"),
     url(r'^api/v1/checks/$', views.checks),
+    url(r'^api/v1/checks/bulk$', views.bulk, name="hc-api-bulk"),
+    url(r'^api/v1/checks/bulk/pause$', views.bulk_pause,
+        name="hc-api-bulk-pause"),
+    url(r'^api/v1/checks/bulk/delete$', views.bulk_delete,
+        name="hc-api-bulk-delete"),
     url(r'^api/v1/checks/([\w-]+)$', views.update, name="hc-api-update"),
     url(r'^api/v1/checks/([\w-]+)/pause$', views.pause, name="hc-api-pause"),
     url(r'^api/v1/notifications/([\w-]+)/bounce$', views.bounce,
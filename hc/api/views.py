@@ -1,48 +1,116 @@
+import hashlib
+import json
+import uuid
+from collections import OrderedDict
 from datetime import timedelta as td
 
-from django.db import connection
-from django.db.models import F
-from django.http import (HttpResponse, HttpResponseForbidden,
-                         HttpResponseNotFound, JsonResponse)
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+from django.db.models import Case, Count, Max, Q, When
+from django.http import (Http404, HttpResponse, HttpResponseForbidden,
+                         HttpResponseNotFound, HttpResponseNotModified,
+                         JsonResponse)
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags, quote_etag
 from django.views.decorators.cache import never_cache
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 
 from hc.api import schemas
-from hc.api.decorators import check_api_key, uuid_or_400, validate_json
-from hc.api.models import Check, Notification, Ping
-from hc.lib.badges import check_signature, get_badge_svg
+from hc.api.decorators import (check_api_key, make_error, uuid_or_400,
+                               validate_json)
+from hc.api.models import (API_FIELDS, EPOCH, Channel, Check, Notification,
+                           Ping, Summary, Tag, status_filter, tag_filter)
+from hc.lib.badges import check_signature, get_badge
+from hc.lib.jsonschema import ValidationError, validate
+
+STATUS_FILTERS = ("up", "grace", "down", "new", "paused")
+# Seconds that clients and proxies may cache a badge
+BADGE_MAX_AGE = 60
+# Max. number of checks per page in the checks listing, and per
+# bulk request
+MAX_LIMIT = 1000
+# Check fields that a check spec can change, see _apply
+SPEC_FIELDS = ("name", "tags", "kind", "timeout", "grace", "schedule", "tz",
+               "next_expected", "alert_after")
 
 
 @csrf_exempt
 @uuid_or_400
 @never_cache
 def ping(request, code):
-    check = get_object_or_404(Check, code=code)
+    ping = _make_ping(request)
+    if not Check.objects.record_ping(code, ping):
+        raise Http404()
 
-    check.n_pings = F("n_pings") + 1
-    check.last_ping = timezone.now()
-    check.alert_after = check.get_alert_after()
-    if check.status in ("new", "paused"):
-        check.status = "up"
+    response = HttpResponse("OK")
+    response["Access-Control-Allow-Origin"] = "*"
+    return response
 
-    check.save()
-    check.refresh_from_db()
 
-    ping = Ping(owner=check)
+def _make_ping(request):
+    ping = Ping()
     headers = request.META
-    ping.n = check.n_pings
     remote_addr = headers.get("HTTP_X_FORWARDED_FOR", headers["REMOTE_ADDR"])
     ping.remote_addr = remote_addr.split(",")[0]
     ping.scheme = headers.get("HTTP_X_FORWARDED_PROTO", "http")
     ping.method = headers["REQUEST_METHOD"]
     # If User-Agent is longer than 200 characters, truncate it:
     ping.ua = headers.get("HTTP_USER_AGENT", "")[:200]
-    ping.save()
+    return ping
 
-    response = HttpResponse("OK")
+
+@csrf_exempt
+@require_POST
+def ping_batch(request):
+    """ Record pings for many checks in one request.
+
+    The request body is a JSON document with a list of pings, each
+    with a check code and an optional Unix timestamp, for pings that
+    the client had to hold back:
+
+        {"pings": [{"code": "..."}, {"code": "...", "timestamp": 1e9}]}
+
+    Pings with timestamps in the future are recorded as happening now.
+
+    """
+
+    try:
+        doc = json.loads(request.body.decode("utf-8"))
+        validate(doc, schemas.pings)
+    except ValueError:
+        return make_error("could not parse request body")
+    except ValidationError as e:
+        return make_error("json validation error: %s" % e)
+
+    items = doc.get("pings", [])
+    if len(items) > MAX_LIMIT:
+        return make_error("at most %d pings per request" % MAX_LIMIT)
+
+    now = timezone.now()
+    pings = []
+    for item in items:
+        try:
+            code = uuid.UUID(item.get("code", ""))
+        except ValueError:
+            return make_error("invalid code")
+
+        ping = _make_ping(request)
+        ping.created = now
+        if "timestamp" in item:
+            created = EPOCH + td(seconds=item["timestamp"])
+            ping.created = min(created, now)
+
+        pings.append((code, ping))
+
+    unknown = Check.objects.record_pings(pings)
+
+    response = JsonResponse({
+        "recorded": sum(1 for code, ping in pings if ping.owner_id),
+        "unknown": sorted(unknown)
+    })
     response["Access-Control-Allow-Origin"] = "*"
     return response
 
@@ -65,7 +133,9 @@ def _lookup(user, spec):
         return existing_checks.first()
 
 
-def _update(check, spec):
+def _apply(check, spec):
+    """ Update check's fields from `spec`, without saving. """
+
     if "name" in spec:
         check.name = spec["name"]
 
@@ -85,6 +155,11 @@ def _update(check, spec):
         if "tz" in spec:
             check.tz = spec["tz"]
 
+    check.update_next_expected()
+
+
+def _update(check, spec):
+    _apply(check, spec)
     check.save()
 
     # This needs to be done after saving the check, because of
@@ -97,14 +172,226 @@ def _update(check, spec):
     return check
 
 
+def _check_key(check, fields):
+    return tuple(getattr(check, field) for field in fields)
+
+
+def _spec_key(spec, fields):
+    key = []
+    for field in fields:
+        value = spec.get(field)
+        if value is not None and field in ("timeout", "grace"):
+            value = td(seconds=value)
+        key.append(value)
+
+    return tuple(key)
+
+
+def _chunks(items, size=500):
+    # Keeps the number of query parameters within SQLite's limits
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def _bulk_upsert(user, specs):
+    """ Create or update checks from `specs`, in a single transaction.
+
+    Existing checks are matched by each spec's "unique" fields, like
+    _lookup does, against checks loaded in a single query and checks
+    created earlier in the batch. New checks are inserted with
+    bulk_create, and only checks that actually change get updated,
+    with a fixed number of statements per chunk of checks.
+
+    Returns the resulting checks, in the order of `specs`.
+
+    """
+
+    now = timezone.now()
+    existing = list(Check.objects.filter(user=user).order_by("id"))
+    indexes = {}
+
+    result, new, changed = [], [], []
+    for spec in specs:
+        fields = tuple(sorted(set(spec.get("unique", []))))
+        check = None
+        if fields:
+            if fields not in indexes:
+                index = indexes[fields] = {}
+                for other in existing:
+                    index.setdefault(_check_key(other, fields), other)
+
+            check = indexes[fields].get(_spec_key(spec, fields))
+
+        if check is None:
+            check = Check(user=user)
+            _apply(check, spec)
+            new.append(check)
+            existing.append(check)
+            for index_fields, index in indexes.items():
+                index.setdefault(_check_key(check, index_fields), check)
+        else:
+            before = _check_key(check, SPEC_FIELDS)
+            _apply(check, spec)
+            if check.id and _check_key(check, SPEC_FIELDS) != before:
+                changed.append(check)
+
+        result.append(check)
+
+    with transaction.atomic():
+        Check.objects.bulk_create(new, batch_size=500)
+        if new and new[0].id is None:
+            # Not all databases return ids of bulk-inserted rows
+            by_code = dict((check.code, check) for check in new)
+            for chunk in _chunks(list(by_code)):
+                q = Check.objects.filter(code__in=chunk)
+                for check_id, code in q.values_list("id", "code"):
+                    by_code[code].id = check_id
+
+        # A check can be changed by several specs, save it once
+        changed = list(OrderedDict((c.id, c) for c in changed).values())
+        Check.objects.update_each(changed, SPEC_FIELDS, changed=now)
+
+        through = Channel.checks.through
+        assign, clear = set(), set()
+        for check, spec in zip(result, specs):
+            if spec.get("channels") == "*":
+                assign.add(check.id)
+            elif spec.get("channels") == "":
+                clear.add(check.id)
+
+        for chunk in _chunks(list(assign | clear)):
+            through.objects.filter(check_id__in=chunk).delete()
+
+        if assign:
+            q = Channel.objects.filter(user=user)
+            channel_ids = list(q.values_list("id", flat=True))
+            rows = [through(channel_id=channel_id, check_id=check_id)
+                    for check_id in assign for channel_id in channel_ids]
+            through.objects.bulk_create(rows, batch_size=500)
+
+        if new or changed:
+            # bulk_create and update() bypass Check.save(), so update
+            # the tags, and send no post_save signal
+            Tag.objects.sync(new + changed)
+            Summary.objects.invalidate(user.id)
+
+    return result
+
+
+def _codes(request):
+    """ Return user's checks with the codes listed in the request. """
+
+    codes = request.json.get("codes", [])
+    try:
+        codes = [uuid.UUID(code) for code in codes]
+    except ValueError:
+        return None
+
+    return Check.objects.filter(user=request.user, code__in=codes)
+
+
+def _etag(request, q, now):
+    """ Return an ETag for a listing of checks in `q`.
+
+    It is computed from an aggregate query instead of the listing
+    itself. Any ping or edit moves `changed` forward, and the counts
+    of passed deadlines account for checks going late or down just
+    by time passing.
+
+    """
+
+    def passed(field):
+        return Count(Case(When(then=1, **{field + "__lte": now})))
+
+    stats = q.aggregate(n=Count("id"), changed=Max("changed"),
+                        late=passed("next_expected"),
+                        down=passed("alert_after"))
+
+    params = sorted(request.GET.lists())
+    key = json.dumps([request.user.id, params, stats["n"],
+                      str(stats["changed"]), stats["late"], stats["down"]])
+    return hashlib.md5(key.encode("utf-8")).hexdigest()
+
+
+def _list_checks(request):
+    """ List user's checks, optionally filtered, projected and paginated.
+
+    Supported query parameters:
+
+    - tag: only checks with this tag, can be repeated
+    - status: only checks with any of these statuses, can be repeated
+    - fields: comma-separated list of fields to include
+    - limit: return at most this many checks, plus a "next" cursor
+    - cursor: continue from where the previous page ended
+
+    Without a limit, all matching checks are returned.
+
+    Unchanged listings get a "304 Not Modified" for If-None-Match.
+
+    """
+
+    now = timezone.now()
+    q = Check.objects.filter(user=request.user)
+    for tag in request.GET.getlist("tag"):
+        q = q.filter(tag_filter(tag))
+
+    statuses = request.GET.getlist("status")
+    if statuses:
+        matching = Q()
+        for status in statuses:
+            if status not in STATUS_FILTERS:
+                return make_error("invalid status: %s" % status)
+            matching |= status_filter(status, now)
+
+        q = q.filter(matching)
+
+    fields = None
+    if "fields" in request.GET:
+        fields = request.GET["fields"].split(",")
+        for field in fields:
+            if field not in API_FIELDS:
+                return make_error("invalid field: %s" % field)
+
+    try:
+        limit = int(request.GET.get("limit", 0))
+        after = int(request.GET.get("cursor", 0))
+    except ValueError:
+        return make_error("invalid limit or cursor")
+
+    if "limit" in request.GET and not 1 <= limit <= MAX_LIMIT:
+        return make_error("limit must be between 1 and %d" % MAX_LIMIT)
+
+    etag = _etag(request, q, now)
+    if etag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", "")):
+        response = HttpResponseNotModified()
+        response["ETag"] = quote_etag(etag)
+        return response
+
+    # Paginate by id, so pages stay stable while checks get added
+    q = q.filter(id__gt=after).order_by("id")
+    if limit:
+        page = list(q[:limit + 1])
+        checks = page[:limit]
+    else:
+        checks = list(q)
+
+    doc = {"checks": [check.to_dict(fields) for check in checks]}
+    if limit:
+        doc["next"] = None
+        if len(page) > limit:
+            doc["next"] = str(checks[-1].id)
+
+    response = JsonResponse(doc)
+    response["ETag"] = quote_etag(etag)
+    return response
+
+
 @csrf_exempt
 @check_api_key
 @validate_json(schemas.check)
 def checks(request):
     if request.method == "GET":
-        q = Check.objects.filter(user=request.user)
-        doc = {"checks": [check.to_dict() for check in q]}
-        return JsonResponse(doc)
+        return _list_checks(request)
 
     elif request.method == "POST":
         created = False
@@ -121,6 +408,50 @@ def checks(request):
     return HttpResponse(status=405)
 
 
+@csrf_exempt
+@require_POST
+@check_api_key
+@validate_json(schemas.bulk_checks)
+def bulk(request):
+    specs = request.json.get("checks", [])
+    if len(specs) > MAX_LIMIT:
+        return make_error("at most %d checks per request" % MAX_LIMIT)
+
+    checks = _bulk_upsert(request.user, specs)
+    return JsonResponse({"checks": [check.to_dict() for check in checks]})
+
+
+@csrf_exempt
+@require_POST
+@check_api_key
+@validate_json(schemas.codes)
+def bulk_pause(request):
+    q = _codes(request)
+    if q is None:
+        return make_error("invalid code")
+
+    with transaction.atomic():
+        num_paused = q.update(status="paused", changed=timezone.now())
+        Summary.objects.invalidate(request.user.id)
+
+    return JsonResponse({"paused": num_paused})
+
+
+@csrf_exempt
+@require_POST
+@check_api_key
+@validate_json(schemas.codes)
+def bulk_delete(request):
+    q = _codes(request)
+    if q is None:
+        return make_error("invalid code")
+
+    with transaction.atomic():
+        num_deleted = q.delete()[1].get("api.Check", 0)
+
+    return JsonResponse({"deleted": num_deleted})
+
+
 @csrf_exempt
 @require_POST
 @uuid_or_400
@@ -149,26 +480,31 @@ def pause(request, code):
     return JsonResponse(check.to_dict())
 
 
-@never_cache
 def badge(request, username, signature, tag):
     if not check_signature(username, tag, signature):
         return HttpResponseNotFound()
 
+    # The dashboard summary already knows which tags are late or down
     status = "up"
-    q = Check.objects.filter(user__username=username, tags__contains=tag)
-    for check in q:
-        if tag not in check.tags_list():
-            continue
-
-        if status == "up" and check.in_grace_period():
+    user = User.objects.filter(username=username).first()
+    if user is not None:
+        # Popular badges get requested all at once, recompute a stale
+        # summary just once
+        summary = Summary.objects.for_user(user, stale_ok=True)
+        if tag in summary.down_tags_set():
+            status = "down"
+        elif tag in summary.grace_tags_set():
             status = "late"
 
-        if check.get_status() == "down":
-            status = "down"
-            break
+    svg, etag = get_badge(tag, status)
+    if etag in parse_etags(request.META.get("HTTP_IF_NONE_MATCH", "")):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(svg, content_type="image/svg+xml")
 
-    svg = get_badge_svg(tag, status)
-    return HttpResponse(svg, content_type="image/svg+xml")
+    response["ETag"] = quote_etag(etag)
+    patch_cache_control(response, max_age=BADGE_MAX_AGE)
+    return response
 
 
 @csrf_exempt
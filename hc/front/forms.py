@@ -31,6 +31,11 @@ class CronForm(forms.Form):
     grace = forms.IntegerField(min_value=1, max_value=43200)
 
 
+class ChannelDigestForm(forms.Form):
+    # Zero turns digests off
+    coalesce_window = forms.IntegerField(min_value=0, max_value=86400)
+
+
 class AddPdForm(forms.Form):
     error_css_class = "has-error"
     value = forms.CharField(max_length=32)
@@ -0,0 +1,61 @@
+import json
+
+from django.test.utils import override_settings
+from hc.api.models import Check
+from hc.lib import bus
+from hc.test import BaseTestCase
+
+
+@override_settings(EVENTS_ENABLED=True)
+class ChecksEventsTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(ChecksEventsTestCase, self).setUp()
+        self.check = Check(user=self.alice, status="up")
+        self.check.save()
+
+    def _events(self, r):
+        stream = iter(r.streaming_content)
+        self.assertEqual(next(stream), b"retry: 5000\n\n")
+        return stream
+
+    def test_it_streams_pings(self):
+        self.client.login(username="alice@example.org", password="password")
+        r = self.client.get("/checks/events/")
+        self.assertEqual(r["Content-Type"], "text/event-stream")
+        stream = self._events(r)
+
+        self.client.get("/ping/%s/" % self.check.code)
+
+        event, data = next(stream).decode().strip().split("\n")
+        self.assertEqual(event, "event: ping")
+        doc = json.loads(data[len("data: "):])
+        self.assertEqual(doc["code"], str(self.check.code))
+        r.close()
+
+    def test_it_streams_team_events(self):
+        self.client.login(username="bob@example.org", password="password")
+        r = self.client.get("/checks/events/")
+        stream = self._events(r)
+
+        bus.publish(bus.user_channel(self.alice.id), {
+            "event": "status", "code": str(self.check.code),
+            "status": "down"})
+
+        self.assertTrue(next(stream).startswith(b"event: status\n"))
+        r.close()
+        self.assertNotIn(bus.user_channel(self.alice.id), bus._local)
+
+    @override_settings(EVENTS_ENABLED=False)
+    def test_it_is_off_by_default(self):
+        self.client.login(username="alice@example.org", password="password")
+        r = self.client.get("/checks/events/")
+        self.assertEqual(r.status_code, 404)
+
+        r = self.client.get("/checks/")
+        self.assertNotContains(r, "data-events-url")
+
+    def test_dashboard_links_events(self):
+        self.client.login(username="alice@example.org", password="password")
+        r = self.client.get("/checks/")
+        self.assertContains(r, 'data-events-url="/checks/events/"')
@@ -1,6 +1,7 @@
-from hc.api.models import Check
+from hc.api.models import EPOCH, Check
 from hc.test import BaseTestCase
 from datetime import timedelta as td
+from django.test.utils import override_settings
 from django.utils import timezone
 
 
@@ -58,3 +59,110 @@ class MyChecksTestCase(BaseTestCase):
 
         # Assert Mobile amber check
         self.assertContains(resp, "label label-warning")
+
+    @override_settings(CHECKS_PAGE_SIZE=1)
+    def test_it_paginates(self):
+        Check(user=self.alice, name="Second Check").save()
+
+        self.client.login(username="alice@example.org", password="password")
+        r = self.client.get("/checks/")
+        self.assertContains(r, "Alice Was Here")
+        self.assertNotContains(r, "Second Check")
+        self.assertContains(r, "Page 1 of 2")
+
+        r = self.client.get("/checks/?page=2")
+        self.assertContains(r, "Second Check")
+        self.assertNotContains(r, "Alice Was Here")
+
+    def test_it_filters_by_tags(self):
+        self.check.tags = "foo bar"
+        self.check.save()
+        Check(user=self.alice, name="Second Check", tags="foobar").save()
+
+        self.client.login(username="alice@example.org", password="password")
+        r = self.client.get("/checks/?tag=foo&tag=bar")
+        self.assertContains(r, "Alice Was Here")
+        self.assertNotContains(r, "Second Check")
+
+    def test_it_returns_json(self):
+        self.client.login(username="alice@example.org", password="password")
+        r = self.client.get("/checks/json/")
+
+        doc = r.json()
+        self.assertEqual(doc["num_pages"], 1)
+        self.assertEqual(doc["checks"][0]["name"], "Alice Was Here")
+        self.assertEqual(doc["checks"][0]["code"], str(self.check.code))
+        self.assertIsNone(doc["next"])
+
+        # Rows are rendered for both dashboard layouts
+        row = 'data-code="%s"' % self.check.code
+        self.assertIn(row, doc["desktop"])
+        self.assertIn(row, doc["mobile"])
+
+    @override_settings(CHECKS_PAGE_SIZE=1)
+    def test_json_links_next_page(self):
+        self.check.tags = "foo"
+        self.check.save()
+        Check(user=self.alice, name="Second Check", tags="foo").save()
+
+        self.client.login(username="alice@example.org", password="password")
+        r = self.client.get("/checks/")
+        self.assertContains(r, "/checks/json/?page=2")
+
+        r = self.client.get("/checks/json/?tag=foo")
+        self.assertEqual(r.json()["next"], "/checks/json/?page=2&tag=foo")
+
+        r = self.client.get("/checks/json/?page=2&tag=foo")
+        doc = r.json()
+        self.assertIn("Second Check", doc["desktop"])
+        self.assertIsNone(doc["next"])
+
+    def test_it_returns_status_delta(self):
+        self.check.last_ping = timezone.now() - td(days=1, minutes=30)
+        self.check.status = "up"
+        self.check.tags = "foo"
+        self.check.save()
+
+        self.client.login(username="alice@example.org", password="password")
+        r = self.client.get("/checks/status/")
+
+        doc = r.json()
+        self.assertEqual(doc["details"][0]["code"], str(self.check.code))
+        self.assertEqual(doc["details"][0]["status"], "grace")
+        self.assertEqual(doc["tags"], {"foo": "grace"})
+
+    def test_status_delta_returns_changed_checks(self):
+        self.client.login(username="alice@example.org", password="password")
+        cursor = self.client.get("/checks/status/").json()["cursor"]
+
+        # Move the check's last change to well before the cursor
+        old = timezone.now() - td(minutes=5)
+        Check.objects.filter(id=self.check.id).update(changed=old)
+        r = self.client.get("/checks/status/?since=" + cursor)
+        self.assertEqual(r.json()["details"], [])
+
+        self.client.get("/ping/%s/" % self.check.code)
+        r = self.client.get("/checks/status/?since=" + cursor)
+        details = r.json()["details"]
+        self.assertEqual(details[0]["code"], str(self.check.code))
+        self.assertEqual(details[0]["status"], "up")
+
+    def test_status_delta_includes_checks_going_late(self):
+        self.check.last_ping = timezone.now() - td(days=1, minutes=1)
+        self.check.status = "up"
+        self.check.update_next_expected()
+        self.check.save()
+
+        old = timezone.now() - td(minutes=5)
+        Check.objects.filter(id=self.check.id).update(changed=old)
+
+        self.client.login(username="alice@example.org", password="password")
+        since = timezone.now() - td(minutes=2) - EPOCH
+        r = self.client.get("/checks/status/?since=%d" % since.total_seconds())
+        self.assertEqual(r.json()["details"][0]["status"], "grace")
+
+    def test_status_delta_rejects_bad_cursor(self):
+        self.client.login(username="alice@example.org", password="password")
+        for since in ("foo", "1e20", "-1e20", "inf", "nan"):
+            r = self.client.get("/checks/status/?since=%s" % since)
+            self.assertEqual(r.status_code, 400)
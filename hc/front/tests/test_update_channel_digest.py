@@ -0,0 +1,47 @@
+from hc.api.models import Channel
+from hc.test import BaseTestCase
+
+
+class UpdateChannelDigestTestCase(BaseTestCase):
+
+    def setUp(self):
+        super(UpdateChannelDigestTestCase, self).setUp()
+        self.channel = Channel(user=self.alice, kind="email")
+        self.channel.value = "alice@example.org"
+        self.channel.save()
+
+        self.url = "/integrations/%s/digest/" % self.channel.code
+
+    def test_it_works(self):
+        self.client.login(username="alice@example.org", password="password")
+        r = self.client.post(self.url, {"coalesce_window": "300"})
+        self.assertRedirects(r, "/integrations/")
+
+        self.channel.refresh_from_db()
+        self.assertEqual(self.channel.coalesce_window, 300)
+
+    def test_team_access_works(self):
+        self.client.login(username="bob@example.org", password="password")
+        self.client.post(self.url, {"coalesce_window": "60"})
+
+        self.channel.refresh_from_db()
+        self.assertEqual(self.channel.coalesce_window, 60)
+
+    def test_it_rejects_bad_window(self):
+        self.client.login(username="alice@example.org", password="password")
+        r = self.client.post(self.url, {"coalesce_window": "-1"})
+        self.assertEqual(r.status_code, 400)
+
+    def test_it_checks_owner(self):
+        self.client.login(username="charlie@example.org", password="password")
+        r = self.client.post(self.url, {"coalesce_window": "60"})
+        self.assertEqual(r.status_code, 403)
+
+    def test_channels_page_shows_digest_setting(self):
+        self.channel.coalesce_window = 900
+        self.channel.save()
+
+        self.client.login(username="alice@example.org", password="password")
+        r = self.client.get("/integrations/")
+        self.assertContains(r, self.url)
+        self.assertContains(r, '<option value="900" selected>')
@@ -27,6 +27,10 @@ class UpdateTimeoutTestCase(BaseTestCase):
         # alert_after should be updated too
         self.assertEqual(self.check.alert_after, self.check.get_alert_after())
 
+        # and next_expected should be recalculated
+        expected = self.check.last_ping + self.check.timeout
+        self.assertEqual(self.check.next_expected, expected)
+
     def test_it_saves_cron_expression(self):
         url = "/checks/%s/timeout/" % self.check.code
         payload = {
@@ -25,6 +25,8 @@ channel_urls = [
     url(r'^add_victorops/$', views.add_victorops, name="hc-add-victorops"),
     url(r'^([\w-]+)/checks/$', views.channel_checks, name="hc-channel-checks"),
     url(r'^([\w-]+)/remove/$', views.remove_channel, name="hc-remove-channel"),
+    url(r'^([\w-]+)/digest/$', views.update_channel_digest,
+        name="hc-channel-digest"),
     url(r'^([\w-]+)/verify/([\w-]+)/$', views.verify_email,
         name="hc-verify-email"),
     url(r'^([\w-]+)/unsub/([\w-]+)/$', views.unsubscribe_email,
@@ -35,6 +37,9 @@ urlpatterns = [
     url(r'^$', views.index, name="hc-index"),
     url(r'^checks/$', views.my_checks, name="hc-checks"),
     url(r'^checks/add/$', views.add_check, name="hc-add-check"),
+    url(r'^checks/json/$', views.checks_json, name="hc-checks-json"),
+    url(r'^checks/status/$', views.checks_status, name="hc-checks-status"),
+    url(r'^checks/events/$', views.checks_events, name="hc-checks-events"),
     url(r'^checks/cron_preview/$', views.cron_preview),
     url(r'^checks/([\w-]+)/', include(check_urls)),
     url(r'^integrations/', include(channel_urls)),
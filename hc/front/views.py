@@ -1,15 +1,21 @@
-from collections import Counter
 from croniter import croniter
 from datetime import datetime, timedelta as td
 from itertools import tee
+import json
+import time
 
 import requests
 from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count
-from django.http import Http404, HttpResponseBadRequest, HttpResponseForbidden
+from django.contrib.humanize.templatetags.humanize import naturaltime
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db.models import Count, Q
+from django.http import (Http404, HttpResponseBadRequest,
+                         HttpResponseForbidden, JsonResponse,
+                         StreamingHttpResponse)
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.urls import reverse
 from django.utils import timezone
 from django.utils.crypto import get_random_string
@@ -17,14 +23,19 @@ from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.utils.six.moves.urllib.parse import urlencode
 from hc.api.decorators import uuid_or_400
-from hc.api.models import (DEFAULT_GRACE, DEFAULT_TIMEOUT, Channel, Check,
-                           Ping, Notification)
+from hc.api.models import (DEFAULT_GRACE, DEFAULT_TIMEOUT, EPOCH, Channel,
+                           Check, Ping, Notification, Summary, tag_filter)
 from hc.front.forms import (AddWebhookForm, NameTagsForm,
                             TimeoutForm, AddUrlForm, AddPdForm, AddEmailForm,
-                            AddOpsGenieForm, CronForm)
+                            AddOpsGenieForm, ChannelDigestForm, CronForm)
+from hc.lib import bus
 from pytz import all_timezones
 from pytz.exceptions import UnknownTimeZoneError
 
+# Offered choices for grouping a channel's notifications into digests
+DIGEST_WINDOWS = ((0, "Off"), (60, "1 minute"), (300, "5 minutes"),
+                  (900, "15 minutes"), (3600, "1 hour"))
+
 
 # from itertools recipes:
 def pairwise(iterable):
@@ -34,40 +45,213 @@ def pairwise(iterable):
     return zip(a, b)
 
 
-@login_required
-def my_checks(request):
-    q = Check.objects.filter(user=request.team.user).order_by("created")
-    checks = list(q)
+def _team_checks(request):
+    """ Return team's checks, and the selected tags.
 
-    counter = Counter()
-    down_tags, grace_tags = set(), set()
-    for check in checks:
-        status = check.get_status()
-        for tag in check.tags_list():
-            if tag == "":
-                continue
+    Only checks that have all of the selected tags are included.
+
+    """
 
-            counter[tag] += 1
+    q = Check.objects.filter(user=request.team.user)
+    tags = request.GET.getlist("tag")
+    for tag in tags:
+        q = q.filter(tag_filter(tag))
+
+    return q, tags
+
+
+def _checks_page(request):
+    """ Return the requested page of team's checks, and selected tags. """
+
+    q, tags = _team_checks(request)
+    paginator = Paginator(q.order_by("created", "id"),
+                          settings.CHECKS_PAGE_SIZE)
+    try:
+        page = paginator.page(request.GET.get("page", 1))
+    except PageNotAnInteger:
+        page = paginator.page(1)
+    except EmptyPage:
+        page = paginator.page(paginator.num_pages)
 
-            if status == "down":
-                down_tags.add(tag)
-            elif check.in_grace_period():
-                grace_tags.add(tag)
+    return page, tags
+
+
+def _status(check):
+    status = check.get_status()
+    if status == "up" and check.in_grace_period():
+        return "grace"
+
+    return status
+
+
+@login_required
+def my_checks(request):
+    page, selected_tags = _checks_page(request)
+    summary = Summary.objects.for_user(request.team.user)
 
     ctx = {
         "page": "checks",
-        "checks": checks,
+        "checks": page.object_list,
+        "checks_page": page,
+        "selected_tags": selected_tags,
+        "tags_qs": urlencode([("tag", tag) for tag in selected_tags]),
+        "summary": summary,
         "now": timezone.now(),
-        "tags": counter.most_common(),
-        "down_tags": down_tags,
-        "grace_tags": grace_tags,
+        "tags": summary.tags_list(),
+        "down_tags": summary.down_tags_set(),
+        "grace_tags": summary.grace_tags_set(),
         "ping_endpoint": settings.PING_ENDPOINT,
-        "timezones": all_timezones
+        "timezones": all_timezones,
+        "events_enabled": settings.EVENTS_ENABLED
     }
 
     return render(request, "front/my_checks.html", ctx)
 
 
+@login_required
+def checks_json(request):
+    """ Return a page of checks as JSON, for loading them incrementally.
+
+    Besides the checks' data, the response has their dashboard rows,
+    already rendered, and the URL of the next page.
+
+    """
+
+    page, tags = _checks_page(request)
+    checks = []
+    for check in page.object_list:
+        doc = check.to_dict()
+        doc["code"] = str(check.code)
+        checks.append(doc)
+
+    ctx = {
+        "checks": page.object_list,
+        "ping_endpoint": settings.PING_ENDPOINT
+    }
+
+    next_url = None
+    if page.has_next():
+        params = [("page", page.next_page_number())]
+        params += [("tag", tag) for tag in tags]
+        next_url = reverse("hc-checks-json") + "?" + urlencode(params)
+
+    return JsonResponse({
+        "checks": checks,
+        "page": page.number,
+        "num_pages": page.paginator.num_pages,
+        "next": next_url,
+        "desktop": render_to_string("front/my_checks_desktop_rows.html", ctx),
+        "mobile": render_to_string("front/my_checks_mobile_rows.html", ctx)
+    })
+
+
+@login_required
+def checks_status(request):
+    """ Return just the statuses of a page of checks, and of tags.
+
+    The dashboard polls this to keep status indicators up to date.
+    With the `since` cursor from a previous response, only checks that
+    have changed since then are returned, from any page.
+
+    """
+
+    now = timezone.now()
+    if "since" in request.GET:
+        try:
+            since = float(request.GET["since"])
+        except ValueError:
+            return HttpResponseBadRequest()
+
+        # Cursors are timestamps issued by this view. Reject anything
+        # else, including inf and nan, before doing date arithmetic.
+        latest = (now - EPOCH).total_seconds() + 86400
+        if not 0 <= since <= latest:
+            return HttpResponseBadRequest()
+
+        # Allow for writes that were in flight when the cursor was issued
+        since = EPOCH + td(seconds=since - 5)
+
+        # Besides changes that were written, checks go late and down
+        # just by time passing
+        changed = Q(changed__gt=since)
+        changed |= Q(next_expected__gt=since, next_expected__lte=now)
+        changed |= Q(alert_after__gt=since, alert_after__lte=now)
+        checks = _team_checks(request)[0].filter(changed)
+    else:
+        checks = _checks_page(request)[0].object_list
+
+    details = []
+    for check in checks:
+        last_ping = "Never"
+        if check.last_ping:
+            last_ping = naturaltime(check.last_ping)
+
+        details.append({
+            "code": str(check.code),
+            "status": _status(check),
+            "last_ping": last_ping
+        })
+
+    summary = Summary.objects.for_user(request.team.user)
+    tags = {}
+    for tag, count in summary.tags_list():
+        tags[tag] = "up"
+    for tag in summary.grace_tags_set():
+        tags[tag] = "grace"
+    for tag in summary.down_tags_set():
+        tags[tag] = "down"
+
+    return JsonResponse({
+        "details": details,
+        "tags": tags,
+        "cursor": "%.6f" % (now - EPOCH).total_seconds()
+    })
+
+
+@login_required
+def checks_events(request):
+    """ Stream ping and status events of the team's checks.
+
+    Events are sent as they happen, in the Server-Sent Events format.
+    The dashboard then fetches the changes with `checks_status`.
+    The response ends after EVENTS_MAX_AGE seconds, and the browser
+    reconnects.
+
+    Off unless EVENTS_ENABLED is set: each open dashboard holds
+    a request, and on PostgreSQL a database connection, for the whole
+    time.
+
+    """
+
+    if not settings.EVENTS_ENABLED:
+        raise Http404()
+
+    subscription = bus.subscribe(bus.user_channel(request.team.user.id))
+
+    def stream():
+        try:
+            deadline = time.time() + settings.EVENTS_MAX_AGE
+            yield "retry: 5000\n\n"
+            while time.time() < deadline:
+                messages = subscription.get(timeout=15)
+                if not messages:
+                    # Keep proxies from closing an idle connection
+                    yield ": keepalive\n\n"
+
+                for message in messages:
+                    data = json.dumps(message)
+                    yield "event: %s\ndata: %s\n\n" % (message["event"], data)
+        finally:
+            subscription.close()
+
+    response = StreamingHttpResponse(stream(),
+                                     content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    # Tell nginx not to buffer the stream
+    response["X-Accel-Buffering"] = "no"
+    return response
+
+
 def _welcome_check(request):
     check = None
     if "welcome_code" in request.session:
@@ -187,9 +371,7 @@ def update_timeout(request, code):
         check.tz = form.cleaned_data["tz"]
         check.grace = td(minutes=form.cleaned_data["grace"])
 
-    if check.last_ping:
-        check.alert_after = check.get_alert_after()
-
+    check.update_next_expected()
     check.save()
     return redirect("hc-checks")
 
@@ -316,7 +498,8 @@ def channels(request):
         "num_checks": num_checks,
         "enable_pushbullet": settings.PUSHBULLET_CLIENT_ID is not None,
         "enable_pushover": settings.PUSHOVER_API_TOKEN is not None,
-        "enable_discord": settings.DISCORD_CLIENT_ID is not None
+        "enable_discord": settings.DISCORD_CLIENT_ID is not None,
+        "digest_windows": DIGEST_WINDOWS
     }
     return render(request, "front/channels.html", ctx)
 
@@ -340,6 +523,23 @@ def channel_checks(request, code):
     return render(request, "front/channel_checks.html", ctx)
 
 
+@require_POST
+@login_required
+@uuid_or_400
+def update_channel_digest(request, code):
+    channel = get_object_or_404(Channel, code=code)
+    if channel.user_id != request.team.user.id:
+        return HttpResponseForbidden()
+
+    form = ChannelDigestForm(request.POST)
+    if not form.is_valid():
+        return HttpResponseBadRequest()
+
+    channel.coalesce_window = form.cleaned_data["coalesce_window"]
+    channel.save()
+    return redirect("hc-channels")
+
+
 @uuid_or_400
 def verify_email(request, code, token):
     channel = get_object_or_404(Channel, code=code)
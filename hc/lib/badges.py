@@ -1,7 +1,10 @@
+import hashlib
+
 from django.conf import settings
 from django.core.signing import base64_hmac
 from django.template.loader import render_to_string
 from django.urls import reverse
+from hc.lib.lru import LRUCache
 
 WIDTHS = {"a": 7, "b": 7, "c": 6, "d": 7, "e": 6, "f": 4, "g": 7, "h": 7,
           "i": 3, "j": 3, "k": 7, "l": 3, "m": 10, "n": 7, "o": 7, "p": 7,
@@ -18,6 +21,11 @@ COLORS = {
     "down": "#e05d44"
 }
 
+# Rendered badges, keyed by (tag, status)
+CACHE_SIZE = 1000
+
+_cache = LRUCache(CACHE_SIZE)
+
 
 def get_width(s):
     total = 0
@@ -43,6 +51,16 @@ def get_badge_svg(tag, status):
     return render_to_string("badge.svg", ctx)
 
 
+def get_badge(tag, status):
+    """ Return the rendered badge and its ETag, from cache if possible. """
+
+    def make():
+        svg = get_badge_svg(tag, status)
+        return svg, hashlib.md5(svg.encode("utf-8")).hexdigest()
+
+    return _cache.get_or_set((tag, status), make)
+
+
 def check_signature(username, tag, sig):
     ours = base64_hmac(str(username), tag, settings.SECRET_KEY)
     ours = ours[:8].decode("utf-8")
@@ -0,0 +1,123 @@
+""" Buffered, batched inserts of model instances.
+
+Instances are collected in memory and written with `bulk_create` by a
+background thread, either when the buffer fills up or when the oldest
+buffered instance gets too old.
+
+"""
+
+import atexit
+import os
+import time
+from threading import Condition, Thread
+
+from django.db import DatabaseError, IntegrityError, connection, transaction
+
+
+class BulkBuffer(object):
+    def __init__(self, model, max_size=500, max_age=1.0):
+        self.model = model
+        self.max_size = max_size
+        self.max_age = max_age
+        # If the database is unavailable, keep at most this many
+        # instances around, and start dropping the oldest ones:
+        self.max_backlog = max_size * 20
+
+        self.items = []
+        self.oldest = None
+        self.cond = Condition()
+        self.pid = None
+
+    def add(self, obj):
+        self.ensure_started()
+
+        with self.cond:
+            if not self.items:
+                self.oldest = time.time()
+
+            self.items.append(obj)
+            if len(self.items) >= self.max_size:
+                self.cond.notify()
+
+    def flush(self):
+        """ Write out everything that is currently buffered.
+
+        Returns the number of written instances.
+
+        """
+
+        with self.cond:
+            batch, self.items, self.oldest = self.items, [], None
+
+        if not batch:
+            return 0
+
+        try:
+            with transaction.atomic():
+                self.model.objects.bulk_create(batch,
+                                               batch_size=self.max_size)
+            return len(batch)
+        except IntegrityError:
+            # Some rows can not be written, for example pings of a check
+            # that got deleted in the meantime. Retrying the batch would
+            # fail on them again, so write it out row by row instead.
+            pass
+        except DatabaseError:
+            self.requeue(batch)
+            return 0
+
+        written = 0
+        for i, obj in enumerate(batch):
+            try:
+                with transaction.atomic():
+                    self.model.objects.bulk_create([obj])
+                written += 1
+            except IntegrityError:
+                # Drop the row, it will never fit
+                pass
+            except DatabaseError:
+                self.requeue(batch[i:])
+                break
+
+        return written
+
+    def requeue(self, batch):
+        # Discard the broken connection and put the batch back,
+        # the next flush will retry it.
+        connection.close()
+        with self.cond:
+            self.items = (batch + self.items)[-self.max_backlog:]
+            self.oldest = time.time()
+
+    def ensure_started(self):
+        # Start the flusher thread lazily, and again after a fork:
+        # threads do not survive in the child process.
+        if self.pid == os.getpid():
+            return
+
+        with self.cond:
+            if self.pid == os.getpid():
+                return
+
+            self.pid = os.getpid()
+            self.items, self.oldest = [], None
+            self.start()
+
+    def start(self):
+        t = Thread(target=self.run)
+        t.daemon = True
+        t.start()
+
+        atexit.register(self.flush)
+
+    def run(self):
+        while True:
+            with self.cond:
+                if len(self.items) < self.max_size:
+                    timeout = self.max_age
+                    if self.oldest:
+                        timeout -= time.time() - self.oldest
+                    if timeout > 0:
+                        self.cond.wait(timeout)
+
+            self.flush()
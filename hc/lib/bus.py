@@ -0,0 +1,116 @@
+""" A small publish/subscribe bus for live events.
+
+On PostgreSQL, messages go through LISTEN/NOTIFY, so they reach
+subscribers in any process. Notifications are delivered when the
+publishing transaction commits. Other databases get an in-process
+fallback, which is good enough for tests and single-process setups.
+
+Messages are dicts, serialized as JSON.
+
+"""
+
+import json
+import select
+from threading import Lock
+
+from django.db import connection
+from six.moves import queue
+
+
+# Pings to checks that are down get announced here, so sendalerts
+# can pick them up without waiting for its next poll. Keep in sync
+# with the ping statement in hc.api.models
+ALERTS = "hc_alerts"
+
+
+def user_channel(user_id):
+    # Keep in sync with the ping statement in hc.api.models
+    return "hc_user_%d" % user_id
+
+
+_local = {}
+_lock = Lock()
+
+
+def is_shared():
+    """ Return True if messages reach subscribers in other processes. """
+
+    return connection.vendor == "postgresql"
+
+
+def publish(channel, message):
+    payload = json.dumps(message)
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [channel, payload])
+        return
+
+    with _lock:
+        queues = list(_local.get(channel, ()))
+
+    for q in queues:
+        q.put(payload)
+
+
+def subscribe(channel):
+    if connection.vendor == "postgresql":
+        return PgSubscription(channel)
+
+    return LocalSubscription(channel)
+
+
+class LocalSubscription(object):
+    def __init__(self, channel):
+        self.channel = channel
+        self.queue = queue.Queue()
+        with _lock:
+            _local.setdefault(channel, set()).add(self.queue)
+
+    def get(self, timeout):
+        """ Wait up to `timeout` seconds, and return received messages. """
+
+        try:
+            payloads = [self.queue.get(timeout=timeout)]
+        except queue.Empty:
+            return []
+
+        while True:
+            try:
+                payloads.append(self.queue.get_nowait())
+            except queue.Empty:
+                return [json.loads(payload) for payload in payloads]
+
+    def close(self):
+        with _lock:
+            queues = _local.get(self.channel, set())
+            queues.discard(self.queue)
+            if not queues:
+                _local.pop(self.channel, None)
+
+
+class PgSubscription(object):
+    def __init__(self, channel):
+        # LISTEN needs a connection of its own, outside of transactions
+        params = connection.get_connection_params()
+        self.conn = connection.get_new_connection(params)
+        self.conn.autocommit = True
+        with self.conn.cursor() as cursor:
+            cursor.execute('LISTEN "%s"' % channel)
+
+    def get(self, timeout):
+        """ Wait up to `timeout` seconds, and return received messages. """
+
+        if not self.conn.notifies:
+            readable = select.select([self.conn], [], [], timeout)[0]
+            if readable:
+                self.conn.poll()
+
+        messages = []
+        while self.conn.notifies:
+            notify = self.conn.notifies.pop(0)
+            messages.append(json.loads(notify.payload))
+
+        return messages
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,43 @@
+""" Cron schedule evaluation with a cache of parsed schedules.
+
+Parsing a cron expression is the expensive part of using croniter,
+so parsed schedules are kept in a small LRU cache, keyed by
+(schedule, tz), and copied for each evaluation.
+
+"""
+
+import copy
+from datetime import datetime
+
+import pytz
+from croniter import croniter
+from hc.lib.lru import LRUCache
+
+CACHE_SIZE = 1000
+EPOCH = datetime(1970, 1, 1)
+
+_cache = LRUCache(CACHE_SIZE)
+
+
+def _compile(schedule, tz):
+    return _cache.get_or_set((schedule, tz),
+                             lambda: (croniter(schedule), pytz.timezone(tz)))
+
+
+def next_after(schedule, tz, dt):
+    """ Return the first time after `dt` that matches `schedule`.
+
+    `schedule` is evaluated in the `tz` timezone. Both the argument
+    and the result are timezone-aware datetimes.
+
+    """
+
+    template, tzinfo = _compile(schedule, tz)
+
+    naive = dt.astimezone(tzinfo).replace(tzinfo=None)
+    it = copy.copy(template)
+    it.tzinfo = None
+    it.start_time = it.cur = (naive - EPOCH).total_seconds()
+
+    next_naive = it.get_next(datetime)
+    return tzinfo.localize(next_naive, is_dst=False)
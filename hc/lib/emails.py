@@ -1,39 +1,32 @@
-from threading import Thread
-
 from django.conf import settings
 from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string as render
+from hc.lib.mailer import Mailer
+from hc.lib.render import render
 
+mailer = Mailer(settings.EMAIL_WORKERS, settings.EMAIL_QUEUE_SIZE,
+                settings.EMAIL_BATCH_SIZE, settings.EMAIL_MAX_IDLE)
 
-class EmailThread(Thread):
-    def __init__(self, subject, text, html, to, headers):
-        Thread.__init__(self)
-        self.subject = subject
-        self.text = text
-        self.html = html
-        self.to = to
-        self.headers = headers
 
-    def run(self):
-        msg = EmailMultiAlternatives(self.subject, self.text, to=(self.to, ),
-                                     headers=self.headers)
+def send(name, to, ctx, headers={}, now=False):
+    """ Send an email, from the worker pool unless `now` is set.
 
-        msg.attach_alternative(self.html, "text/html")
-        msg.send()
+    With `now`, the email is sent on the current thread, and the
+    return value is an error message, or None on success.
 
+    """
 
-def send(name, to, ctx, headers={}):
     ctx["SITE_ROOT"] = settings.SITE_ROOT
 
     subject = render('emails/%s-subject.html' % name, ctx).strip()
     text = render('emails/%s-body-text.html' % name, ctx)
     html = render('emails/%s-body-html.html' % name, ctx)
 
-    t = EmailThread(subject, text, html, to, headers)
-    if hasattr(settings, "BLOCKING_EMAILS"):
-        t.run()
-    else:
-        t.start()
+    msg = EmailMultiAlternatives(subject, text, to=(to, ), headers=headers)
+    msg.attach_alternative(html, "text/html")
+    if now:
+        return mailer.send_now(msg)
+
+    mailer.send(msg)
 
 
 def login(to, ctx):
@@ -44,8 +37,14 @@ def set_password(to, ctx):
     send("set-password", to, ctx)
 
 
+# Alerts are sent from the notification outbox, which needs to see
+# delivery errors to retry them
 def alert(to, ctx, headers={}):
-    send("alert", to, ctx, headers)
+    return send("alert", to, ctx, headers, now=True)
+
+
+def digest(to, ctx, headers={}):
+    return send("digest", to, ctx, headers, now=True)
 
 
 def verify_email(to, ctx):
@@ -4,8 +4,10 @@ Supports only a tiny subset of jsonschema.
 
 """
 
+from math import isinf, isnan
+
 from croniter import croniter
-from six import string_types
+from six import integer_types, string_types
 from pytz import all_timezones
 
 
@@ -29,7 +31,12 @@ def validate(obj, schema, obj_name="value"):
             raise ValidationError("%s is not a valid timezone" % obj_name)
 
     elif schema.get("type") == "number":
-        if not isinstance(obj, int):
+        # bool is a subclass of int, but not a number in JSON
+        if isinstance(obj, bool) or \
+                not isinstance(obj, integer_types + (float, )):
+            raise ValidationError("%s is not a number" % obj_name)
+        # json.loads() accepts NaN and Infinity
+        if isinstance(obj, float) and (isnan(obj) or isinf(obj)):
             raise ValidationError("%s is not a number" % obj_name)
         if "minimum" in schema and obj < schema["minimum"]:
             raise ValidationError("%s is too small" % obj_name)
@@ -0,0 +1,104 @@
+""" A small thread-safe LRU cache.
+
+Used for in-process caches of parsed cron schedules, rendered
+templates and badges, and for the per-host HTTP sessions.
+
+"""
+
+from collections import OrderedDict
+from threading import Lock
+
+_missing = object()
+
+
+class LRUCache(object):
+    def __init__(self, max_size=1000, on_evict=None):
+        self.max_size = max_size
+        # Called with each value removed to make room, or by evict()
+        self.on_evict = on_evict
+
+        self.items = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, key, default=None):
+        with self.lock:
+            value = self.items.pop(key, _missing)
+            if value is _missing:
+                return default
+
+            # Re-insert to mark as most recently used
+            self.items[key] = value
+            return value
+
+    def set(self, key, value, replace=True):
+        """ Store `value` under `key`, and return the stored value.
+
+        With `replace` off, a value that is already there is kept.
+
+        """
+
+        with self.lock:
+            existing = self.items.pop(key, _missing)
+            if existing is not _missing and not replace:
+                value = existing
+
+            self.items[key] = value
+            evicted = []
+            while len(self.items) > self.max_size:
+                evicted.append(self.items.popitem(last=False)[1])
+
+        self._evicted(evicted)
+        return value
+
+    def get_or_set(self, key, fn):
+        """ Return the value for `key`, calling `fn` to make it if needed.
+
+        `fn` runs without the lock held. If another thread stores
+        a value for `key` in the meantime, that value wins.
+
+        """
+
+        value = self.get(key, _missing)
+        if value is _missing:
+            value = self.set(key, fn(), replace=False)
+
+        return value
+
+    def evict(self, predicate):
+        """ Remove least recently used values while `predicate` holds. """
+
+        evicted = []
+        with self.lock:
+            for key, value in list(self.items.items()):
+                if not predicate(value):
+                    break
+
+                evicted.append(self.items.pop(key))
+
+        self._evicted(evicted)
+
+    def _evicted(self, values):
+        if self.on_evict:
+            for value in values:
+                self.on_evict(value)
+
+    def snapshot(self):
+        """ Return a list of (key, value) pairs, least recent first. """
+
+        with self.lock:
+            return list(self.items.items())
+
+    def keys(self):
+        with self.lock:
+            return list(self.items.keys())
+
+    def clear(self):
+        """ Remove everything, and return the removed values. """
+
+        with self.lock:
+            items, self.items = self.items, OrderedDict()
+
+        return list(items.values())
+
+    def __len__(self):
+        return len(self.items)
@@ -0,0 +1,167 @@
+""" Email delivery from a pool of workers with persistent connections.
+
+Messages are handed over to a bounded pool of worker threads. Each
+worker keeps its own connection to the mail server open between
+messages, and reopens it when it has been idle for too long or the
+server has dropped it.
+
+Within a `batch()` block, messages are collected and then sent in
+chunks, each chunk over a single connection.
+
+`send_now()` skips the pool and sends on the caller's thread, for
+callers that need to know whether delivery succeeded.
+
+"""
+
+import atexit
+import smtplib
+import socket
+import time
+import traceback
+from contextlib import contextmanager
+from threading import Lock, local
+
+from django.conf import settings
+from django.core.mail import get_connection
+
+from hc.lib.pool import BoundedPool
+
+
+class Mailer(object):
+    def __init__(self, workers=4, queue_size=1000, batch_size=100,
+                 max_idle=30):
+        self.pool = BoundedPool(workers, queue_size)
+        self.batch_size = batch_size
+        self.max_idle = max_idle
+
+        self.local = local()
+        self.lock = Lock()
+        self.started = False
+        self.connections = 0
+        self.sent = 0
+        self.failed = 0
+        self.total_time = 0.0
+
+    def get_connection(self):
+        """ Return this thread's connection, opening it if needed. """
+
+        now = time.time()
+        conn = getattr(self.local, "connection", None)
+        if conn is not None and now - self.local.last_used > self.max_idle:
+            # The server has likely closed it by now
+            self.close()
+            conn = None
+
+        if conn is None:
+            conn = get_connection()
+            conn.open()
+            self.local.connection = conn
+            with self.lock:
+                self.connections += 1
+
+        self.local.last_used = now
+        return conn
+
+    def close(self):
+        conn = getattr(self.local, "connection", None)
+        self.local.connection = None
+        if conn is not None:
+            try:
+                conn.close()
+            except (smtplib.SMTPException, socket.error):
+                pass
+
+    def deliver(self, messages):
+        """ Send `messages` over this thread's connection.
+
+        A failed message does not hold up the rest. Returns a list
+        with an error message for each failed message.
+
+        """
+
+        errors = []
+        for message in messages:
+            start = time.time()
+            try:
+                try:
+                    self.get_connection().send_messages([message])
+                except (smtplib.SMTPServerDisconnected, socket.error) as e:
+                    # On Python 3, all SMTP errors are socket errors too.
+                    # Only retry when the connection itself went stale.
+                    if isinstance(e, smtplib.SMTPException) and not \
+                            isinstance(e, smtplib.SMTPServerDisconnected):
+                        raise
+
+                    self.close()
+                    self.get_connection().send_messages([message])
+            except Exception as e:
+                traceback.print_exc()
+                self.close()
+                with self.lock:
+                    self.failed += 1
+                errors.append("%s: %s" % (type(e).__name__, e))
+                continue
+
+            with self.lock:
+                self.sent += 1
+                self.total_time += time.time() - start
+
+        return errors
+
+    def send_now(self, message):
+        """ Send `message` right away, and return an error or None. """
+
+        errors = self.deliver([message])
+        return errors[0] if errors else None
+
+    def submit(self, messages):
+        if hasattr(settings, "BLOCKING_EMAILS"):
+            try:
+                self.deliver(messages)
+            finally:
+                # Don't keep connections open on the caller's thread
+                self.close()
+        else:
+            if not self.started:
+                # Worker threads don't keep the process alive, so
+                # wait for queued messages before exiting
+                self.started = True
+                atexit.register(self.pool.join, 60)
+
+            self.pool.submit("email", self.deliver, messages)
+
+    def send(self, message):
+        messages = getattr(self.local, "batch", None)
+        if messages is None:
+            self.submit([message])
+            return
+
+        messages.append(message)
+        if len(messages) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        messages, self.local.batch = self.local.batch, []
+        if messages:
+            self.submit(messages)
+
+    @contextmanager
+    def batch(self):
+        """ Collect messages sent in the block and send them in chunks. """
+
+        self.local.batch = []
+        try:
+            yield
+        finally:
+            self.flush()
+            self.local.batch = None
+
+    def stats(self):
+        result = self.pool.stats()
+        with self.lock:
+            result["connections"] = self.connections
+            result["sent"] = self.sent
+            result["failed"] = self.failed
+            result["avg_latency"] = self.total_time / (self.sent or 1)
+
+        return result
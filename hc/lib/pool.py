@@ -0,0 +1,123 @@
+""" A thread pool with a bounded queue and per-key concurrency limits.
+
+Jobs are submitted under a key (for example, a channel kind). Each key
+can have its own limit on how many of its jobs run at the same time,
+and a busy key does not hold up jobs of other keys. When the queue is
+full, `submit` blocks until there is room.
+
+"""
+
+import time
+import traceback
+from collections import Counter, OrderedDict, deque
+from threading import Condition, Thread
+
+
+class BoundedPool(object):
+    def __init__(self, workers=10, queue_size=1000, limits=None):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.limits = limits or {}
+
+        self.cond = Condition()
+        self.queues = OrderedDict()
+        self.running = Counter()
+        self.depth = 0
+        self.started = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.threads = []
+
+    def submit(self, key, fn, *args):
+        with self.cond:
+            if not self.threads:
+                self.start()
+
+            # Backpressure: wait for room in the queue
+            while self.depth >= self.queue_size:
+                self.cond.wait()
+
+            job = (fn, args, time.time())
+            self.queues.setdefault(key, deque()).append(job)
+            self.depth += 1
+            self.cond.notify_all()
+
+    def start(self):
+        for i in range(0, self.workers):
+            t = Thread(target=self.work)
+            t.daemon = True
+            t.start()
+            self.threads.append(t)
+
+    def next_job(self):
+        """ Pick the next job that is allowed to run, or None.
+
+        Must be called with `self.cond` held. Keys take turns, so one
+        busy key cannot starve the others.
+
+        """
+
+        for key in list(self.queues):
+            limit = self.limits.get(key)
+            if limit is not None and self.running[key] >= limit:
+                continue
+
+            q = self.queues.pop(key)
+            job = q.popleft()
+            if q:
+                # Move this key to the back of the line
+                self.queues[key] = q
+
+            return key, job
+
+        return None
+
+    def work(self):
+        while True:
+            with self.cond:
+                picked = self.next_job()
+                while picked is None:
+                    self.cond.wait()
+                    picked = self.next_job()
+
+                key, (fn, args, submitted) = picked
+                self.running[key] += 1
+                self.started += 1
+                self.total_wait += time.time() - submitted
+
+            try:
+                fn(*args)
+            except Exception:
+                traceback.print_exc()
+            finally:
+                with self.cond:
+                    self.running[key] -= 1
+                    self.depth -= 1
+                    self.completed += 1
+                    self.cond.notify_all()
+
+    def join(self, timeout=None):
+        """ Wait until all submitted jobs have completed. """
+
+        deadline = None if timeout is None else time.time() + timeout
+        with self.cond:
+            while self.depth:
+                remaining = None if deadline is None else \
+                    deadline - time.time()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+
+        return True
+
+    def stats(self):
+        with self.cond:
+            running = sum(self.running.values())
+            avg_wait = self.total_wait / self.started \
+                if self.started else 0.0
+            return {
+                "queued": self.depth - running,
+                "running": running,
+                "completed": self.completed,
+                "avg_wait": avg_wait
+            }
@@ -0,0 +1,64 @@
+""" Template rendering for notifications.
+
+Compiled templates are kept in memory, so each template gets loaded and
+parsed once per process. `preload` compiles a list of templates up
+front, at worker startup. With DEBUG on, templates get loaded on every
+use, so that edits show up right away.
+
+When one status change fans out to many channels, channels usually
+render the same templates with the same check. `cached` keeps rendered
+output for a short while, so the rendering happens once.
+
+"""
+
+import time
+
+from django.conf import settings
+from django.template.loader import get_template
+from hc.lib.lru import LRUCache
+
+CACHE_SIZE = 1000
+# Seconds to keep rendered output for. Templates show relative times
+# ("5 minutes ago"), so this should be short.
+CACHE_TTL = 60
+
+_templates = {}
+_cache = LRUCache(CACHE_SIZE)
+
+
+def load(name):
+    if settings.DEBUG:
+        return get_template(name)
+
+    template = _templates.get(name)
+    if template is None:
+        template = _templates[name] = get_template(name)
+
+    return template
+
+
+def preload(names):
+    for name in names:
+        load(name)
+
+
+def render(name, ctx):
+    return load(name).render(ctx)
+
+
+def cached(key, fn):
+    """ Return the cached result for `key`, or call `fn` and cache it. """
+
+    now = time.time()
+    entry = _cache.get(key)
+    if entry is not None and entry[0] > now:
+        return entry[1]
+
+    result = fn()
+    _cache.set(key, (now + CACHE_TTL, result))
+    return result
+
+
+def clear():
+    _templates.clear()
+    _cache.clear()
@@ -0,0 +1,112 @@
+""" A thread-safe registry of keep-alive HTTP sessions, one per host.
+
+Each destination host (scheme and netloc) gets its own requests.Session
+with its own connection pool, so a slow or busy host cannot use up the
+connections of another. Sessions that have not been used for a while
+are closed, and so are the least recently used ones when there are too
+many hosts.
+
+The registry keeps per-host counters: number of requests, new
+connections opened and total time spent in requests.
+
+"""
+
+import time
+from threading import Lock
+
+import requests
+from requests.adapters import HTTPAdapter
+from six.moves.http_cookiejar import DefaultCookiePolicy
+from six.moves.urllib.parse import urlsplit
+
+from hc.lib.lru import LRUCache
+
+
+def make_session(pool_size=10):
+    s = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+    s.mount("http://", adapter)
+    s.mount("https://", adapter)
+
+    # Don't let one user's endpoint set cookies that would then be
+    # sent along with another user's notifications
+    s.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+    return s
+
+
+def _num_connections(session):
+    """ Return the number of connections the session has opened. """
+
+    total = 0
+    for adapter in set(session.adapters.values()):
+        pools = adapter.poolmanager.pools
+        # The pool container does not support iterating over values
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                total += pool.num_connections
+
+    return total
+
+
+class HostSession(object):
+    def __init__(self, pool_size):
+        self.session = make_session(pool_size)
+        self.last_used = time.time()
+        self.requests = 0
+        self.total_time = 0.0
+
+    def stats(self):
+        connections = _num_connections(self.session)
+        reused = max(self.requests - connections, 0)
+        return {
+            "requests": self.requests,
+            "connections": connections,
+            "reuse_ratio": reused / float(self.requests or 1),
+            "avg_latency": self.total_time / (self.requests or 1)
+        }
+
+
+def _close(host):
+    host.session.close()
+
+
+class SessionRegistry(object):
+    def __init__(self, max_hosts=50, pool_size=10, idle_timeout=300):
+        self.max_hosts = max_hosts
+        self.pool_size = pool_size
+        self.idle_timeout = idle_timeout
+
+        # Protects the per-host counters
+        self.lock = Lock()
+        self.hosts = LRUCache(max_hosts, on_evict=_close)
+
+    def get(self, url):
+        parts = urlsplit(url)
+        key = "%s://%s" % (parts.scheme, parts.netloc.lower())
+
+        now = time.time()
+        host = self.hosts.get_or_set(key,
+                                     lambda: HostSession(self.pool_size))
+        host.last_used = now
+
+        self.hosts.evict(lambda h: now - h.last_used > self.idle_timeout)
+        return host
+
+    def request(self, method, url, **kwargs):
+        host = self.get(url)
+        start = time.time()
+        try:
+            return host.session.request(method, url, **kwargs)
+        finally:
+            with self.lock:
+                host.requests += 1
+                host.total_time += time.time() - start
+
+    def stats(self):
+        hosts = self.hosts.snapshot()
+        return dict((key, host.stats()) for key, host in hosts)
+
+    def close(self):
+        for host in self.hosts.clear():
+            _close(host)
@@ -1,6 +1,7 @@
 from django.test import TestCase
+from mock import patch
 
-from hc.lib.badges import get_width, get_badge_svg
+from hc.lib.badges import get_badge, get_width, get_badge_svg
 
 
 class BadgesTestCase(TestCase):
@@ -16,3 +17,13 @@ class BadgesTestCase(TestCase):
 
         svg = get_badge_svg("bar", "down")
         self.assertTrue("#e05d44" in svg)
+
+    @patch("hc.lib.badges.get_badge_svg", wraps=get_badge_svg)
+    def test_it_caches_badges(self, mock_render):
+        svg, etag = get_badge("cached", "up")
+        self.assertTrue("#4c1" in svg)
+
+        self.assertEqual(get_badge("cached", "up"), (svg, etag))
+        self.assertEqual(mock_render.call_count, 1)
+
+        self.assertNotEqual(get_badge("cached", "late")[1], etag)
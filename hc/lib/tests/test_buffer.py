@@ -0,0 +1,67 @@
+from django.db import DatabaseError, IntegrityError
+from django.test import TestCase
+from mock import patch
+
+from hc.api.models import Check, Ping
+from hc.lib.buffer import BulkBuffer
+
+
+@patch("hc.lib.buffer.BulkBuffer.start")
+class BulkBufferTestCase(TestCase):
+
+    def setUp(self):
+        super(BulkBufferTestCase, self).setUp()
+        self.check = Check.objects.create()
+        self.buffer = BulkBuffer(Ping, max_size=2)
+
+    def test_it_writes_on_flush(self, mock_start):
+        self.buffer.add(Ping(owner=self.check, n=1))
+        self.buffer.add(Ping(owner=self.check, n=2))
+        self.assertEqual(Ping.objects.count(), 0)
+
+        self.assertEqual(self.buffer.flush(), 2)
+        self.assertEqual(Ping.objects.count(), 2)
+
+        # Buffer should be empty now
+        self.assertEqual(self.buffer.flush(), 0)
+
+    def test_it_starts_flusher_once(self, mock_start):
+        self.buffer.add(Ping(owner=self.check, n=1))
+        self.buffer.add(Ping(owner=self.check, n=2))
+
+        self.assertEqual(mock_start.call_count, 1)
+
+    def test_it_keeps_batch_on_database_error(self, mock_start):
+        self.buffer.add(Ping(owner=self.check, n=1))
+
+        with patch.object(Ping.objects, "bulk_create") as mock_bulk_create:
+            mock_bulk_create.side_effect = DatabaseError
+            self.assertEqual(self.buffer.flush(), 0)
+
+        self.assertEqual(self.buffer.flush(), 1)
+        self.assertEqual(Ping.objects.count(), 1)
+
+    def test_it_drops_pings_of_deleted_checks(self, mock_start):
+        other = Check.objects.create()
+        self.buffer.add(Ping(owner=self.check, n=1))
+        self.buffer.add(Ping(owner=other, n=1))
+        other.delete()
+
+        bulk_create = Ping.objects.bulk_create
+
+        def checked_bulk_create(objs, **kwargs):
+            # SQLite does not enforce the foreign key here, PostgreSQL does
+            for obj in objs:
+                if not Check.objects.filter(id=obj.owner_id).exists():
+                    raise IntegrityError
+
+            return bulk_create(objs, **kwargs)
+
+        with patch.object(Ping.objects, "bulk_create") as mock_bulk_create:
+            mock_bulk_create.side_effect = checked_bulk_create
+            self.assertEqual(self.buffer.flush(), 1)
+
+        # The bad row is gone for good
+        self.assertEqual(self.buffer.flush(), 0)
+        self.assertEqual(list(Ping.objects.values_list("owner", flat=True)),
+                         [self.check.id])
@@ -0,0 +1,30 @@
+from django.test import SimpleTestCase
+
+from hc.lib import bus
+
+
+class BusTestCase(SimpleTestCase):
+
+    def test_it_delivers_to_subscribers(self):
+        a = bus.subscribe("foo")
+        b = bus.subscribe("foo")
+        other = bus.subscribe("bar")
+        try:
+            bus.publish("foo", {"n": 1})
+            bus.publish("foo", {"n": 2})
+
+            self.assertEqual(a.get(timeout=1), [{"n": 1}, {"n": 2}])
+            self.assertEqual(b.get(timeout=1), [{"n": 1}, {"n": 2}])
+            self.assertEqual(other.get(timeout=0.01), [])
+        finally:
+            a.close()
+            b.close()
+            other.close()
+
+    def test_it_forgets_closed_subscriptions(self):
+        subscription = bus.subscribe("foo")
+        subscription.close()
+
+        bus.publish("foo", {"n": 1})
+        self.assertEqual(subscription.get(timeout=0.01), [])
+        self.assertNotIn("foo", bus._local)
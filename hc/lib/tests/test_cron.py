@@ -0,0 +1,42 @@
+from datetime import datetime
+
+from django.test import TestCase
+from django.utils import timezone
+
+from hc.lib import cron
+
+
+class CronTestCase(TestCase):
+
+    def test_it_works(self):
+        dt = timezone.make_aware(datetime(2000, 1, 1, 12, 30),
+                                 timezone=timezone.utc)
+
+        result = cron.next_after("0 * * * *", "UTC", dt)
+        self.assertEqual(result.isoformat(), "2000-01-01T13:00:00+00:00")
+
+    def test_it_handles_timezone(self):
+        dt = timezone.make_aware(datetime(2000, 1, 1, 12, 30),
+                                 timezone=timezone.utc)
+
+        # Midnight in Riga is 22:00 UTC in winter
+        result = cron.next_after("0 0 * * *", "Europe/Riga", dt)
+        self.assertEqual(result.astimezone(timezone.utc).isoformat(),
+                         "2000-01-01T22:00:00+00:00")
+
+    def test_it_reuses_parsed_schedule(self):
+        dt = timezone.now()
+        cron.next_after("*/5 * * * *", "UTC", dt)
+        cron.next_after("*/5 * * * *", "UTC", dt)
+
+        keys = [key for key in cron._cache.keys() if key[0] == "*/5 * * * *"]
+        self.assertEqual(keys, [("*/5 * * * *", "UTC")])
+
+    def test_cached_schedule_is_not_shared_state(self):
+        dt = timezone.make_aware(datetime(2000, 1, 1, 12, 30),
+                                 timezone=timezone.utc)
+
+        # Evaluating from a later point should not affect earlier ones
+        cron.next_after("0 * * * *", "UTC", dt.replace(hour=20))
+        result = cron.next_after("0 * * * *", "UTC", dt)
+        self.assertEqual(result.hour, 13)
@@ -19,6 +19,14 @@ class JsonSchemaTestCase(TestCase):
     def test_it_validates_numbers(self):
         validate(123, {"type": "number", "minimum": 0, "maximum": 1000})
 
+    def test_it_validates_floats(self):
+        validate(1.5e9, {"type": "number", "minimum": 0})
+
+    def test_it_rejects_bools_and_non_finite_floats(self):
+        for value in (True, float("nan"), float("inf")):
+            with self.assertRaises(ValidationError):
+                validate(value, {"type": "number"})
+
     def test_it_checks_int_type(self):
         with self.assertRaises(ValidationError):
             validate("foo", {"type": "number"})
@@ -0,0 +1,47 @@
+from django.test import SimpleTestCase
+
+from hc.lib.lru import LRUCache
+
+
+class LRUCacheTestCase(SimpleTestCase):
+
+    def test_it_evicts_least_recently_used(self):
+        evicted = []
+        cache = LRUCache(max_size=2, on_evict=evicted.append)
+        cache.set("a", 1)
+        cache.set("b", 2)
+        self.assertEqual(cache.get("a"), 1)
+        cache.set("c", 3)
+
+        self.assertEqual(cache.keys(), ["a", "c"])
+        self.assertEqual(evicted, [2])
+        self.assertIsNone(cache.get("b"))
+
+    def test_get_or_set_calls_function_once(self):
+        cache = LRUCache()
+        calls = []
+
+        def make():
+            calls.append(1)
+            return "value"
+
+        self.assertEqual(cache.get_or_set("a", make), "value")
+        self.assertEqual(cache.get_or_set("a", make), "value")
+        self.assertEqual(len(calls), 1)
+
+    def test_set_can_keep_existing_value(self):
+        cache = LRUCache()
+        cache.set("a", 1)
+        self.assertEqual(cache.set("a", 2, replace=False), 1)
+        self.assertEqual(cache.set("a", 3), 3)
+
+    def test_it_evicts_by_predicate(self):
+        evicted = []
+        cache = LRUCache(on_evict=evicted.append)
+        for i in range(0, 4):
+            cache.set(i, i)
+
+        # Stops at the first value that does not match
+        cache.evict(lambda value: value != 2)
+        self.assertEqual(cache.keys(), [2, 3])
+        self.assertEqual(evicted, [0, 1])
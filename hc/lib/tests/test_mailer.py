@@ -0,0 +1,110 @@
+import asyncore
+import smtplib
+from threading import Thread
+from unittest import skipIf
+
+from django.conf import settings
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from mock import Mock, patch
+
+from hc.lib.mailer import Mailer
+
+try:
+    import smtpd
+except ImportError:
+    smtpd = None
+
+
+def _message(i):
+    return EmailMessage("Subject %d" % i, "Body", to=["alice@example.org"])
+
+
+class MailerTestCase(SimpleTestCase):
+
+    def test_it_sends_batches(self):
+        mailer = Mailer(batch_size=2)
+        with mailer.batch():
+            for i in range(0, 3):
+                mailer.send(_message(i))
+
+            # The first chunk goes out as soon as it is full
+            self.assertEqual(len(mail.outbox), 2)
+
+        self.assertEqual(len(mail.outbox), 3)
+
+        stats = mailer.stats()
+        self.assertEqual(stats["sent"], 3)
+        self.assertEqual(stats["connections"], 2)
+
+    def test_it_sends_from_pool(self):
+        mailer = Mailer(workers=2)
+        with override_settings():
+            del settings.BLOCKING_EMAILS
+            for i in range(0, 5):
+                mailer.send(_message(i))
+
+        self.assertTrue(mailer.pool.join(timeout=5))
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mailer.stats()["sent"], 5)
+
+    @patch("hc.lib.mailer.traceback")
+    @patch("hc.lib.mailer.get_connection")
+    def test_it_keeps_going_after_failed_message(self, mock_get_connection,
+                                                 mock_traceback):
+        conn = Mock()
+        conn.send_messages.side_effect = [
+            None, smtplib.SMTPDataError(550, "Bad address"), None]
+        mock_get_connection.return_value = conn
+
+        mailer = Mailer()
+        errors = mailer.deliver([_message(i) for i in range(0, 3)])
+
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].startswith("SMTPDataError"))
+        self.assertEqual(conn.send_messages.call_count, 3)
+
+        stats = mailer.stats()
+        self.assertEqual(stats["sent"], 2)
+        self.assertEqual(stats["failed"], 1)
+
+    def test_send_now_skips_pool(self):
+        mailer = Mailer()
+        with override_settings():
+            del settings.BLOCKING_EMAILS
+            self.assertIsNone(mailer.send_now(_message(1)))
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mailer.pool.threads, [])
+
+    @skipIf(smtpd is None, "smtpd is not available")
+    def test_it_reuses_smtp_connection(self):
+        peers = []
+
+        class Server(smtpd.SMTPServer):
+            def process_message(self, peer, mailfrom, rcpttos, data, **kw):
+                peers.append(peer)
+
+        server = Server(("127.0.0.1", 0), None)
+        port = server.socket.getsockname()[1]
+        t = Thread(target=asyncore.loop, kwargs={"timeout": 0.05})
+        t.daemon = True
+        t.start()
+
+        backend = "django.core.mail.backends.smtp.EmailBackend"
+        try:
+            with override_settings(EMAIL_BACKEND=backend,
+                                   EMAIL_HOST="127.0.0.1", EMAIL_PORT=port,
+                                   EMAIL_USE_TLS=False):
+                mailer = Mailer()
+                mailer.deliver([_message(i) for i in range(0, 3)])
+                mailer.close()
+        finally:
+            server.close()
+
+        self.assertEqual(len(peers), 3)
+        # All messages arrived over the same connection
+        self.assertEqual(len(set(peers)), 1)
+        self.assertEqual(mailer.stats()["connections"], 1)
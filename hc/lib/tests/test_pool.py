@@ -0,0 +1,63 @@
+import time
+from threading import Lock
+
+from django.test import SimpleTestCase
+
+from hc.lib.pool import BoundedPool
+
+
+class BoundedPoolTestCase(SimpleTestCase):
+
+    def test_it_runs_jobs(self):
+        results = []
+        pool = BoundedPool(workers=2)
+        for i in range(0, 5):
+            pool.submit("a", results.append, i)
+
+        self.assertTrue(pool.join(timeout=5))
+        self.assertEqual(sorted(results), [0, 1, 2, 3, 4])
+
+        stats = pool.stats()
+        self.assertEqual(stats["completed"], 5)
+        self.assertEqual(stats["queued"], 0)
+        self.assertEqual(stats["running"], 0)
+
+    def test_it_limits_concurrency_per_key(self):
+        lock = Lock()
+        state = {"running": 0, "max": 0}
+
+        def job():
+            with lock:
+                state["running"] += 1
+                state["max"] = max(state["max"], state["running"])
+            time.sleep(0.01)
+            with lock:
+                state["running"] -= 1
+
+        pool = BoundedPool(workers=4, limits={"email": 1})
+        for i in range(0, 5):
+            pool.submit("email", job)
+
+        self.assertTrue(pool.join(timeout=5))
+        self.assertEqual(state["max"], 1)
+
+    def test_busy_key_does_not_block_others(self):
+        pool = BoundedPool(workers=2, limits={"slow": 1})
+        pool.submit("slow", time.sleep, 0.2)
+        pool.submit("slow", time.sleep, 0.2)
+
+        done = []
+        pool.submit("fast", done.append, True)
+        time.sleep(0.1)
+        self.assertEqual(done, [True])
+
+        pool.join(timeout=5)
+
+    def test_it_survives_exceptions(self):
+        pool = BoundedPool(workers=1)
+        pool.submit("a", int, "not a number")
+
+        results = []
+        pool.submit("a", results.append, 1)
+        self.assertTrue(pool.join(timeout=5))
+        self.assertEqual(results, [1])
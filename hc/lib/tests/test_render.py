@@ -0,0 +1,30 @@
+from django.test import SimpleTestCase
+from mock import Mock, patch
+
+from hc.lib import render
+
+
+class RenderTestCase(SimpleTestCase):
+
+    def setUp(self):
+        render.clear()
+
+    def test_preload_compiles_templates(self):
+        render.preload(["emails/alert-subject.html"])
+        self.assertIn("emails/alert-subject.html", render._templates)
+
+    def test_cached_calls_function_once(self):
+        fn = Mock(return_value="result")
+        self.assertEqual(render.cached("key", fn), "result")
+        self.assertEqual(render.cached("key", fn), "result")
+        self.assertEqual(fn.call_count, 1)
+
+    @patch("hc.lib.render.time.time")
+    def test_cached_expires(self, mock_time):
+        fn = Mock(return_value="result")
+        mock_time.return_value = 1000
+        render.cached("key", fn)
+
+        mock_time.return_value = 1000 + render.CACHE_TTL + 1
+        render.cached("key", fn)
+        self.assertEqual(fn.call_count, 2)
@@ -0,0 +1,59 @@
+from django.test import SimpleTestCase
+from mock import patch
+
+from hc.lib.sessions import SessionRegistry
+
+
+class SessionRegistryTestCase(SimpleTestCase):
+
+    def test_it_shares_session_per_host(self):
+        registry = SessionRegistry()
+        a = registry.get("https://example.org/a")
+        b = registry.get("https://EXAMPLE.org/b?c=d")
+        c = registry.get("http://example.org/a")
+
+        self.assertIs(a, b)
+        self.assertIsNot(a, c)
+
+    def test_it_evicts_least_recently_used(self):
+        registry = SessionRegistry(max_hosts=2)
+        registry.get("https://a.example.org")
+        registry.get("https://b.example.org")
+        registry.get("https://a.example.org")
+        registry.get("https://c.example.org")
+
+        self.assertEqual(registry.hosts.keys(), ["https://a.example.org",
+                                                 "https://c.example.org"])
+
+    @patch("hc.lib.sessions.time.time")
+    def test_it_evicts_idle_hosts(self, mock_time):
+        registry = SessionRegistry(idle_timeout=60)
+        mock_time.return_value = 1000
+        registry.get("https://a.example.org")
+
+        mock_time.return_value = 1061
+        registry.get("https://b.example.org")
+
+        self.assertEqual(registry.hosts.keys(), ["https://b.example.org"])
+
+    @patch("hc.lib.sessions.requests.Session.request")
+    def test_it_counts_requests(self, mock_request):
+        registry = SessionRegistry()
+        registry.request("get", "https://example.org/a")
+        registry.request("get", "https://example.org/b")
+
+        stats = registry.stats()["https://example.org"]
+        self.assertEqual(stats["requests"], 2)
+        self.assertEqual(stats["connections"], 0)
+        self.assertEqual(stats["reuse_ratio"], 1.0)
+
+    @patch("hc.lib.sessions.requests.Session.request")
+    def test_it_counts_failed_requests(self, mock_request):
+        mock_request.side_effect = ValueError
+
+        registry = SessionRegistry()
+        with self.assertRaises(ValueError):
+            registry.request("get", "https://example.org/a")
+
+        stats = registry.stats()["https://example.org"]
+        self.assertEqual(stats["requests"], 1)
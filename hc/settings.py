@@ -109,6 +109,73 @@ STATICFILES_FINDERS = (
 )
 COMPRESS_OFFLINE = True
 
+# Ping log buffering. When enabled, Ping rows are written in batches
+# by a background thread, at least every PING_BUFFER_MAX_AGE seconds
+PING_BUFFER_ENABLED = False
+PING_BUFFER_MAX_SIZE = 500
+PING_BUFFER_MAX_AGE = 1.0
+
+# Partitioned ping log (PostgreSQL 11+, see the partitionpings command):
+# number of monthly partitions to create in advance, and age in days
+# after which pings get removed. None keeps all pings.
+PING_PARTITIONS_AHEAD = 2
+PING_RETENTION_DAYS = None
+
+# Notification delivery in sendalerts: number of worker threads,
+# maximum number of queued deliveries, and optional per channel kind
+# limits on concurrent deliveries, e.g. {"email": 2}
+NOTIFICATION_WORKERS = 10
+NOTIFICATION_QUEUE_SIZE = 1000
+NOTIFICATION_KIND_LIMITS = {}
+
+# Failed notifications are retried with exponential backoff, starting
+# at NOTIFICATION_RETRY_DELAY seconds between attempts
+NOTIFICATION_MAX_ATTEMPTS = 5
+NOTIFICATION_RETRY_DELAY = 30
+
+# Monthly reports in sendreports: number of worker threads, and
+# maximum number of queued batches of reports
+REPORT_WORKERS = 4
+REPORT_QUEUE_SIZE = 8
+
+# Seconds to cache API key lookups. Changing or revoking a key drops
+# its entry. Lookups only get cached with a CACHES backend shared by
+# all processes (e.g. memcached), not with the default per-process one.
+API_KEY_CACHE_TTL = 60
+
+# Seconds to cache user's current team and team list. Changes by the
+# user, and to their memberships, drop the cached values. Like API key
+# lookups, these only get cached with a shared CACHES backend.
+TEAM_CACHE_TTL = 300
+
+# Number of checks per page on the dashboard
+CHECKS_PAGE_SIZE = 50
+
+# Live dashboard updates over Server-Sent Events. Each open dashboard
+# keeps a request (and on PostgreSQL, a database connection) open, so
+# only enable this with an async server, e.g. gunicorn with gevent
+# workers. Otherwise dashboards poll for changes every minute.
+EVENTS_ENABLED = False
+
+# Seconds a dashboard's live event stream stays open before the
+# browser reconnects
+EVENTS_MAX_AGE = 300
+
+# Outgoing email: number of sending threads, max. messages waiting to
+# be sent, messages sent per connection in batch mode, and seconds
+# after which an unused connection gets reopened
+EMAIL_WORKERS = 4
+EMAIL_QUEUE_SIZE = 1000
+EMAIL_BATCH_SIZE = 100
+EMAIL_MAX_IDLE = 30
+
+# Connection pooling for HTTP based integrations: number of hosts to
+# keep connections to, connections to keep per host, and seconds after
+# which an unused host's connections get closed
+HTTP_POOL_HOSTS = 50
+HTTP_POOL_SIZE = 10
+HTTP_POOL_IDLE_TIMEOUT = 300
+
 # Discord integration -- override these in local_settings
 DISCORD_CLIENT_ID = None
 DISCORD_CLIENT_SECRET = None
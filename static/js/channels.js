@@ -44,6 +44,10 @@ $(function() {
         return false;
     });
 
+    $(".channel-digest").change(function() {
+        $(this).closest("form").submit();
+    });
+
     $('[data-toggle="tooltip"]').tooltip();
 
 });
\ No newline at end of file
@@ -1,6 +1,10 @@
 $(function () {
 
-    $(".my-checks-name").click(function() {
+    // Rows of further pages get added later, so events are handled
+    // on the container
+    var myChecks = $("#my-checks");
+
+    myChecks.on("click", ".my-checks-name", function() {
         $("#update-name-form").attr("action", this.dataset.url);
         $("#update-name-input").val(this.dataset.name);
         $("#update-tags-input").val(this.dataset.tags);
@@ -132,7 +136,7 @@ $(function () {
         );
     }
 
-    $(".timeout-grace").click(function() {
+    myChecks.on("click", ".timeout-grace", function() {
         $("#update-timeout-form").attr("action", this.dataset.url);
         $("#update-cron-form").attr("action", this.dataset.url);
 
@@ -161,7 +165,7 @@ $(function () {
     $("#schedule").on("keyup", updateCronPreview);
     $("#tz").selectize({onChange: updateCronPreview});
 
-    $(".check-menu-remove").click(function() {
+    myChecks.on("click", ".check-menu-remove", function() {
         $("#remove-check-form").attr("action", this.dataset.url);
         $(".remove-check-name").text(this.dataset.name);
         $('#remove-check-modal').modal("show");
@@ -175,39 +179,131 @@ $(function () {
         // so cannot use it
         $(this).toggleClass('checked');
 
-        // Make a list of currently checked tags:
-        var checked = [];
+        // Tag filters are applied on the server: reload the first
+        // page with the currently checked tags
+        var params = [];
         $("#my-checks-tags button.checked").each(function(index, el) {
-            checked.push(el.textContent);
+            params.push("tag=" + encodeURIComponent(el.textContent));
         });
 
-        // No checked tags: show all
-        if (checked.length == 0) {
-            $("#checks-table tr.checks-row").show();
-            $("#checks-list > li").show();
-            return;
+        window.location.search = params.join("&");
+    });
+
+    var DESKTOP_CLASSES = {
+        "new": "status icon-up new",
+        "paused": "status icon-paused",
+        "grace": "status icon-grace",
+        "up": "status icon-up",
+        "down": "status icon-down"
+    };
+
+    var MOBILE_LABELS = {
+        "new": ["label label-default", "NEW"],
+        "paused": ["label label-default", "PAUSED"],
+        "grace": ["label label-warning", "LATE"],
+        "up": ["label label-success", "UP"],
+        "down": ["label label-danger", "DOWN"]
+    };
+
+    var TAG_CLASSES = {
+        "grace": "btn-warning",
+        "up": "btn-default",
+        "down": "btn-danger"
+    };
+
+    // Poll for status changes instead of reloading the whole page.
+    // After the first poll, ask only for what has changed since the
+    // previous one.
+    var cursor = null;
+    function refreshStatus() {
+        var url = "/checks/status/" + window.location.search;
+        if (cursor) {
+            url += (window.location.search ? "&" : "?") + "since=" + cursor;
         }
 
-        function applyFilters(index, element) {
-            var tags = $(".my-checks-name", element).data("tags").split(" ");
-            for (var i=0, tag; tag=checked[i]; i++) {
-                if (tags.indexOf(tag) == -1) {
-                    $(element).hide();
-                    return;
-                }
+        $.getJSON(url, function(data) {
+            cursor = data.cursor;
+
+            for (var i=0, el; el=data.details[i]; i++) {
+                var selector = "[data-code='" + el.code + "']";
+
+                var row = $("#checks-table tr" + selector);
+                $(".indicator-cell > span", row).attr("class", DESKTOP_CLASSES[el.status]);
+                var lastPing = $(".last-ping-cell > span", row);
+                (lastPing.size() ? lastPing : $(".last-ping-cell", row)).text(el.last_ping);
+
+                var item = $("#checks-list > li" + selector);
+                var label = MOBILE_LABELS[el.status];
+                $(".status-cell > span", item).attr("class", label[0]).text(label[1]);
+                $(".last-ping-cell", item).text(el.last_ping);
             }
 
-            $(element).show();
+            $("#my-checks-tags button").each(function(index, el) {
+                var status = data.tags[el.textContent];
+                if (status) {
+                    $(el).removeClass("btn-danger btn-warning btn-default");
+                    $(el).addClass(TAG_CLASSES[status]);
+                }
+            });
+        });
+    }
+
+    setInterval(refreshStatus, 60000);
+
+    // Load further pages in place, below the ones already shown.
+    // Status polls with a cursor cover checks of all pages.
+    $("#checks-next").click(function() {
+        var link = $(this);
+        if (link.hasClass("loading")) {
+            return false;
         }
 
-        // Desktop: for each row, see if it needs to be shown or hidden
-        $("#checks-table tr.checks-row").each(applyFilters);
-        // Mobile: for each list item, see if it needs to be shown or hidden
-        $("#checks-list > li").each(applyFilters);
+        link.addClass("loading");
+        $.getJSON(link.data("json-url"), function(data) {
+            var rows = $($.parseHTML(data.desktop)).filter("tr");
+            $("#checks-table").append(rows);
+            $("[data-toggle='tooltip']", rows).tooltip();
+            $("#checks-list").append(data.mobile);
+
+            var first = $("#checks-pages").data("first");
+            $("#checks-pages").text("Pages " + first + "-" + data.page +
+                " of " + data.num_pages);
+
+            if (data.next) {
+                link.data("json-url", data.next);
+                link.attr("href", "?" + data.next.split("?")[1]);
+            } else {
+                link.parent().remove();
+            }
+        }).always(function() {
+            link.removeClass("loading");
+        });
 
+        return false;
     });
 
-    $(".pause-check").click(function(e) {
+    // If the server has live events enabled, and the browser supports
+    // them, also refresh as soon as the server reports a ping or
+    // a status change. Events arriving in quick succession are handled
+    // with a single refresh.
+    var eventsUrl = myChecks.data("events-url");
+    if (window.EventSource && eventsUrl) {
+        var pending = null;
+        var onEvent = function() {
+            if (pending === null) {
+                pending = setTimeout(function() {
+                    pending = null;
+                    refreshStatus();
+                }, 500);
+            }
+        };
+
+        var events = new EventSource(eventsUrl);
+        events.addEventListener("ping", onEvent);
+        events.addEventListener("status", onEvent);
+    }
+
+    myChecks.on("click", ".pause-check", function(e) {
         var url = e.target.getAttribute("data-url");
         $("#pause-form").attr("action", url).submit();
         return false;
@@ -215,7 +311,7 @@ $(function () {
 
     $('[data-toggle="tooltip"]').tooltip();
 
-    $(".usage-examples").click(function(e) {
+    myChecks.on("click", ".usage-examples", function(e) {
         var a = e.target;
         var url = a.getAttribute("data-url");
         var email = a.getAttribute("data-email");
@@ -228,7 +324,7 @@ $(function () {
     });
 
     var clipboard = new Clipboard('button.copy-link');
-    $("button.copy-link").mouseout(function(e) {
+    myChecks.on("mouseout", "button.copy-link", function(e) {
         setTimeout(function() {
             e.target.textContent = "copy";
         }, 300);